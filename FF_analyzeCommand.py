@@ -21,11 +21,31 @@ License: GNU GPL V3
 
 import pathlib
 import os
+import copy
 import json
-from re import A, match, search
-from typing_extensions import get_overloads
+import bisect
+import hashlib
+from FF_deviceRegistry import FF_deviceRegistry
 import unidecode
 
+# Structured validation error found by loadData
+class FF_diagnostic:
+    __slots__ = ("section", "key", "problem", "context")
+
+    # Class initialization
+    def __init__(self, section, key, problem, context=None):
+        self.section = section                              # Section of smsTables.json ("devices", "commands"...)
+        self.key = key                                      # Key of item in section (None for whole section)
+        self.problem = problem                              # Problem description
+        self.context = context                              # Item content (or None)
+
+    # Returns diagnostic as a dictionary
+    def toDict(self):
+        return {"section": self.section, "key": self.key, "problem": self.problem}
+
+    def __repr__(self):
+        return F"{self.section}" + (F"[{self.key}]" if self.key != None else "") + F": {self.problem}"
+
 class FF_analyzeCommand:
     # Class initialization 
     def __init__(self):
@@ -59,6 +79,15 @@ class FF_analyzeCommand:
         self.english = "English"                            # Language is English
         self.language = self.english                        # Force language to English
         self.classAfterDevice = False                       # Is class after device (True for English like languages)
+        self.compactDevices = False                         # Keep devices in a memory compact FF_deviceRegistry?
+        self.keyPartsCache = {}                             # Split keys of dictionaries, per dictionary id
+        self.ignoresSet = set()                             # Set of keywords to be ignored
+        self.checkSection = None                            # Section being checked
+        self.checkKey = None                                # Key being checked
+        self.diagnostics = []                               # Structured errors found by last loadData (FF_diagnostic list)
+        self.sectionHashes = {}                             # Hash of each section content at last loadData
+        self.validationCache = {}                           # Validation key and diagnostics of each section
+        self.revalidatedSections = []                       # Sections checked again by last loadData
 
     # Prints an error message, saving it and setting error flag
     def printError(self, message):
@@ -161,68 +190,86 @@ class FF_analyzeCommand:
             return False
         return True
 
-    # Compare 2 values, puts an error message and returns false if equal, true else
-    def notInIgnoreList(self, msg, valueIs, context=None):
-        isOk = (self.convertUserData(valueIs) not in self.ignoresList)
-        if not isOk:
-            self.printError(F"Error analyzing {self.checkFile} when {self.checkPhase}: {msg} should not be in ignore list")
-            if context != None:
-                self.printInfo(F"Context is {context}")
-            return False
-        return True
-
-    # Compare 2 values, puts an error message and returns false if equal, true else
-    def compareNotValue(self, msg, valueIs, valueShouldBe, context=None):
-        isOk = False
-        if type(valueShouldBe).__name__ in ["list","dict"]:
-            isOk = (self.convertUserData(valueIs) not in self.convertUserData(valueShouldBe))
-        else:
-            isOk = (self.convertUserData(valueIs) != self.convertUserData(valueShouldBe))
-        if not isOk:
-            self.printError(F"Error analyzing {self.checkFile}, when {self.checkPhase}: {msg} should not be "+str(valueShouldBe.keys()).replace("dict_keys(","")[:-1] if type(valueShouldBe).__name__ == "dict" else str(valueShouldBe))
-            if context != None:
-                self.printInfo(F"Context is {context}")
-            return False
-        return True
-
-    # Compare 2 types, puts an error message and returns false if not equal, true else
-    def compareType(self, msg, variableIs, typeShouldBe, context = None):
-        isOk = False
-        if type(typeShouldBe).__name__ in ["list", "dict"]:
-            isOk = (type(variableIs).__name__ in typeShouldBe)
-        else:
-            isOk = (type(variableIs).__name__ == typeShouldBe)
-        if not isOk:
-            self.printError(F"Error analyzing {self.checkFile}, when {self.checkPhase}: {msg} ({variableIs}) is {type(variableIs).__name__}, should be {typeShouldBe}")
-            if context:
-                self.printInfo(F"Context is {context}")
-            return False
-        return True
-
-    # Find keyword in dictionary, checking for multiple matches
-    #   List can contain values with spaces. In this case, as many keywords as word count in list element are compared
-    def findInDict(self, keywords, startPtr, dict, text):
-        matchingList = []
-        # For each item in search list
+    # Returns keys of a dictionary split on spaces, cached to avoid splitting them on each search
+    #   Result is (entries, sorted first parts, their entry positions, positions of entries with non ASCII first part)
+    #   Each entry is (key, key parts, converted key parts), converted part being None when part is not ASCII
+    #       (for ASCII parts, converting a part prefix gives same result than taking converted part prefix)
+    #   Not used for FF_deviceRegistry, which searches keys on its own columns (see FF_deviceRegistry.matchingKeys)
+    def keyParts(self, dict):
+        cached = self.keyPartsCache.get(id(dict))
+        # Keep a reference on dict to make sure its id is not reused, and check it (or conversion) was not modified
+        if cached != None and cached[0] is dict and cached[1] == len(dict) and cached[2] == self.convertUtf8ToAscii7Input:
+            return cached[3]
+        entries = []
+        firstParts = []
+        otherPositions = []
         for item in dict.keys():
-            # Split item using space as separator
             itemParts = item.split(" ")
+            convertedParts = [(part.lower() if self.convertUtf8ToAscii7Input else part) if part.isascii() else None for part in itemParts]
+            if convertedParts[0] != None:
+                firstParts.append((convertedParts[0], len(entries)))
+            else:
+                otherPositions.append(len(entries))
+            entries.append((item, itemParts, convertedParts))
+        firstParts.sort()
+        result = (entries, [part for part, position in firstParts], [position for part, position in firstParts], otherPositions)
+        self.keyPartsCache[id(dict)] = (dict, len(dict), self.convertUtf8ToAscii7Input, result)
+        return result
+
+    # Forget cached key parts of a section content being replaced (and of mappings it contains)
+    def forgetKeyParts(self, content):
+        if type(content).__name__ == "dict":
+            self.keyPartsCache.pop(id(content), None)
+            for item in content.values():
+                if type(item).__name__ == "dict" and type(item.get("mapping")).__name__ == "dict":
+                    self.keyPartsCache.pop(id(item["mapping"]), None)
+
+    # Returns list of dictionary keys matching keywords, stopping on first match if requested
+    #   List can contain values with spaces. In this case, as many keywords as word count in list element are compared
+    def matchingKeys(self, keywords, startPtr, dict, stopOnFirst=False):
+        matchingList = []
+        # Convert keywords only once
+        givenKeywords = keywords[startPtr:]
+        if not givenKeywords:
+            return matchingList
+        convertedKeywords = [self.convertUserData(keyword) for keyword in givenKeywords]
+        # Registry compares keys on its own columns
+        if isinstance(dict, FF_deviceRegistry):
+            return dict.matchingKeys(givenKeywords, convertedKeywords, self.convertUserData, self.convertUtf8ToAscii7Input, stopOnFirst)
+        # Only keys with first part starting with first keyword can match, in dictionary order
+        entries, firstParts, firstPositions, otherPositions = self.keyParts(dict)
+        low = bisect.bisect_left(firstParts, convertedKeywords[0])
+        high = bisect.bisect_left(firstParts, convertedKeywords[0] + chr(0x10FFFF))
+        candidates = [entries[position] for position in sorted(firstPositions[low:high] + otherPositions)]
+        # For each candidate item
+        for item, itemParts, convertedParts in candidates:
+            # Check that we have enough keywords
+            if len(itemParts) > len(givenKeywords):
+                continue
             matchFound = True
             # For each keyword in item
-            for ptr in range(0, len(itemParts)):
-                # Check that we're still within keyword count
-                if len(keywords) <= startPtr + ptr:
-                    # No, this is not correct
-                    matchFound = False
+            for ptr in range(len(itemParts)):
+                # Are the keyword chars same as item?
+                keywordLength = len(givenKeywords[ptr])
+                if convertedParts[ptr] != None:
+                    itemPart = convertedParts[ptr][:keywordLength]
                 else:
-                    # Are the keyword chars same as item?
-                    if self.convertUserData(itemParts[ptr][:len(keywords[startPtr+ptr])]) != self.convertUserData(keywords[startPtr+ptr]):
-                        # No, this is not correct
-                        matchFound = False
+                    itemPart = self.convertUserData(itemParts[ptr][:keywordLength])
+                if itemPart != convertedKeywords[ptr]:
+                    matchFound = False
+                    break
             # If we got a match
             if matchFound:
                 # Add item to the list
                 matchingList.append(item)
+                if stopOnFirst:
+                    break
+        return matchingList
+
+    # Find keyword in dictionary, checking for multiple matches
+    #   List can contain values with spaces. In this case, as many keywords as word count in list element are compared
+    def findInDict(self, keywords, startPtr, dict, text):
+        matchingList = self.matchingKeys(keywords, startPtr, dict)
         if len(matchingList) == 0:
             self.printError(F"{keywords[startPtr:]} is not a known {text}, use "+str(dict.keys()).replace("dict_keys(","")[:-1])
             return ""
@@ -235,232 +282,313 @@ class FF_analyzeCommand:
     # Lookup keyword in dictionary, stopping on first match
     #   List can contain values with spaces. In this case, as many keywords as word count in list element are compared
     def lookupInDict(self, keywords, startPtr, dict):
-        matchingList = []
-        # For each item in search list
-        for item in dict.keys():
-            # Split item using space as separator
-            itemParts = item.split(" ")
-            matchFound = True
-            # For each keyword in item
-            for ptr in range(0, len(itemParts)):
-                # Check that we're still within keyword count
-                if len(keywords) <= startPtr + ptr:
-                    # No, this is not correct
-                    matchFound = False
+        matchingList = self.matchingKeys(keywords, startPtr, dict, True)
+        return matchingList[0] if matchingList else ""
+
+    # Reports a validation error on current section and key, keeping it as a structured diagnostic
+    def validationError(self, problem, context=None):
+        self.diagnostics.append(FF_diagnostic(self.checkSection, self.checkKey, problem, context))
+        self.printError(F"Error analyzing {self.checkFile}, when {self.checkPhase}: {problem}")
+        if context != None:
+            self.printInfo(F"Context is {context}")
+
+    # Check type of a value, reporting an error and returning False if not allowed
+    def checkType(self, msg, value, allowedTypes, context=None):
+        typeName = type(value).__name__
+        if typeName == allowedTypes if type(allowedTypes).__name__ == "str" else typeName in allowedTypes:
+            return True
+        self.validationError(F"{msg} ({value}) is {typeName}, should be {allowedTypes}", context)
+        return False
+
+    # Check that a value is in a set of (converted) keys, reporting an error and returning False if not
+    #   keySet is built once per section by convertedKeys, shownKeys are displayed in error message
+    #   Values which can't be in a set (list, dict) are reported as not in keys
+    def checkIn(self, msg, value, keySet, shownKeys, context=None):
+        convertedValue = self.convertUserData(value)
+        if type(convertedValue).__name__ not in ["list", "dict"] and convertedValue in keySet:
+            return True
+        self.validationError(F"{msg} is {value}, should be {shownKeys}", context)
+        return False
+
+    # Check that a value is not in ignore list, reporting an error and returning False if it is
+    def checkNotIgnored(self, msg, value, context=None):
+        convertedValue = self.convertUserData(value)
+        if type(convertedValue).__name__ in ["list", "dict"] or convertedValue not in self.ignoresSet:
+            return True
+        self.validationError(F"{msg} ({value}) should not be in ignore list", context)
+        return False
+
+    # Returns a set of converted keys of a dictionary (or values of a list)
+    def convertedKeys(self, values):
+        if type(values).__name__ not in ["dict", "list", "FF_deviceRegistry"]:
+            return set()
+        return set(self.convertUserData(list(values)))
+
+    # Returns a printable list of dictionary keys
+    def shownKeys(self, dict):
+        return str(list(dict.keys())) if type(dict).__name__ == "dict" else str(dict)
+
+    # Returns hash of a section content
+    def sectionHash(self, content):
+        # Keys are not sorted, as their order is meaningful (first match wins, keys are listed in table order)
+        return hashlib.sha1(json.dumps(content, ensure_ascii=False, default=str).encode("UTF-8")).hexdigest()
+
+    ### Checking "settings": {"classAfterDevice": true, ...}
+    def checkSettings(self, settings):
+        if settings != None:
+            if self.checkType("settings type", settings, "dict"):
+                self.checkType("classAfterDevice type", self.getValue(settings, "classAfterDevice", False), "bool")
+
+    ### Checking "ignores": ["of", "the", ...]
+    def checkIgnores(self, ignores):
+        self.checkType("ignores type", ignores, "list")
+
+    ### Checking "commandValues": {"cdeOn":{"codeValue":1}, ...}
+    def checkCommandValues(self, commandValues):
+        if self.checkType("commandValues type", commandValues, "dict"):
+            for key, codeValueItem in commandValues.items():
+                self.checkKey = key
+                # Key should not be in ignore list
+                if self.checkNotIgnored("key", key):
+                    # Check codeValue (dict)
+                    if self.checkType("codeValueItem type", codeValueItem, "dict"):
+                        # Get the "codeValue" (int)
+                        self.checkType("codeValue type", self.getValue(codeValueItem, "codeValue"), "int", codeValueItem)
+
+    ### Checking "commandClasses": {"classOnOff":{"commandValue":["cdeOn","cdeOff","cdeShow"]}, ...}
+    def checkCommandClasses(self, commandClasses):
+        if self.checkType("commandClasses type", commandClasses, "dict"):
+            commandValueKeys = self.convertedKeys(self.commandValuesDict)
+            shownCommandValues = self.shownKeys(self.commandValuesDict)
+            for key, commandClass in commandClasses.items():
+                self.checkKey = key
+                # Key should not be in ignore list
+                if self.checkNotIgnored("key", key):
+                    if self.checkType("commandClass type", commandClass, "dict"):
+                        # Check commandValue keyword
+                        commandClassCommandValue = self.getValue(commandClass, "commandValue")
+                        if self.checkType("commandClass commandValue type", commandClassCommandValue, "list", commandClass):
+                            # Each element should be in commandValues
+                            for element in commandClassCommandValue:
+                                self.checkIn("commandValue", element, commandValueKeys, shownCommandValues, commandClass)
+
+    ### Checking "commands": {"turn":{"commandValue":"cdeSet"}, ...}
+    def checkCommands(self, commands):
+        if self.checkType("commands type", commands, "dict"):
+            commandValueKeys = self.convertedKeys(self.commandValuesDict)
+            shownCommandValues = self.shownKeys(self.commandValuesDict)
+            for key, commandItem in commands.items():
+                self.checkKey = key
+                # Key should not be in ignore list
+                if self.checkNotIgnored("key", key):
+                    if self.checkType("commandItem type", commandItem, "dict"):
+                        # Check command keyword, which should be in commandValues
+                        commandCommandValue = self.getValue(commandItem, "commandValue")
+                        if self.checkType("commandCommandValue type", commandCommandValue, "str", commandItem):
+                            self.checkIn("command commandValue", commandCommandValue, commandValueKeys, shownCommandValues, commandItem)
+
+    ### Checking "deviceClasses": {"boiler":{"commandClass":"classSet","setType":"level","mapping":{"off":0,"on":100}}, ...}
+    def checkDeviceClasses(self, deviceClasses):
+        if self.checkType("deviceClasses type", deviceClasses, "dict"):
+            commandClassKeys = self.convertedKeys(self.commandClassesDict)
+            shownCommandClasses = self.shownKeys(self.commandClassesDict)
+            setTypes = ['level', 'setPoint', 'integer', 'float', 'string']
+            setTypeKeys = self.convertedKeys(setTypes)
+            setByKeys = self.convertedKeys(['plugIn', 'user'])
+            # Command classes having one commandValue with a set attribute
+            setCommandClasses = set()
+            if type(self.commandClassesDict).__name__ == "dict":
+                for commandClass, commandClassItem in self.commandClassesDict.items():
+                    for item in self.getValue(commandClassItem, "commandValue", []) if type(commandClassItem).__name__ == "dict" else []:
+                        if type(item).__name__ == "str" and self.getValue2(self.commandValuesDict, item, "set", False):
+                            setCommandClasses.add(commandClass)
+                            break
+            for key, deviceClassItem in deviceClasses.items():
+                self.checkKey = key
+                # Key should not be in ignore list
+                if not self.checkNotIgnored("key", key) or not self.checkType("deviceClassItem type", deviceClassItem, "dict"):
+                    continue
+                # Check "commandClass", which should be in commandClasses
+                deviceCommandClass = self.getValue(deviceClassItem, "commandClass")
+                if not self.checkType("deviceCommandClass type", deviceCommandClass, "str", deviceClassItem) \
+                        or not self.checkIn("deviceClass value", deviceCommandClass, commandClassKeys, shownCommandClasses, deviceClassItem):
+                    continue
+                if deviceCommandClass not in setCommandClasses:
+                    # No set command, only commandClass is allowed
+                    for item in deviceClassItem.keys():
+                        if item != "commandClass":
+                            self.validationError(F"Can't understand {item} in {deviceClassItem} for {key}")
+                    continue
+                # Command has a set flag, get mandatory setType value
+                setType = self.getValue(deviceClassItem, "setType")
+                if self.checkType("setType type", setType, "str", deviceClassItem):
+                    self.checkIn("setType", setType, setTypeKeys, setTypes, deviceClassItem)
+                # Set min/max value depending on setType
+                if setType == 'level':
+                    minValue = 0
+                    maxValue = 100
                 else:
-                    # Are the keyword chars same as item?
-                    if self.convertUserData(itemParts[ptr][:len(keywords[startPtr+ptr])]) != self.convertUserData(keywords[startPtr+ptr]):
-                        # No, this is not correct
-                        matchFound = False
-            # If we got a match
-            if matchFound:
-                # Return item
-                return item
-        return ""
-
+                    minValue = None
+                    maxValue = None
+                # Set authorized data type(s) depending on setType
+                if setType == 'level' or setType == 'integer':
+                    allowedDataTypes = 'int'
+                elif setType == 'float' or setType == 'setPoint':
+                    allowedDataTypes = ['int', 'float']
+                else:
+                    allowedDataTypes = 'str'
+                # Scan all items in deviceClass item
+                for item, itemValue in deviceClassItem.items():
+                    if item == "mapping":
+                        # This should be a dict of mapping values, with authorized types
+                        if self.checkType("deviceClassMap type", itemValue, "dict", deviceClassItem):
+                            for mappingValue in itemValue.values():
+                                self.checkType("mapping value type", mappingValue, allowedDataTypes, deviceClassItem)
+                    elif item == "minValue":
+                        if self.checkType("minValue type", itemValue, allowedDataTypes, deviceClassItem):
+                            minValue = itemValue
+                    elif item == "maxValue":
+                        if self.checkType("maxValue type", itemValue, allowedDataTypes, deviceClassItem):
+                            maxValue = itemValue
+                    elif item == "list":
+                        # Check type as list, then each item in list
+                        if self.checkType("list type", itemValue, "list", deviceClassItem):
+                            for listItem in itemValue:
+                                self.checkType("list value type", listItem, allowedDataTypes, deviceClassItem)
+                    elif item == "setBy":
+                        self.checkIn("setBy", itemValue, setByKeys, ['plugIn', 'user'], deviceClassItem)
+                    elif item != "commandClass" and item != "setType":
+                        # An unknown item has been specified
+                        self.validationError(F"Can't understand {item} in {deviceClassItem} for {key}")
+                # Min should be <= to max
+                if minValue != None and maxValue != None and type(minValue).__name__ == type(maxValue).__name__ and minValue > maxValue:
+                    self.validationError(F"minValue ({minValue}) should be less or equal to maxValue ({maxValue})", deviceClassItem)
+
+    ### Checking "devices": {"south bedroom ac":{"index":19,"name":"South Bedroom A/C - Power"}, ...}
+    def checkDevices(self, devices):
+        if self.checkType("devices type", devices, "dict"):
+            deviceClassKeys = self.convertedKeys(self.deviceClassesDict)
+            shownDeviceClasses = self.shownKeys(self.deviceClassesDict)
+            for key, deviceItem in devices.items():
+                self.checkKey = key
+                if not self.checkType("deviceItem type", deviceItem, "dict"):
+                    continue
+                # Extract deviceClass item (first or last item)
+                deviceAndClass = key.split(" ")
+                deviceClass = deviceAndClass[-1] if self.classAfterDevice else deviceAndClass[0]
+                if deviceClass == "":
+                    self.validationError("device class should not be empty", deviceItem)
+                else:
+                    # Check for deviceClass in known list of deviceClasses
+                    self.checkIn("device class value", deviceClass, deviceClassKeys, shownDeviceClasses, deviceItem)
+                # Extract index, which should not be empty or zero
+                deviceIndex = self.getValue(deviceItem, "index")
+                if self.checkType("device index", deviceIndex, ["str", "int"]):
+                    if deviceIndex == "" or deviceIndex == 0:
+                        self.validationError(F"device index should not be {deviceIndex!r}", deviceItem)
+                # Each part of device name should not be in ignore list
+                for element in deviceAndClass:
+                    self.checkNotIgnored("part of key", element, F"Key is : {key}")
+
+    # Returns a copy of this analyzer, to load tables into without changing this one
+    #   Unchanged sections (and their validation) are shared, so loading copy only checks changed sections again
+    def copyForReload(self):
+        newAnalyzer = copy.copy(self)
+        newAnalyzer.keyPartsCache = dict(self.keyPartsCache)
+        newAnalyzer.validationCache = dict(self.validationCache)
+        return newAnalyzer
+
+    # Load and check tables, revalidating only sections (or sections they depend on) changed since last load
+    #   Returns short error message (empty if no error) and all messages. Structured errors are in self.diagnostics
     def loadData(self, fileName):
+        # Init error seen and messages
+        self.errorSeen = False
+        self.firstErrorMessage = ""
+        self.allMessages = ""
+        self.diagnostics = []
+        self.revalidatedSections = []
         # Load JSON file
         self.checkFile = pathlib.Path(fileName).name
         self.checkPhase = "checking file"
+        self.checkSection = None
+        self.checkKey = None
         decodeData = self.loadDictionary(fileName)
 
-        if decodeData:
-            ### Checking  decodeData (dict)
-            if self.compareType("decodeData type", decodeData, "dict"):
-                ### Loading classAfterDevice (True for English like languages, where device name is before device type)
-                self.classAfterDevice = self.getValue2(decodeData, "settings", "classAfterDevice", False)
-                ### Checking "ignores": ["of", "the", ...]
-                self.checkPhase = "checking ignores"
-                self.ignoresList = self.getValue(decodeData,"ignores")
-                # Extract all "ignores" (list)
-                if self.compareType("self.ignoresList type", self.ignoresList, "list"):
-                    pass
-            ### Checking "commandValues": {	"cdeOn":{"codeValue":1}, ...}
-            self.checkPhase = "checking command values"
-            self.commandValuesDict =  self.getValue(decodeData,"commandValues")
-            # Extract all "commandValues" (dict)
-            if self.compareType("commandValuesDict type", self.commandValuesDict, "dict"):
-                # For each item in self.commandValuesDict
-                for key in self.commandValuesDict.keys():
-                    # Key should not be in ignore list
-                    if self.notInIgnoreList("key", key):
-                        # Check codeValue (dict)
-                        codeValueItem = self.commandValuesDict[key]
-                        if self.compareType("codeValueItem type", codeValueItem, "dict"):
-                            # Get the "codeValue" (int)
-                            codeValue = self.getValue(codeValueItem, "codeValue")
-                            if self.compareType("codeValue type", codeValue, "int", codeValueItem):
-                                pass
-
-            ### Checking "commandClasses"
-            self.checkPhase = "checking commandClasses"
-            # Extract all "commandClasses": {"classOnOff":{"commandValue":["cdeOn","cdeOff","cdeShow"]}, ...}
-            self.commandClassesDict =  self.getValue(decodeData,"commandClasses")
-            if self.compareType("commandClass type", self.commandClassesDict, "dict"):
-                # For each item in self.commandClassesDict
-                for key in self.commandClassesDict.keys():
-                    # Key should not be in ignore list
-                    if self.notInIgnoreList("key", key):
-                        commandClass = self.commandClassesDict[key]
-                        if self.compareType("commandClass type", commandClass, "dict"):
-                            # Get the commandValue
-                            commandClassCommandValue = self.getValue(commandClass, "commandValue")
-                            # Check commandValue keyword
-                            if self.compareType("commandClass commandValue type", commandClassCommandValue, "list", commandClass):
-                                # Scan all elements in list
-                                for element in commandClassCommandValue:
-                                    # Element should be in valueKeywords
-                                    if self.compareValue("commandValue", element , self.commandValuesDict, commandClass):
-                                        pass
-
-            ### Checking "commands": {"turn":{"commandValue":"cdeSet"}, ...}
-            self.checkPhase = "checking commands"
-            # Extract all "commands" list
-            self.commandsDict =  self.getValue(decodeData,"commands")
-            if self.compareType("commandList type", self.commandsDict, "dict"):
-                # For each item in self.commandsDict
-                for key in self.commandsDict.keys():
-                    # Key should not be in ignore list
-                    if self.notInIgnoreList("key", key):
-                        commandItem = self.commandsDict[key]
-                        if self.compareType("commandItem type", commandItem, "dict"):
-                            # Get the first "command"
-                            commandCommandValue = self.getValue(commandItem, "commandValue")
-                            # Check command keyword
-                            if self.compareType("commandCommandValue type", commandCommandValue, "str", commandItem):
-                                # Value should be in self.commandValuesDict
-                                if self.compareValue("command commandValue", commandCommandValue , self.commandValuesDict, commandItem):
-                                    pass
-
-            ### Checking "deviceClasses": {"boiler":{"commandClass":"classSet","setType":"level","mapping":{"off":0,"on":100}}, ...}
-            self.checkPhase = "checking device classes"
-            # Extract all "deviceClasses"
-            self.deviceClassesDict =  self.getValue(decodeData,"deviceClasses")
-            if self.compareType("deviceClassesDict type", self.deviceClassesDict, "dict"):
-                # For each item in deviceClassesDict
-                for key in self.deviceClassesDict.keys():
-                    # Key should not be in ignore list
-                    if self.notInIgnoreList("key", key):
-                        deviceClassItem = self.deviceClassesDict[key]
-                        if self.compareType("deviceClassItem type", deviceClassItem, "dict"):
-                            # Load "commandClass"
-                            deviceCommandClass = self.getValue(deviceClassItem, "commandClass")
-                            # Check deviceCommandClass keyword
-                            if self.compareType("deviceCommandClass type", deviceCommandClass, "str", deviceClassItem):
-                                # deviceCommandClass should be in commandClasses
-                                if self.compareValue("deviceClass value", deviceCommandClass , self.commandClassesDict, deviceClassItem):
-                                    # Does the deviceCommandClass have one commandValue with a set attribute?
-                                    commandSet = False
-                                    # Scan all commandValues for this deviceCommandClass
-                                    for item in self.getValue2(self.commandClassesDict, deviceCommandClass, 'commandValue'):
-                                        # Does this commandValue have the set flag set?
-                                        if self.getValue2(self.commandValuesDict, item, "set", False):
-                                            # Yes, set flag
-                                            commandSet = True
-                                            break
-                                    # Check other elements giving commandSet flag
-                                    if commandSet:
-                                        # Command has a set flag, get mandatory setType value
-                                        self.valueToSetType = self.getValue(deviceClassItem, "setType")
-                                        # Check setType value as string
-                                        if self.compareType("setType type", self.valueToSetType, "str", deviceClassItem):
-                                            # Check for valid setType given
-                                            if self.compareValue("setType", self.valueToSetType, ['level','setPoint', 'integer', 'float','string']):
-                                                pass
-                                        # Set min/max value depending on setType
-                                        if self.valueToSetType == 'level':
-                                            minValue = 0
-                                            maxValue = 100
-                                        else:
-                                            minValue = None
-                                            maxValue = None
-                                        # Set authorized data type(s) depending on setType
-                                        if self.valueToSetType == 'level' or self.valueToSetType == 'integer':
-                                            allowedDataTypes = 'int'
-                                        elif self.valueToSetType == 'float' or self.valueToSetType == 'setPoint':
-                                            allowedDataTypes = ['int', 'float']
-                                        else:
-                                            allowedDataTypes = 'str'
-                                        # Scan all items in deviceClass item
-                                        for item in deviceClassItem.keys():
-                                                # Get item value
-                                                itemValue = deviceClassItem[item]
-                                                if item == "mapping":
-                                                    deviceClassMap = self.getValue(deviceClassItem, "mapping")
-                                                    # This should be a list of mapping value (dict)
-                                                    if self.compareType("deviceClassMap type", deviceClassMap, "dict", deviceClassItem):
-                                                        ## Check each value type against authorized ones
-                                                        for mappingKey in itemValue.keys():
-                                                            if self.compareType("mapping value type", itemValue[mappingKey], allowedDataTypes, deviceClassItem):
-                                                                pass
-                                                elif item == "minValue":
-                                                    if self.compareType("minValue type", itemValue, allowedDataTypes, deviceClassItem):
-                                                        minValue = itemValue
-                                                elif item == "maxValue":
-                                                    if self.compareType("minValue type", itemValue, allowedDataTypes, deviceClassItem):
-                                                        maxValue = itemValue
-                                                elif item == "list":
-                                                    # Check type as list
-                                                    if self.compareType("list type", itemValue, "list", deviceClassItem):
-                                                        # Check each item in list
-                                                        for item in itemValue:
-                                                            if self.compareType("list value type", item, allowedDataTypes, deviceClassItem):
-                                                                pass
-                                                elif item == "setBy":
-                                                    if self.compareValue("setBy", itemValue, ['plugIn', 'user']):
-                                                        pass
-                                                elif item != "commandClass" and item != "setType":
-                                                    # And unknown item has been specified
-                                                    self.printError(F"Can't understand {item} in {deviceClassItem} for {key}")
-                                        # Check for min/max values
-                                        if minValue != None and maxValue != None:
-                                            # Min should be <= to max
-                                            if minValue > minValue:
-                                                self.printError(F"minValue ({minValue}) should be less or equal to maxValue ({maxValue})")
-                                    else:
-                                        # Scan all items in deviceClass item
-                                        for item in deviceClassItem.keys():
-                                            if item != "commandClass":
-                                                self.printError(F"Can't understand {item} in {deviceClassItem} for {key}")
-
-            ### Checking "devices": {"south bedroom ac":{"index":19,"name":"South Bedroom A/C - Power"}, ...}
-            self.checkPhase = "checking devices"
-            # Extract all "devices"
-            self.devicesDict =  self.getValue(decodeData,"devices")
-            if self.compareType("self.devicesDict type", self.devicesDict, "dict"):
-                # For each item in self.devicesDict
-                for key in self.devicesDict.keys():
-                    deviceItem = self.devicesDict[key]
-                    if self.compareType("deviceItem type", deviceItem, "dict"):
-                        # Extract deviceClass item (first or last item)
-                        if self.classAfterDevice:
-                            self.deviceClass = key.split(" ")[len(key.split(" "))-1]
-                        else:
-                            self.deviceClass = key.split(" ")[0]
-                        if self.compareNotValue("device class", self.deviceClass, "", deviceItem):
-                            # Check for deviceClass in known list of deviceClasses
-                            if self.compareValue("device class value", self.deviceClass , self.deviceClassesDict, deviceItem):
-                                pass
-                        # Extract index
-                        deviceIndex = self.getValue(deviceItem, "index")
-                        if self.compareType("device index", deviceIndex, ["str", "int"]):
-                            # Index should not be empty or zero
-                            self.compareNotValue("device index", deviceIndex, "", deviceItem)
-                            self.compareNotValue("device index", deviceIndex, 0, deviceItem)
-                        # Extract each part of device name
-                        deviceAndClass = key.split(" ")
-                        for element in deviceAndClass:
-                            # element should not be in ignore list
-                            if self.notInIgnoreList("part of key", element, F"Key is : {key}"):
-                                pass
+        if decodeData and self.checkType("decodeData type", decodeData, "dict"):
+            # Compute hash of each section, keeping previous content of unchanged sections (and caches built on them)
+            previousHashes = self.sectionHashes
+            self.sectionHashes = {}
+            for section, attribute, default in self.SECTIONS:
+                content = self.getValue(decodeData, section, default)
+                self.sectionHashes[section] = self.sectionHash(content)
+                if attribute != None and (previousHashes.get(section) != self.sectionHashes[section] or getattr(self, attribute) == None):
+                    self.forgetKeyParts(getattr(self, attribute))
+                    setattr(self, attribute, content)
+            ### Loading classAfterDevice (True for English like languages, where device name is before device type)
+            self.classAfterDevice = self.getValue2(decodeData, "settings", "classAfterDevice", False)
+            self.ignoresSet = set(item for item in self.ignoresList if type(item).__name__ not in ["list", "dict"]) if type(self.ignoresList).__name__ == "list" else set()
+            # Check each section
+            for section, phase, checkFunction, dependencies in self.VALIDATIONS:
+                self.checkSection = section
+                self.checkKey = None
+                self.checkPhase = phase
+                # Validation result depends on section content, content of sections it depends on and conversion flags
+                validationKey = (tuple(self.sectionHashes[dependency] for dependency in [section] + dependencies),
+                    self.convertUtf8ToAscii7Input, self.convertUtf8ToAscii7Output, self.checkFile)
+                cached = self.validationCache.get(section)
+                if cached != None and cached[0] == validationKey:
+                    # Section unchanged, report same diagnostics again
+                    for diagnostic in cached[1]:
+                        self.checkKey = diagnostic.key
+                        self.validationError(diagnostic.problem, diagnostic.context)
+                else:
+                    diagnosticsCount = len(self.diagnostics)
+                    checkFunction(self, self.getValue(decodeData, section))
+                    self.validationCache[section] = (validationKey, self.diagnostics[diagnosticsCount:])
+                    self.revalidatedSections.append(section)
+            self.checkKey = None
+            # Replace devices by their compact form if requested (keeping existing registry if devices did not change)
+            if isinstance(self.devicesDict, FF_deviceRegistry) and (not self.compactDevices or self.devicesDict.classAfterDevice != self.classAfterDevice):
+                self.devicesDict = self.getValue(decodeData, "devices")
+            if self.compactDevices and type(self.devicesDict).__name__ == "dict":
+                self.devicesDict = FF_deviceRegistry(self.devicesDict, self.classAfterDevice)
+            # Forget cached key parts of dictionaries not used anymore
+            usedDicts = [self.commandValuesDict, self.commandClassesDict, self.commandsDict, self.deviceClassesDict, self.devicesDict]
+            if type(self.deviceClassesDict).__name__ == "dict":
+                usedDicts += [self.getValue(item, "mapping") for item in self.deviceClassesDict.values() if type(item).__name__ == "dict"]
+            usedIds = set(id(usedDict) for usedDict in usedDicts if usedDict != None)
+            self.keyPartsCache = {dictId: cached for dictId, cached in self.keyPartsCache.items() if dictId in usedIds}
         else:
-            self.printError(F"Can't load {fileName}")
+            self.checkSection = "file"
+            self.validationError(F"Can't load {fileName}")
         # Set final check status (first value is short error message, second one all detected errors)
         if self.errorSeen:
             return "Error detected, please check "+fileName+" file!", self.allMessages
         else:
             return "", self.allMessages
 
+    # Sections of smsTables.json: (name, attribute to load section into, default value)
+    SECTIONS = [
+        ("settings", None, None),
+        ("ignores", "ignoresList", []),
+        ("commandValues", "commandValuesDict", None),
+        ("commandClasses", "commandClassesDict", None),
+        ("commands", "commandsDict", None),
+        ("deviceClasses", "deviceClassesDict", None),
+        ("devices", "devicesDict", None)
+    ]
+
+    # Validation passes, in order: (section, check phase, check function, sections the check depends on)
+    VALIDATIONS = [
+        ("settings", "checking settings", checkSettings, []),
+        ("ignores", "checking ignores", checkIgnores, []),
+        ("commandValues", "checking command values", checkCommandValues, ["ignores"]),
+        ("commandClasses", "checking commandClasses", checkCommandClasses, ["ignores", "commandValues"]),
+        ("commands", "checking commands", checkCommands, ["ignores", "commandValues"]),
+        ("deviceClasses", "checking device classes", checkDeviceClasses, ["ignores", "commandValues", "commandClasses"]),
+        ("devices", "checking devices", checkDevices, ["settings", "ignores", "deviceClasses"])
+    ]
+
     def analyzeCommand(self, givenCommand):
         # Init error seen and last message
         self.errorSeen = False
@@ -635,8 +763,13 @@ class FF_analyzeCommand:
                                             self.printError(F"Can't understand {keywords[keywordIndex:]} after {self.deviceAndClass}")
                                     if not self.errorSeen:
                                         self.deviceName = self.deviceAndClass
-                                        self.deviceId = self.getValue2(self.devicesDict,self.deviceAndClass, "index")
-                                        self.deviceIdName = self.getValue2(self.devicesDict, self.deviceAndClass, "name")
+                                        if isinstance(self.devicesDict, FF_deviceRegistry):
+                                            # Read registry columns, without building device dictionary
+                                            self.deviceId = self.devicesDict.index(self.deviceAndClass)
+                                            self.deviceIdName = self.devicesDict.name(self.deviceAndClass)
+                                        else:
+                                            self.deviceId = self.getValue2(self.devicesDict,self.deviceAndClass, "index")
+                                            self.deviceIdName = self.getValue2(self.devicesDict, self.deviceAndClass, "name")
                                         self.commandValue = self.getValue2(self.commandValuesDict,commandCommandValue, "codeValue")
                                         self.commandValueText = commandCommandValue
         return self.firstErrorMessage, self.allMessages
@@ -0,0 +1,265 @@
+"""
+This code is a reference copy of FF_analyzeCommand matching functions (compare, findInDict, lookupInDict
+    and analyzeCommand), as they were before any speed optimization.
+
+It is used by differentialTest.py to check that optimized code gives exactly same results and messages.
+    Don't optimize (nor fix) this code: it defines expected behavior. Tables loading is not part of
+    reference, and is inherited from FF_analyzeCommand.
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+from FF_analyzeCommand import FF_analyzeCommand
+
+class FF_analyzeCommandReference(FF_analyzeCommand):
+    # Compare 2 values on shortest size with minimal length and eventual UTF-8 to ASCII 7 conversion
+    #   at user's disposal to make external tests with same behavior than this function
+    def compare(self, value1, value2, minLength=-1):
+        val1 = self.convertUserData(value1)
+        val2 = self.convertUserData(value2)
+        lenToTest = len(val1) if len(val1) <= len(val2) else len(val2)
+        if minLength >= 1:
+            if minLength > lenToTest: lenToTest = minLength
+
+        return val1[:lenToTest].lower() == val2[:lenToTest].lower()
+
+    # Find keyword in dictionary, checking for multiple matches
+    #   List can contain values with spaces. In this case, as many keywords as word count in list element are compared
+    def findInDict(self, keywords, startPtr, dict, text):
+        matchingList = []
+        # For each item in search list
+        for item in dict.keys():
+            # Split item using space as separator
+            itemParts = item.split(" ")
+            matchFound = True
+            # For each keyword in item
+            for ptr in range(0, len(itemParts)):
+                # Check that we're still within keyword count
+                if len(keywords) <= startPtr + ptr:
+                    # No, this is not correct
+                    matchFound = False
+                else:
+                    # Are the keyword chars same as item?
+                    if self.convertUserData(itemParts[ptr][:len(keywords[startPtr+ptr])]) != self.convertUserData(keywords[startPtr+ptr]):
+                        # No, this is not correct
+                        matchFound = False
+            # If we got a match
+            if matchFound:
+                # Add item to the list
+                matchingList.append(item)
+        if len(matchingList) == 0:
+            self.printError(F"{keywords[startPtr:]} is not a known {text}, use "+str(dict.keys()).replace("dict_keys(","")[:-1])
+            return ""
+        elif len(matchingList) > 1:
+            self.printError(F"{keywords[startPtr:]} is ambiguous {text}, could be {matchingList}")
+            return ""
+        else:
+            return matchingList[0]
+
+    # Lookup keyword in dictionary, stopping on first match
+    #   List can contain values with spaces. In this case, as many keywords as word count in list element are compared
+    def lookupInDict(self, keywords, startPtr, dict):
+        matchingList = []
+        # For each item in search list
+        for item in dict.keys():
+            # Split item using space as separator
+            itemParts = item.split(" ")
+            matchFound = True
+            # For each keyword in item
+            for ptr in range(0, len(itemParts)):
+                # Check that we're still within keyword count
+                if len(keywords) <= startPtr + ptr:
+                    # No, this is not correct
+                    matchFound = False
+                else:
+                    # Are the keyword chars same as item?
+                    if self.convertUserData(itemParts[ptr][:len(keywords[startPtr+ptr])]) != self.convertUserData(keywords[startPtr+ptr]):
+                        # No, this is not correct
+                        matchFound = False
+            # If we got a match
+            if matchFound:
+                # Return item
+                return item
+        return ""
+
+    # Analyze a command, setting result in analyzer attributes
+    def analyzeCommand(self, givenCommand):
+        # Init error seen and last message
+        self.errorSeen = False
+        self.firstErrorMessage = ""
+        self.allMessages= ""
+        self.command = ""                                   # Command
+        self.commandValue = 0                               # Command value in numeric format
+        self.commandValueText = ""                          # Command value in text format
+        self.deviceAndClass = ""                            # Device with class name
+        self.deviceName = ""                                # Device with class name (for compatibility)
+        self.deviceId = 0                                   # DeviceId
+        self.deviceIdName = ""                              # Name of deviceId
+        self.deviceClass = ""                               # Device class to select in filterClass
+        self.valueToSet = None                              # Value to set
+        self.valueToSetType = None                          # Value to set type
+        self.valueToSetOriginal = None                      # Original Value to set (for mapping)
+        self.setBy = None                                   # Value to be set by 'user' or 'plugIn'
+
+        # Split each word of message, replacing tabs by spaces  
+        keywords = givenCommand.replace("\t"," ").split(" ")
+
+        # Remove words to ignore
+        for ptr in range(len(keywords)):
+            if keywords[ptr] in self.ignoresList:
+                keywords[ptr] = ""
+
+        # Rebuild command and clean leading/trailing spaces
+        cleanCommand = " ".join(keywords).strip()
+
+        # Remove double spaces
+        while cleanCommand.find("  ") != -1:
+            cleanCommand = cleanCommand.replace("  ", " ")
+        
+        # Split each word of cleaned message
+        keywords = cleanCommand.split(" ")
+
+        # Isolate command in first keyword
+        keywordIndex = 0
+        self.command = self.findInDict(keywords, keywordIndex, self.commandsDict, "command")
+        if self.command != "":
+            ##self.printInfo(F"Command is {self.command}")
+            # move index into keywords
+            keywordIndex += len(self.command.split(" "))
+            # Isolate deviceClass in second keyword
+            #if len(keywords) < keywordIndex + 1:
+            #    self.printError("No device class given!")
+            #else:
+            # Does the full device name/device class exists?
+            self.deviceAndClass = self.findInDict(keywords, keywordIndex, self.devicesDict, "device")
+            self.deviceClass = ""
+            if self.deviceAndClass != "":
+                if self.classAfterDevice:
+                    localIndex = keywordIndex + len(self.deviceAndClass.split(" ")) - 1
+                    self.deviceClass = self.findInDict(keywords, localIndex, self.deviceClassesDict, "commandClass")
+                else:
+                    self.deviceClass = self.findInDict(keywords, keywordIndex, self.deviceClassesDict, "commandClass")
+            if self.deviceClass != "":
+                keywordIndex += len(self.deviceAndClass.split(" "))
+                ##printInfp(F"Device class is {self.deviceClass}")
+                # Get commandClass class
+                deviceCommandClass = self.getValue2(self.deviceClassesDict, self.deviceClass, "commandClass")
+                if not deviceCommandClass:
+                    self.printError(F"Can't find {self.deviceClass} command class...")
+                else:
+                    ##self.printInfo(F"{self.deviceClass} device class is {deviceCommandClass}")
+                    # Get deviceClass commandValue
+                    commandClassCommandValue = self.getValue2(self.commandClassesDict, deviceCommandClass, "commandValue")
+                    if not commandClassCommandValue:
+                        self.printError(F"Can't find {deviceCommandClass} device commandClass commandValue...")
+                    else:
+                        ##self.printInfo(F"{deviceCommandClass} commandValue is {commandClassCommandValue}")
+                        # Get command commandValue
+                        commandCommandValue = self.getValue2(self.commandsDict, self.command, "commandValue")
+                        if not commandCommandValue:
+                            self.printError(F"Can't find {self.command} command commandValue...")
+                        else:
+                            ##self.printInfo(F"{self.command} command is {commandCommandValue}")
+                            if commandCommandValue not in commandClassCommandValue:
+                                self.printError(F"Can't do command {self.command} on device class {self.deviceClass}")
+                            else:
+                                if self.deviceAndClass != "":
+                                    ##self.printInfo(F"Device is {self.deviceAndClass}"")
+                                    # Is command set enabled?
+                                    commandSet = self.getValue2(self.commandValuesDict, commandCommandValue, "set", False)
+                                    ##self.printInfo(F"{command} set is {commandSet}")
+                                    # Is this a set command?
+                                    if commandSet:
+                                        # Extract all remaining keywords in value to set
+                                        self.valueToSet = ""
+                                        for ptr in range(keywordIndex, len(keywords)):
+                                            self.valueToSet += keywords[ptr]+ " "
+                                        self.valueToSet = self.valueToSet.strip()
+                                        ##self.printInfo(F"Value to set is {self.valueToSet}")
+                                        # Do we have a value to set?
+                                        if self.valueToSet != "":
+                                            # Extract setType value
+                                            self.valueToSetType = self.getValue2(self.deviceClassesDict, self.deviceClass, "setType")
+                                            # Do we have mapping associated with class?
+                                            deviceClassMap = self.getValue2(self.deviceClassesDict, self.deviceClass, "mapping")
+                                            if deviceClassMap:
+                                                # Substitute first val  ue to set to mapped value
+                                                self.valueToSetOriginal = self.findInDict(keywords, keywordIndex, deviceClassMap, "mapping")
+                                                if self.valueToSetOriginal != "":
+                                                    # Load remapped value
+                                                    self.valueToSet = self.getValue(deviceClassMap, self.valueToSetOriginal)
+                                                    keywordIndex += len(self.valueToSetOriginal)
+                                                    # Do we have remaining keywords?
+                                                    if keywordIndex + 1 < len(keywords):
+                                                        self.printError(F"Can't understand {keywords[keywordIndex:]} after {self.valueToSet}")
+                                            # Do we have a list associated with class?
+                                            deviceClasslist = self.getValue2(self.deviceClassesDict, self.deviceClass, "list")
+                                            if deviceClasslist and self.compareValue("value", self.valueToSet, deviceClasslist, givenCommand):
+                                                pass
+                                            # Do we have a minValue or maxValue?
+                                            deviceClassMinValue = self.getValue2(self.deviceClassesDict, self.deviceClass, "minValue", None)
+                                            deviceClassMaxValue = self.getValue2(self.deviceClassesDict, self.deviceClass, "maxValue")
+                                            # Set authorized data type(s) depending on setType
+                                            if self.valueToSetType == 'level':
+                                                try:
+                                                    dummy = int(self.valueToSet)
+                                                except ValueError:
+                                                    self.printError(F"({self.valueToSet}) is not a valid number")
+                                                    return
+                                                if deviceClassMinValue == None:
+                                                    deviceClassMinValue = 0
+                                                if deviceClassMaxValue == None:
+                                                    deviceClassMaxValue = 100
+                                                if dummy < int(deviceClassMinValue):
+                                                    self.printError(F"Given value ({dummy}) should not be less than {deviceClassMinValue}")
+                                                    return
+                                                if dummy > int(deviceClassMaxValue):
+                                                    self.printError(F"Given value ({dummy}) should not be greater than {deviceClassMaxValue}")
+                                                    return
+                                            elif self.valueToSetType == 'integer':
+                                                try:
+                                                    dummy = int(self.valueToSet)
+                                                except ValueError:
+                                                    self.printError(F"({self.valueToSet}) is not a valid number")
+                                                    return
+                                                if deviceClassMinValue != None and dummy < int(deviceClassMinValue):
+                                                    self.printError(F"Given value ({dummy}) should not be less than {deviceClassMinValue}")
+                                                    return
+                                                if deviceClassMaxValue != None and dummy > int(deviceClassMaxValue):
+                                                    self.printError(F"Given value ({dummy}) should not be greater than {deviceClassMaxValue}")
+                                                    return
+                                            elif self.valueToSetType == 'float' or self.valueToSetType == 'setPoint':
+                                                try:
+                                                    dummy = float(self.valueToSet)
+                                                except ValueError:
+                                                    self.printError(F"({self.valueToSet}) is not a valid floating point")
+                                                    return
+                                                if deviceClassMinValue != None and dummy < float(deviceClassMinValue):
+                                                    self.printError(F"Given value ({dummy}) should not be less than {deviceClassMinValue}")
+                                                    return
+                                                if deviceClassMaxValue != None and dummy > float(deviceClassMaxValue):
+                                                    self.printError(F"Given value ({dummy}) should not be greater than {deviceClassMaxValue}")
+                                                    return
+                                            else:
+                                                if deviceClassMinValue != None and self.valueToSet < deviceClassMinValue:
+                                                    self.printError(F"Given value ({self.valueToSet}) should not be less than {deviceClassMinValue}")
+                                                    return
+                                                if deviceClassMaxValue != None and self.valueToSet > deviceClassMaxValue:
+                                                    self.printError(F"Given value ({self.valueToSet}) should not be greater than {deviceClassMaxValue}")
+                                                    return
+                                            # Load setBy
+                                            self.setBy = self.getValue2(self.deviceClassesDict, self.deviceClass, "setBy", "plugIn")
+                                        else:
+                                            self.printError("Value to set is missing")
+                                    else:
+                                        # Do we have an available keyword?
+                                        if keywordIndex < len(keywords):
+                                            self.printError(F"Can't understand {keywords[keywordIndex:]} after {self.deviceAndClass}")
+                                    if not self.errorSeen:
+                                        self.deviceName = self.deviceAndClass
+                                        self.deviceId = self.getValue2(self.devicesDict,self.deviceAndClass, "index")
+                                        self.deviceIdName = self.getValue2(self.devicesDict, self.deviceAndClass, "name")
+                                        self.commandValue = self.getValue2(self.commandValuesDict,commandCommandValue, "codeValue")
+                                        self.commandValueText = commandCommandValue
+        return self.firstErrorMessage, self.allMessages
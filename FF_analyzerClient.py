@@ -0,0 +1,117 @@
+"""
+This code is a client of FF_analyzerServer (see analyzerDaemon.py), on localhost or on a Unix domain socket.
+
+Connection is kept open between requests, and latency of each request (as seen by client) is measured.
+    When server closed a kept open connection, idempotent requests (GET, analyze) are sent again once
+    on a new connection. Other requests (reload) are never sent twice.
+
+Usage example:
+    client = FF_analyzerClient(socketPath="/tmp/analyzerDaemon.sock")
+    result = client.analyze("turn kitchen light on")
+    if result["error"] == "":
+        print(result["understood"])
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+import http.client
+import json
+import socket
+import time
+from FF_latencyStats import FF_latencyStats
+
+# HTTP connection on a Unix domain socket
+class FF_unixHTTPConnection(http.client.HTTPConnection):
+    # Class initialization
+    def __init__(self, socketPath, timeout=10.0):
+        http.client.HTTPConnection.__init__(self, "localhost", timeout=timeout)
+        self.socketPath = socketPath                        # Unix domain socket path
+
+    # Connect to Unix domain socket
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socketPath)
+
+class FF_analyzerClient:
+    # Class initialization
+    #   Give socketPath to connect to a Unix domain socket, else host and port are used
+    def __init__(self, host="127.0.0.1", port=8765, socketPath=None, timeout=10.0):
+        self.fileVersion = "1.0.0"                          # File version
+        self.host = host                                    # Server host
+        self.port = port                                    # Server port
+        self.socketPath = socketPath                        # Server Unix domain socket
+        self.timeout = timeout                              # Request timeout (seconds)
+        self.connection = None                              # Current connection
+        self.latencyStats = FF_latencyStats()               # Latency of requests
+
+    # Returns an open connection
+    def connect(self):
+        if self.connection == None:
+            if self.socketPath:
+                self.connection = FF_unixHTTPConnection(self.socketPath, self.timeout)
+            else:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self.connection
+
+    # Send a request on current connection, returning response and its JSON answer
+    def send(self, method, path, body, headers):
+        connection = self.connect()
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        try:
+            answer = response.read()
+        except OSError as exception:
+            # Answer was partly received, request shouldn't be sent again
+            raise http.client.HTTPException(F"Connection lost while reading answer: {exception}")
+        return response, json.loads(answer.decode("UTF-8"))
+
+    # Send a request and returns its JSON answer (raise an exception on error)
+    def request(self, method, path, data=None):
+        body = json.dumps(data).encode("UTF-8") if data != None else None
+        headers = {"Content-Type": "application/json"} if body != None else {}
+        idempotent = method == "GET" or path == "/analyze"
+        reused = self.connection != None
+        startTime = time.perf_counter()
+        try:
+            response, answer = self.send(method, path, body, headers)
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            # Kept open connection may have been closed by server before answering: retry once on a new one
+            self.close()
+            if not (reused and idempotent):
+                raise
+            response, answer = self.send(method, path, body, headers)
+        except (OSError, http.client.HTTPException, ValueError):
+            self.close()
+            raise
+        self.latencyStats.add(time.perf_counter() - startTime)
+        if response.status != 200:
+            raise RuntimeError(F"Error {response.status} from analyzer server: {answer.get('error')}")
+        return answer
+
+    # Analyze one command, returning its result
+    def analyze(self, command):
+        return self.request("POST", "/analyze", {"command": command})
+
+    # Analyze a list of commands, returning list of results
+    def analyzeBatch(self, commands):
+        return self.request("POST", "/analyze", {"commands": list(commands)})["results"]
+
+    # Ask server to reload tables
+    def reload(self):
+        return self.request("POST", "/reload", {})
+
+    # Returns server metrics
+    def getServerMetrics(self):
+        return self.request("GET", "/metrics")
+
+    # Returns client side latency statistics
+    def getMetrics(self):
+        return self.latencyStats.getMetrics()
+
+    # Close connection
+    def close(self):
+        if self.connection != None:
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,203 @@
+"""
+This code serves FF_analyzeCommand over HTTP, on localhost or on a Unix domain socket.
+
+Tables are loaded (and indexed) once, when server starts. Other tools can then analyze commands
+    with a simple HTTP request, without loading tables again:
+    - POST /analyze with {"command": "..."} returns result of one command,
+    - POST /analyze with {"commands": ["...", "..."]} returns {"results": [...]}, one result per command,
+    - POST /reload loads tables again (with one table file, only changed sections are checked again;
+        with multiple files, unchanged files are skipped and language indexes rebuilt only if a file changed),
+        into a copy of analyzer which replaces current one only if tables are valid,
+    - GET /metrics returns request and analysis latency statistics.
+
+Result of a command contains error message ("" if command was understood) and all messages, and
+    if understood, command, device and value to set, as analyzer attributes.
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+import errno
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from FF_analyzeCommand import FF_analyzeCommand
+from FF_multiLanguageAnalyzer import FF_multiLanguageAnalyzer
+from FF_latencyStats import FF_latencyStats
+
+# HTTP server on a Unix domain socket
+class FF_unixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    # Remove socket file left by a previous run before binding (but never another kind of file, nor a socket still in use)
+    def server_bind(self):
+        if os.path.lexists(self.server_address):
+            if not stat.S_ISSOCK(os.lstat(self.server_address).st_mode):
+                raise FileExistsError(F"{self.server_address} exists and is not a socket, won't replace it")
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probeSocket:
+                try:
+                    probeSocket.connect(self.server_address)
+                except ConnectionRefusedError:
+                    # Nobody listens on socket anymore
+                    os.remove(self.server_address)
+                else:
+                    raise OSError(errno.EADDRINUSE, F"{self.server_address} is used by a running server")
+        socketserver.UnixStreamServer.server_bind(self)
+
+# Handles one HTTP request
+class FF_analyzerRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Send a JSON answer
+    def sendJson(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("UTF-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Execute a request, measuring its latency
+    def execute(self, method):
+        startTime = time.perf_counter()
+        try:
+            status, data = self.server.analyzerServer.execute(method, self.path, self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except Exception as exception:
+            status, data = 500, {"error": F"{type(exception).__name__}: {exception}"}
+        self.sendJson(status, data)
+        self.server.analyzerServer.requestLatency.add(time.perf_counter() - startTime)
+
+    def do_GET(self):
+        self.execute("GET")
+
+    def do_POST(self):
+        self.execute("POST")
+
+    # Log requests only if server is verbose
+    def log_message(self, format, *args):
+        if self.server.analyzerServer.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    # Client address is not a tuple on Unix domain socket
+    def address_string(self):
+        return str(self.client_address[0]) if type(self.client_address).__name__ == "tuple" else "unix"
+
+# Handles one HTTP request over TCP
+class FF_analyzerTCPRequestHandler(FF_analyzerRequestHandler):
+    disable_nagle_algorithm = True                          # Don't delay small answers (TCP_NODELAY, not supported on Unix domain sockets)
+
+class FF_analyzerServer:
+    # Class initialization
+    #   fileNames: table files (one per language, language being detected if more than one)
+    def __init__(self, fileNames, compactDevices=False, verbose=False):
+        self.fileVersion = "1.0.0"                          # File version
+        self.fileNames = fileNames                          # Table files
+        self.verbose = verbose                              # Log each request?
+        if len(fileNames) > 1:
+            self.analyzer = FF_multiLanguageAnalyzer(compactDevices)
+        else:
+            self.analyzer = FF_analyzeCommand()             # Command analyzer
+            self.analyzer.compactDevices = compactDevices
+        self.lock = threading.Lock()                        # Analyzer is not thread safe
+        self.httpServer = None                              # HTTP server
+        self.requestLatency = FF_latencyStats()             # Latency of requests (from request read to answer sent)
+        self.analysisLatency = FF_latencyStats()            # Latency of analysis of one command
+        self.requestCount = 0                               # Count of analyze requests
+        self.commandCount = 0                               # Count of analyzed commands
+        self.errorCount = 0                                 # Count of commands not understood
+        self.loadTime = None                                # Duration of last tables load
+
+    # Load (or reload) tables, returning short error message (empty if no error) and all messages
+    #   Tables are loaded in a copy of analyzer, used only if tables are valid (else current tables are kept)
+    def loadData(self):
+        with self.lock:
+            startTime = time.perf_counter()
+            analyzer = self.analyzer.copyForReload()
+            errorText, messages = analyzer.loadData(self.fileNames if len(self.fileNames) > 1 else self.fileNames[0])
+            if errorText == "":
+                self.analyzer = analyzer
+            self.loadTime = time.perf_counter() - startTime
+        return errorText, messages
+
+    # Returns result of one command analysis (lock should be held)
+    def analyze(self, givenCommand):
+        analyzer = self.analyzer
+        startTime = time.perf_counter()
+        analyzer.analyzeCommand(givenCommand)
+        self.analysisLatency.add(time.perf_counter() - startTime)
+        self.commandCount += 1
+        result = {"command": givenCommand, "error": analyzer.firstErrorMessage, "messages": analyzer.allMessages}
+        if isinstance(analyzer, FF_multiLanguageAnalyzer):
+            result["language"] = analyzer.language
+        if analyzer.firstErrorMessage != "":
+            self.errorCount += 1
+            return result
+        result["understood"] = analyzer.command+" "+analyzer.deviceName+(" "+str(analyzer.valueToSet) if analyzer.valueToSet != None else "")
+        for name in ["commandValue", "commandValueText", "deviceName", "deviceId", "deviceIdName", "deviceClass", "valueToSet", "valueToSetOriginal", "setBy"]:
+            result[name] = getattr(analyzer, name)
+        return result
+
+    # Execute a request, returning HTTP status and JSON data
+    def execute(self, method, path, body):
+        if method == "GET" and path == "/metrics":
+            return 200, self.getMetrics()
+        if method == "POST" and path == "/reload":
+            errorText, messages = self.loadData()
+            return (200 if errorText == "" else 500), {"error": errorText, "messages": messages, "loadMs": round(self.loadTime * 1000, 3)}
+        if method == "POST" and path == "/analyze":
+            try:
+                request = json.loads(body.decode("UTF-8"))
+            except Exception as exception:
+                return 400, {"error": F"Can't decode request: {exception}"}
+            if type(request).__name__ != "dict":
+                return 400, {"error": "Request should be a dictionary"}
+            if type(request.get("command")).__name__ == "str":
+                with self.lock:
+                    self.requestCount += 1
+                    return 200, self.analyze(request["command"])
+            if type(request.get("commands")).__name__ == "list" and all(type(command).__name__ == "str" for command in request["commands"]):
+                with self.lock:
+                    self.requestCount += 1
+                    return 200, {"results": [self.analyze(command) for command in request["commands"]]}
+            return 400, {"error": "Request should contain 'command' (string) or 'commands' (list of strings)"}
+        return 404, {"error": F"Can't understand {method} {path}"}
+
+    # Returns server statistics
+    def getMetrics(self):
+        metrics = {
+            "requests": self.requestCount,
+            "commands": self.commandCount,
+            "errors": self.errorCount,
+            "loadMs": round(self.loadTime * 1000, 3) if self.loadTime != None else None,
+            "requestLatency": self.requestLatency.getMetrics(),
+            "analysisLatency": self.analysisLatency.getMetrics()
+        }
+        if isinstance(self.analyzer, FF_multiLanguageAnalyzer):
+            metrics["languages"] = self.analyzer.getMetrics()
+        return metrics
+
+    # Create HTTP server, on a Unix domain socket if given, else on host and port
+    def bind(self, host="127.0.0.1", port=8765, socketPath=None):
+        if socketPath:
+            self.httpServer = FF_unixHTTPServer(socketPath, FF_analyzerRequestHandler)
+        else:
+            self.httpServer = ThreadingHTTPServer((host, port), FF_analyzerTCPRequestHandler)
+        self.httpServer.analyzerServer = self
+        return self.httpServer
+
+    # Serve requests until shutdown is called
+    def serveForever(self):
+        self.httpServer.serve_forever()
+
+    # Stop serving requests
+    def shutdown(self):
+        if self.httpServer != None:
+            self.httpServer.shutdown()
+            self.httpServer.server_close()
+            if type(self.httpServer.server_address).__name__ == "str" and os.path.exists(self.httpServer.server_address):
+                os.remove(self.httpServer.server_address)
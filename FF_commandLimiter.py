@@ -0,0 +1,178 @@
+"""
+This code limits count of commands sent to Domoticz and not yet answered.
+
+Limit follows an AIMD (additive increase, multiplicative decrease) scheme:
+    - each answer received within target latency increases limit by about one per round trip,
+    - an answer received late, or no answer within timeout, divides limit by a given factor.
+
+Limit starts at its maximum (or given initial limit). Commands over limit are queued, and sent when an answer
+    (or a timeout) frees a slot.
+
+When a matchFunction(item, answer) is given, each answer is matched with the command it answers: answers
+    matching no command sent are discarded. Else, answers are supposed to come in same order than commands,
+    and can't be checked: commands dropped on timeout are kept during one more timeout, next answers being
+    discarded as their late answers. An answer really lost still shifts following answers, until a command
+    times out without any answer received after it.
+
+A maximum limit of 0 disables limiting: commands are sent immediately, answers being still matched to
+    commands (for latency and timeouts) unless trackAnswers is False (when no answer is expected).
+
+Sending is delegated to a user given function, called as sendFunction(item).
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+import threading
+import time
+from collections import deque
+
+class FF_commandLimiter:
+    # Class initialization
+    #   maxLimit: maximum in-flight limit (0 to disable limiting)
+    #   initialLimit: in-flight limit at start (None for maxLimit)
+    #   trackAnswers: keep sent commands until answered? (False if no answer is expected)
+    #   matchFunction: function returning True if an answer is the one of an item (None if answers can't be matched)
+    def __init__(self, sendFunction, targetLatency=2.0, timeout=10.0, minLimit=1, maxLimit=10, increase=1.0, decrease=0.5, smoothing=0.2,
+            initialLimit=None, trackAnswers=True, matchFunction=None):
+        self.fileVersion = "1.0.0"                          # File version
+        self.sendFunction = sendFunction                    # Function to call to send an item
+        self.targetLatency = targetLatency                  # Latency (seconds) under which limit may grow
+        self.timeout = timeout                              # Delay (seconds) after which a command is considered lost
+        self.minLimit = minLimit                            # Minimum in-flight limit
+        self.maxLimit = maxLimit                            # Maximum in-flight limit
+        self.increase = increase                            # Limit increase per round trip
+        self.decrease = decrease                            # Limit multiplier on overload
+        self.smoothing = smoothing                          # Smoothing factor of average latency
+        self.limited = maxLimit > 0                         # Is in-flight count limited?
+        self.trackAnswers = trackAnswers                    # Keep sent commands until answered?
+        self.matchFunction = matchFunction                  # Function matching an answer with an item (item, answer)
+        self.limit = float(min(max(initialLimit if initialLimit != None else maxLimit, minLimit), maxLimit) if self.limited else 0)
+        self.inFlight = deque()                             # Sent commands waiting for an answer (sent time, item)
+        self.pending = deque()                              # Commands waiting for a free slot
+        self.expired = deque()                              # Commands dropped on timeout, whose late answer may still come (drop time, item)
+        self.lock = threading.Lock()                        # Protect queues and counters
+        self.lastLatency = None                             # Last measured latency
+        self.averageLatency = None                          # Smoothed latency
+        self.lastDecrease = 0.0                             # Time of last limit decrease
+        self.sentCount = 0                                  # Count of commands sent
+        self.answeredCount = 0                              # Count of commands answered
+        self.timeoutCount = 0                               # Count of commands without answer
+        self.unexpectedCount = 0                            # Count of answers without command
+        self.lateCount = 0                                  # Count of answers discarded as late answers of dropped commands
+
+    # Submit an item, sending it now if limit allows it, queuing it else
+    def submit(self, item):
+        with self.lock:
+            self.pending.append(item)
+            toSend = self.release()
+        self.send(toSend)
+
+    # Signal an answer, returning answered item and its latency (or None, None if answer is discarded)
+    #   answer: answer content, given to matchFunction
+    def answerReceived(self, answer=None):
+        now = time.monotonic()
+        with self.lock:
+            # Forget dropped commands after one more timeout
+            while self.expired and now - self.expired[0][0] > self.timeout:
+                self.expired.popleft()
+            if self.matchFunction != None:
+                # Late answer of a dropped command?
+                for entry in self.expired:
+                    if self.matchFunction(entry[1], answer):
+                        self.expired.remove(entry)
+                        self.lateCount += 1
+                        return None, None
+                entry = next((entry for entry in self.inFlight if self.matchFunction(entry[1], answer)), None)
+                if entry == None:
+                    self.unexpectedCount += 1
+                    return None, None
+                self.inFlight.remove(entry)
+            elif self.expired:
+                # Answers come in order: first answers after a drop are late answers of dropped commands
+                self.expired.popleft()
+                self.lateCount += 1
+                return None, None
+            elif not self.inFlight:
+                self.unexpectedCount += 1
+                return None, None
+            else:
+                entry = self.inFlight.popleft()
+            sentTime, item = entry
+            self.answeredCount += 1
+            latency = now - sentTime
+            self.lastLatency = latency
+            if self.averageLatency == None:
+                self.averageLatency = latency
+            else:
+                self.averageLatency += self.smoothing * (latency - self.averageLatency)
+            if not self.limited:
+                pass
+            elif latency <= self.targetLatency:
+                # Additive increase, spread over answers of a full window
+                self.limit = min(self.maxLimit, self.limit + self.increase / self.limit)
+            else:
+                self.backOff(now)
+            toSend = self.release()
+        self.send(toSend)
+        return item, latency
+
+    # Drop commands waiting for an answer longer than timeout, returning dropped items
+    def checkTimeouts(self):
+        now = time.monotonic()
+        dropped = []
+        with self.lock:
+            for entry in [entry for entry in self.inFlight if now - entry[0] > self.timeout]:
+                self.inFlight.remove(entry)
+                self.expired.append((now, entry[1]))
+                dropped.append(entry[1])
+            if dropped:
+                self.timeoutCount += len(dropped)
+                self.backOff(now)
+            toSend = self.release()
+        self.send(toSend)
+        return dropped
+
+    # Multiplicative decrease, at most once per average latency (lock should be held)
+    def backOff(self, now):
+        if self.limited and now - self.lastDecrease >= (self.averageLatency or 0.0):
+            self.limit = max(self.minLimit, self.limit * self.decrease)
+            self.lastDecrease = now
+
+    # Move pending items to in-flight while limit allows it, returning items to send (lock should be held)
+    def release(self):
+        toSend = []
+        now = time.monotonic()
+        while self.pending and (not self.limited or len(self.inFlight) < int(self.limit)):
+            item = self.pending.popleft()
+            if self.trackAnswers:
+                self.inFlight.append((now, item))
+            self.sentCount += 1
+            toSend.append(item)
+        return toSend
+
+    # Send a list of items
+    def send(self, items):
+        for item in items:
+            self.sendFunction(item)
+
+    # Returns count of commands waiting for a free slot
+    def pendingCount(self):
+        with self.lock:
+            return len(self.pending)
+
+    # Returns limiter statistics
+    def getMetrics(self):
+        with self.lock:
+            return {
+                "limit": round(self.limit, 2) if self.limited else None,
+                "inFlight": len(self.inFlight),
+                "pending": len(self.pending),
+                "lastLatency": round(self.lastLatency, 3) if self.lastLatency != None else None,
+                "averageLatency": round(self.averageLatency, 3) if self.averageLatency != None else None,
+                "sent": self.sentCount,
+                "answered": self.answeredCount,
+                "timeouts": self.timeoutCount,
+                "unexpected": self.unexpectedCount,
+                "late": self.lateCount
+            }
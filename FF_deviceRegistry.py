@@ -0,0 +1,242 @@
+"""
+This code keeps "devices" part of smsTables.json in a memory compact form, for very large tables.
+
+Instead of one dictionary per device, devices are stored in columns:
+    - device index, in an integer array (non integer indexes are kept apart),
+    - device name, in a list of strings,
+    - device class and words of device key, as ids of interned tokens, in integer arrays.
+
+Registry behaves as a read only dictionary of devices ("south bedroom ac" -> {"index":12, "name":"..."}),
+    and can be used in place of devicesDict. Lookups by device key are O(1), but each dictionary access
+    builds a new device dictionary: use index, name and deviceClass to read columns directly.
+
+Search of device keys matching keywords (used by FF_analyzeCommand.matchingKeys) is done on these columns:
+    words are converted once per distinct token, and rows are grouped by first word in an integer array.
+
+Tradeoff: registry uses about 4 times less memory than dictionaries (whole analyzer, as measured by
+    benchmarkTables.py), and analysis (which reads columns) is not slower. But loading tables is slower,
+    and dictionary interface ([], get, values, items) is much slower than a plain dictionary, as each access
+    builds a device dictionary: avoid it in loops over all devices.
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+import bisect
+import sys
+from array import array
+
+NOT_GIVEN = object()                                        # Marker of attribute not given
+
+class FF_deviceRegistry:
+    MISSING_INDEX = -2**63                                  # Value of index column when index is not an integer
+
+    # Class initialization
+    #   devicesDict: "devices" part of smsTables.json
+    #   classAfterDevice: is class last word of device key (else first one)?
+    def __init__(self, devicesDict=None, classAfterDevice=False):
+        self.fileVersion = "1.0.0"                          # File version
+        self.classAfterDevice = classAfterDevice            # Is class after device?
+        self.tokens = []                                    # Interned tokens (words of device keys)
+        self.tokenIds = {}                                  # Token -> token id
+        self.keyRows = {}                                   # Device key -> row
+        self.rowKeys = []                                   # Device key per row
+        self.indexes = array("q")                           # Device index (integer) per row
+        self.otherIndexes = {}                              # Device index (non integer) per row
+        self.names = []                                     # Device name per row (or None)
+        self.classIds = array("l")                          # Device class token id per row
+        self.keyTokens = array("l")                         # Token ids of all device keys
+        self.keyOffsets = array("l", [0])                   # Offset of first token of each row in keyTokens
+        self.extras = {}                                    # Other device attributes per row
+        self.searchIndexes = {}                             # First word search index, per conversion mode (see searchIndex)
+        if devicesDict:
+            for key, deviceItem in devicesDict.items():
+                self.add(key, deviceItem)
+
+    # Returns id of a token, adding it if needed
+    def tokenId(self, token):
+        tokenId = self.tokenIds.get(token)
+        if tokenId == None:
+            tokenId = len(self.tokens)
+            token = sys.intern(token)
+            self.tokens.append(token)
+            self.tokenIds[token] = tokenId
+        return tokenId
+
+    # Add a device
+    def add(self, key, deviceItem):
+        if key in self.keyRows:
+            raise KeyError(F"Device {key} already in registry")
+        row = len(self.names)
+        key = sys.intern(key)
+        self.keyRows[key] = row
+        self.rowKeys.append(key)
+        self.searchIndexes = {}
+        parts = key.split(" ")
+        for part in parts:
+            self.keyTokens.append(self.tokenId(part))
+        self.keyOffsets.append(len(self.keyTokens))
+        self.classIds.append(self.tokenId(parts[-1] if self.classAfterDevice else parts[0]))
+        deviceIndex = deviceItem.get("index", NOT_GIVEN) if type(deviceItem).__name__ == "dict" else NOT_GIVEN
+        # Integers not fitting in a 64 bits array item are kept apart
+        if type(deviceIndex).__name__ == "int" and self.MISSING_INDEX < deviceIndex < 2**63:
+            self.indexes.append(deviceIndex)
+        else:
+            self.indexes.append(self.MISSING_INDEX)
+            if deviceIndex is not NOT_GIVEN:
+                self.otherIndexes[row] = deviceIndex
+        deviceName = deviceItem.get("name") if type(deviceItem).__name__ == "dict" else None
+        self.names.append(deviceName)
+        if type(deviceItem).__name__ == "dict":
+            extra = {item: value for item, value in deviceItem.items() if item != "index" and item != "name"}
+            if extra:
+                self.extras[row] = extra
+
+    # Returns row of a device key (KeyError if not found)
+    def row(self, key):
+        return self.keyRows[key]
+
+    # Returns index of a device (None if not defined)
+    def index(self, key):
+        row = self.keyRows[key]
+        deviceIndex = self.indexes[row]
+        if deviceIndex == self.MISSING_INDEX:
+            return self.otherIndexes.get(row)
+        return deviceIndex
+
+    # Returns name of a device (None if not defined)
+    def name(self, key):
+        return self.names[self.keyRows[key]]
+
+    # Returns class of a device
+    def deviceClass(self, key):
+        return self.tokens[self.classIds[self.keyRows[key]]]
+
+    # Returns words of a device key, without splitting it
+    def keyParts(self, key):
+        row = self.keyRows[key]
+        return [self.tokens[tokenId] for tokenId in self.keyTokens[self.keyOffsets[row]:self.keyOffsets[row + 1]]]
+
+    # Returns list of device keys with given class
+    def devicesOfClass(self, deviceClass):
+        classId = self.tokenIds.get(deviceClass)
+        if classId == None:
+            return []
+        return [self.rowKeys[row] for row in range(len(self.rowKeys)) if self.classIds[row] == classId]
+
+    # Returns search index of device keys by first word, built once per conversion mode
+    #   lowerCase: are ASCII words compared in lower case?
+    #   Result is (converted token per token id, None if token is not ASCII, sorted distinct converted first words,
+    #       offset of rows of each first word in first word rows, first word rows, rows with non ASCII first word)
+    def searchIndex(self, lowerCase):
+        searchIndex = self.searchIndexes.get(lowerCase)
+        if searchIndex != None:
+            return searchIndex
+        convertedTokens = [(token.lower() if lowerCase else token) if token.isascii() else None for token in self.tokens]
+        rowsOfWord = {}
+        otherRows = array("l")
+        for row in range(len(self.rowKeys)):
+            firstWord = convertedTokens[self.keyTokens[self.keyOffsets[row]]]
+            if firstWord != None:
+                rowsOfWord.setdefault(firstWord, []).append(row)
+            else:
+                otherRows.append(row)
+        firstWords = sorted(rowsOfWord.keys())
+        wordOffsets = array("l", [0])
+        wordRows = array("l")
+        for firstWord in firstWords:
+            wordRows.extend(rowsOfWord[firstWord])
+            wordOffsets.append(len(wordRows))
+        searchIndex = (convertedTokens, firstWords, wordOffsets, wordRows, otherRows)
+        self.searchIndexes[lowerCase] = searchIndex
+        return searchIndex
+
+    # Returns device keys matching keywords in registry order (as FF_analyzeCommand.matchingKeys), stopping on first match if requested
+    #   Each word of a key should start with (converted) keyword at same position
+    #   givenKeywords: keywords as given, convertedKeywords: same converted by convertFunction
+    #   lowerCase: are ASCII words compared in lower case?
+    def matchingKeys(self, givenKeywords, convertedKeywords, convertFunction, lowerCase, stopOnFirst=False):
+        convertedTokens, firstWords, wordOffsets, wordRows, otherRows = self.searchIndex(lowerCase)
+        # Only keys with first word starting with first keyword can match
+        low = bisect.bisect_left(firstWords, convertedKeywords[0])
+        high = bisect.bisect_left(firstWords, convertedKeywords[0] + chr(0x10FFFF))
+        rows = wordRows[wordOffsets[low]:wordOffsets[high]]
+        if high - low > 1 or otherRows:
+            rows = sorted(rows + otherRows)
+        keywordLengths = [len(keyword) for keyword in givenKeywords]
+        keyTokens = self.keyTokens
+        keyOffsets = self.keyOffsets
+        matchingList = []
+        for row in rows:
+            start = keyOffsets[row]
+            wordCount = keyOffsets[row + 1] - start
+            # Check that we have enough keywords
+            if wordCount > len(givenKeywords):
+                continue
+            for ptr in range(wordCount):
+                tokenId = keyTokens[start + ptr]
+                convertedToken = convertedTokens[tokenId]
+                if convertedToken != None:
+                    word = convertedToken[:keywordLengths[ptr]]
+                else:
+                    word = convertFunction(self.tokens[tokenId][:keywordLengths[ptr]])
+                if word != convertedKeywords[ptr]:
+                    break
+            else:
+                matchingList.append(self.rowKeys[row])
+                if stopOnFirst:
+                    break
+        return matchingList
+
+    # Returns device attributes of a row, as given in smsTables.json
+    def rowItem(self, row):
+        deviceItem = {}
+        deviceIndex = self.indexes[row]
+        if deviceIndex != self.MISSING_INDEX:
+            deviceItem["index"] = deviceIndex
+        elif row in self.otherIndexes:
+            deviceItem["index"] = self.otherIndexes[row]
+        if self.names[row] != None:
+            deviceItem["name"] = self.names[row]
+        if row in self.extras:
+            deviceItem.update(self.extras[row])
+        return deviceItem
+
+    # Returns approximate memory used by registry, in bytes
+    def memoryUsage(self):
+        size = sys.getsizeof(self.tokens) + sys.getsizeof(self.tokenIds) + sys.getsizeof(self.keyRows) + sys.getsizeof(self.rowKeys)
+        size += sum(sys.getsizeof(token) for token in self.tokens)
+        size += sum(sys.getsizeof(key) for key in self.keyRows.keys())
+        size += sys.getsizeof(self.names) + sum(sys.getsizeof(name) for name in self.names if name != None)
+        size += sys.getsizeof(self.indexes) + sys.getsizeof(self.classIds) + sys.getsizeof(self.keyTokens) + sys.getsizeof(self.keyOffsets)
+        size += sys.getsizeof(self.otherIndexes) + sys.getsizeof(self.extras)
+        for convertedTokens, firstWords, wordOffsets, wordRows, otherRows in self.searchIndexes.values():
+            size += sys.getsizeof(convertedTokens) + sys.getsizeof(firstWords) + sys.getsizeof(wordOffsets) + sys.getsizeof(wordRows) + sys.getsizeof(otherRows)
+        return size
+
+    ### Read only dictionary interface
+
+    def __getitem__(self, key):
+        return self.rowItem(self.keyRows[key])
+
+    def __contains__(self, key):
+        return key in self.keyRows
+
+    def __len__(self):
+        return len(self.keyRows)
+
+    def __iter__(self):
+        return iter(self.keyRows)
+
+    def keys(self):
+        return self.keyRows.keys()
+
+    def values(self):
+        return (self.rowItem(row) for row in range(len(self.names)))
+
+    def items(self):
+        return ((key, self.rowItem(row)) for key, row in self.keyRows.items())
+
+    def get(self, key, default=None):
+        row = self.keyRows.get(key)
+        return self.rowItem(row) if row != None else default
@@ -0,0 +1,70 @@
+"""
+This code simulates Domoticz (and its SMS LUA script) for domoticzSms.py tests.
+
+It reads commands sent on Domoticz in topic with SMS command idx, and answers them on Domoticz out topic
+    with SMS answer idx, as Domoticz LUA script does. Commands are executed one after the other, each
+    one taking a given processing time, in order to simulate a slow (or slowing down) Domoticz.
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+import json
+import queue
+import threading
+import time
+
+class FF_fakeDomoticz:
+    # Class initialization
+    #   mqttClient: MQTT client (paho.mqtt.client or FF_memoryBroker client), not yet connected
+    #   processingTime: time (seconds) to process each command
+    def __init__(self, mqttClient, messageIdx=9999, answerIdx=9998, inTopic="domoticz/in", outTopic="domoticz/out", processingTime=0.0):
+        self.fileVersion = "1.0.0"                          # File version
+        self.mqttClient = mqttClient                        # MQTT client
+        self.messageIdx = messageIdx                        # Domoticz SMS command idx
+        self.answerIdx = answerIdx                          # Domoticz SMS answer idx
+        self.inTopic = inTopic                              # Domoticz in topic
+        self.outTopic = outTopic                            # Domoticz out topic
+        self.processingTime = processingTime                # Time to process a command (can be changed at any time)
+        self.commands = queue.Queue()                       # Commands waiting to be processed
+        self.receivedCount = 0                              # Count of commands received
+        self.answeredCount = 0                              # Count of commands answered
+        self.thread = threading.Thread(target=self.run, name="FF_fakeDomoticz", daemon=True)
+        mqttClient.on_connect = self.on_connect
+        mqttClient.on_message = self.on_message
+
+    # Executed when MQTT is connected
+    def on_connect(self, client, userdata, flags, rc):
+        self.mqttClient.subscribe(self.inTopic, 0)
+
+    # Executed when receiving a message from MQTT subscribed topics
+    def on_message(self, client, userdata, msg):
+        try:
+            jsonData = json.loads(msg.payload.decode("UTF-8"))
+        except:
+            return
+        if jsonData.get("command") == "udevice" and jsonData.get("idx") == self.messageIdx:
+            self.receivedCount += 1
+            self.commands.put(str(jsonData.get("svalue", "")))
+
+    # Start command processing
+    def start(self):
+        self.thread.start()
+
+    # Stop command processing
+    def stop(self):
+        self.commands.put(None)
+        self.thread.join()
+
+    # Process commands one after the other
+    def run(self):
+        while True:
+            command = self.commands.get()
+            if command == None:
+                return
+            if self.processingTime > 0:
+                time.sleep(self.processingTime)
+            # Answer as LUA script: "number commandValue deviceId ..." is answered with "OK number ..."
+            answer = {"idx": self.answerIdx, "name": "SMS answer", "nvalue": 0, "svalue1": "OK "+command}
+            self.answeredCount += 1
+            self.mqttClient.publish(self.outTopic, json.dumps(answer))
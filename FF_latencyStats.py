@@ -0,0 +1,61 @@
+"""
+This code keeps latency measures and computes their statistics (count, average, percentiles).
+
+Only last measures are kept (10000 by default), to keep memory and computation time bounded.
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+import threading
+from collections import deque
+
+class FF_latencyStats:
+    # Class initialization
+    def __init__(self, maxSamples=10000):
+        self.fileVersion = "1.0.0"                          # File version
+        self.samples = deque(maxlen=maxSamples)             # Last measures (seconds)
+        self.count = 0                                      # Count of all measures
+        self.total = 0.0                                    # Sum of all measures
+        self.maxValue = 0.0                                 # Maximum of all measures
+        self.lock = threading.Lock()                        # Protect measures
+
+    # Add a measure (in seconds)
+    def add(self, value):
+        with self.lock:
+            self.samples.append(value)
+            self.count += 1
+            self.total += value
+            if value > self.maxValue:
+                self.maxValue = value
+
+    # Returns a percentile (0-100) of kept measures, or None if no measure
+    def percentile(self, percent):
+        with self.lock:
+            values = sorted(self.samples)
+        return self.percentileOf(values, percent)
+
+    # Returns a percentile (0-100) of a sorted list, or None if list is empty
+    def percentileOf(self, values, percent):
+        if not values:
+            return None
+        rank = int(round(percent / 100.0 * (len(values) - 1)))
+        return values[min(max(rank, 0), len(values) - 1)]
+
+    # Returns statistics in milliseconds
+    def getMetrics(self):
+        with self.lock:
+            values = sorted(self.samples)
+            count = self.count
+            total = self.total
+            maxValue = self.maxValue
+        def toMs(value):
+            return round(value * 1000.0, 3) if value != None else None
+        return {
+            "count": count,
+            "averageMs": toMs(total / count) if count else None,
+            "p50Ms": toMs(self.percentileOf(values, 50)),
+            "p90Ms": toMs(self.percentileOf(values, 90)),
+            "p99Ms": toMs(self.percentileOf(values, 99)),
+            "maxMs": toMs(maxValue) if count else None
+        }
@@ -0,0 +1,142 @@
+"""
+This code watches health of an MQTT client event loop (paho.mqtt.client loop_forever, or FF_memoryClient).
+
+Two lags are measured:
+    - callback lag: duration of each callback executed in loop thread (between callbackStarted and
+        callbackEnded), a callback stuck (for example on disk I/O) being seen while still running,
+    - loop lag: delay between publication of a heartbeat and its reception by the same client (heartbeats
+        being published on a topic this client is subscribed to), including time spent waiting behind
+        other messages.
+
+Loop is stalled when a callback runs for more than stallDelay seconds, or when a heartbeat published
+    while connected didn't come back after stallDelay seconds.
+
+When started by systemd with WatchdogSec set (NOTIFY_SOCKET and WATCHDOG_USEC in environment), notify
+    sends state to systemd (sd_notify protocol). "WATCHDOG=1" should only be sent while loop is healthy,
+    so that systemd restarts service when loop stalls.
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+import os
+import random
+import socket
+import threading
+import time
+from FF_latencyStats import FF_latencyStats
+
+class FF_loopWatchdog:
+    # Class initialization
+    #   stallDelay: delay (seconds) after which loop is considered stalled (0 to disable stall detection)
+    def __init__(self, stallDelay=60.0):
+        self.fileVersion = "1.0.0"                          # File version
+        self.stallDelay = stallDelay                        # Delay (seconds) after which loop is stalled
+        self.heartbeatId = "{:016x}".format(random.getrandbits(64)) # Identify our own heartbeats
+        self.connected = False                              # Is MQTT client connected?
+        self.sequence = 0                                   # Sequence number of last heartbeat sent
+        self.sentTimes = {}                                 # Heartbeats not yet received back (sequence -> sent time)
+        self.lock = threading.Lock()                        # Protect heartbeats not yet received back
+        self.callbackStart = None                           # Start time of running callback (None if none)
+        self.callbackStats = FF_latencyStats()              # Duration of callbacks
+        self.loopLagStats = FF_latencyStats()               # Delay between heartbeat sent and received
+        self.lastLoopLag = None                             # Last measured loop lag
+        self.stalled = False                                # Was loop stalled at last check?
+        self.stallCount = 0                                 # Count of detected stalls
+        self.notifySocket = os.environ.get("NOTIFY_SOCKET", "") # systemd notification socket (empty if not started by systemd)
+        # systemd watchdog interval (seconds, 0 if not enabled for this process)
+        watchdogPid = os.environ.get("WATCHDOG_PID", "")
+        self.watchdogInterval = int(os.environ.get("WATCHDOG_USEC", "0")) / 1e6 if self.notifySocket and (watchdogPid == "" or watchdogPid == str(os.getpid())) else 0.0
+
+    # Set connection state of MQTT client (heartbeats sent before are forgotten)
+    def setConnected(self, connected):
+        with self.lock:
+            self.connected = connected
+            self.sentTimes = {}
+
+    # Executed when a callback starts in loop thread
+    def callbackStarted(self):
+        self.callbackStart = time.monotonic()
+
+    # Executed when a callback ends in loop thread
+    def callbackEnded(self):
+        callbackStart = self.callbackStart
+        self.callbackStart = None
+        if callbackStart != None:
+            self.callbackStats.add(time.monotonic() - callbackStart)
+
+    # Returns identification of a new heartbeat (heartbeatId and sequence), to be added to published message
+    def heartbeatSent(self):
+        with self.lock:
+            self.sequence += 1
+            if self.connected:
+                self.sentTimes[self.sequence] = time.monotonic()
+            return {"heartbeatId": self.heartbeatId, "sequence": self.sequence}
+
+    # Executed when a heartbeat message is received, returns True if it's one of ours
+    def heartbeatReceived(self, data):
+        if type(data).__name__ != "dict" or data.get("heartbeatId") != self.heartbeatId:
+            return False
+        with self.lock:
+            sentTime = self.sentTimes.pop(data.get("sequence"), None)
+            if sentTime != None:
+                self.lastLoopLag = time.monotonic() - sentTime
+                self.loopLagStats.add(self.lastLoopLag)
+                # Previous heartbeats are lost
+                for sequence in [sequence for sequence in self.sentTimes.keys() if sequence < data["sequence"]]:
+                    del self.sentTimes[sequence]
+        return True
+
+    # Returns current lag (seconds): longest of last loop lag, oldest heartbeat not received back and running callback
+    def currentLag(self):
+        now = time.monotonic()
+        lag = self.lastLoopLag or 0.0
+        with self.lock:
+            sentTimes = list(self.sentTimes.values())
+        if sentTimes:
+            lag = max(lag, now - min(sentTimes))
+        callbackStart = self.callbackStart
+        if callbackStart != None:
+            lag = max(lag, now - callbackStart)
+        return lag
+
+    # Check loop health, returning reason of stall (empty if loop is healthy)
+    def check(self):
+        reason = ""
+        if self.stallDelay:
+            now = time.monotonic()
+            callbackStart = self.callbackStart
+            with self.lock:
+                sentTimes = list(self.sentTimes.values())
+            if callbackStart != None and now - callbackStart > self.stallDelay:
+                reason = F"callback running for {now - callbackStart:.1f}s"
+            elif sentTimes and now - min(sentTimes) > self.stallDelay:
+                reason = F"no heartbeat received for {now - min(sentTimes):.1f}s"
+        if reason and not self.stalled:
+            self.stallCount += 1
+        self.stalled = reason != ""
+        return reason
+
+    # Send a state to systemd (READY=1, WATCHDOG=1, STOPPING=1...), returns True if sent
+    def notify(self, state):
+        if not self.notifySocket:
+            return False
+        # Socket name starting with "@" is in abstract namespace
+        address = "\0"+self.notifySocket[1:] if self.notifySocket.startswith("@") else self.notifySocket
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as notifySocket:
+                notifySocket.sendto(state.encode("UTF-8"), address)
+            return True
+        except OSError:
+            return False
+
+    # Returns watchdog statistics
+    def getMetrics(self):
+        return {
+            "lagMs": round(self.currentLag() * 1000, 3),
+            "loopLag": self.loopLagStats.getMetrics(),
+            "callbacks": self.callbackStats.getMetrics(),
+            "stalled": self.stalled,
+            "stalls": self.stallCount,
+            "systemdWatchdog": self.watchdogInterval > 0
+        }
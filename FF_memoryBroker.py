@@ -0,0 +1,232 @@
+"""
+This code implements an in-memory MQTT broker stand-in, with clients mimicking paho.mqtt.client interface.
+
+It allows running domoticzSms.py code (and any other paho based code) on a single machine,
+    without network nor MQTT broker, for example in performance tests.
+
+Supported client functions are: username_pw_set, will_set, connect, connect_async, disconnect, subscribe,
+    unsubscribe, publish, loop_start, loop_stop and loop_forever, with on_connect, on_message and
+    on_subscribe callbacks. As with paho, callbacks are executed in client's loop thread.
+
+Retained messages and "+"/"#" wildcards are supported. QoS is accepted but ignored (no message is lost).
+
+Example:
+    broker = FF_memoryBroker()
+    client = broker.client("myClient")
+    client.on_message = onMessage
+    client.connect_async("localhost")
+    client.loop_start()
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+import queue
+import threading
+
+# Message given to on_message callback, as paho.mqtt.client.MQTTMessage
+class FF_memoryMessage:
+    __slots__ = ("topic", "payload", "qos", "retain", "mid")
+
+    # Class initialization
+    def __init__(self, topic, payload, qos=0, retain=False, mid=0):
+        self.topic = topic                                  # Message topic
+        self.payload = payload                              # Message payload (bytes)
+        self.qos = qos                                      # Message QoS
+        self.retain = 1 if retain else 0                    # Retain flag (set only for retained messages sent on subscribe)
+        self.mid = mid                                      # Message id
+
+# Result of publish, as paho.mqtt.client.MQTTMessageInfo
+class FF_memoryMessageInfo:
+    __slots__ = ("rc", "mid")
+
+    # Class initialization
+    def __init__(self, mid):
+        self.rc = 0                                         # Return code (always success)
+        self.mid = mid                                      # Message id
+
+    # Wait for message to be published (always immediate)
+    def wait_for_publish(self, timeout=None):
+        pass
+
+    # Is message published? (always true)
+    def is_published(self):
+        return True
+
+class FF_memoryBroker:
+    # Class initialization
+    def __init__(self):
+        self.fileVersion = "1.0.0"                          # File version
+        self.lock = threading.Lock()                        # Protect subscriptions and retained messages
+        self.subscriptions = []                             # List of (topic filter, client)
+        self.retained = {}                                  # Retained messages per topic
+        self.lastMid = 0                                    # Last message id
+        self.publishedCount = 0                             # Count of published messages
+        self.deliveredCount = 0                             # Count of delivered messages
+
+    # Returns a new client connected to this broker
+    def client(self, clientId=""):
+        return FF_memoryClient(self, clientId)
+
+    # Returns True if topic matches topic filter (with "+" and "#" wildcards)
+    def topicMatches(self, topicFilter, topic):
+        filterParts = topicFilter.split("/")
+        topicParts = topic.split("/")
+        for ptr in range(len(filterParts)):
+            if filterParts[ptr] == "#":
+                return True
+            if ptr >= len(topicParts):
+                return False
+            if filterParts[ptr] != "+" and filterParts[ptr] != topicParts[ptr]:
+                return False
+        return len(filterParts) == len(topicParts)
+
+    # Subscribe a client to a topic filter, returning retained messages matching it
+    def subscribe(self, client, topicFilter):
+        with self.lock:
+            if (topicFilter, client) not in self.subscriptions:
+                self.subscriptions.append((topicFilter, client))
+            return [message for topic, message in self.retained.items() if self.topicMatches(topicFilter, topic)]
+
+    # Unsubscribe a client from a topic filter (or all topic filters if None)
+    def unsubscribe(self, client, topicFilter=None):
+        with self.lock:
+            self.subscriptions = [(subscribedFilter, subscribedClient) for subscribedFilter, subscribedClient in self.subscriptions
+                if subscribedClient is not client or (topicFilter != None and subscribedFilter != topicFilter)]
+
+    # Publish a message to all subscribed clients, returning its message id
+    def publish(self, topic, payload, qos=0, retain=False):
+        if payload == None:
+            payload = b""
+        elif isinstance(payload, str):
+            payload = payload.encode("UTF-8")
+        elif not isinstance(payload, bytes):
+            payload = str(payload).encode("UTF-8")
+        with self.lock:
+            self.lastMid += 1
+            mid = self.lastMid
+            self.publishedCount += 1
+            if retain:
+                if payload:
+                    self.retained[topic] = FF_memoryMessage(topic, payload, qos, True, mid)
+                else:
+                    self.retained.pop(topic, None)
+            # Deliver once per client, even if multiple filters match
+            clients = []
+            for topicFilter, client in self.subscriptions:
+                if client not in clients and self.topicMatches(topicFilter, topic):
+                    clients.append(client)
+            self.deliveredCount += len(clients)
+        for client in clients:
+            client.deliver(FF_memoryMessage(topic, payload, qos, False, mid))
+        return mid
+
+class FF_memoryClient:
+    # Class initialization
+    def __init__(self, broker, clientId=""):
+        self.broker = broker                                # Broker to use
+        self.clientId = clientId                            # Client id
+        self.userdata = None                                # User data given to callbacks
+        self.on_connect = None                              # Connection callback (client, userdata, flags, rc)
+        self.on_message = None                              # Message callback (client, userdata, message)
+        self.on_subscribe = None                            # Subscription callback (client, userdata, mid, granted qos)
+        self.will = None                                    # Last will (topic, payload, qos, retain)
+        self.connected = False                              # Are we connected?
+        self.inbox = queue.Queue()                          # Events waiting to be executed in loop thread
+        self.thread = None                                  # Loop thread (loop_start)
+
+    # Set user name and password (ignored)
+    def username_pw_set(self, username, password=None):
+        pass
+
+    # Set user data given to callbacks
+    def user_data_set(self, userdata):
+        self.userdata = userdata
+
+    # Set last will, published on disconnect(unexpected=True)
+    def will_set(self, topic, payload=None, qos=0, retain=False):
+        self.will = (topic, payload, qos, retain)
+
+    # Connect to broker (host and port are ignored)
+    def connect(self, host="localhost", port=1883, keepalive=60):
+        self.connected = True
+        self.inbox.put(("connect", None))
+        return 0
+
+    # Connect to broker asynchronously (same as connect)
+    def connect_async(self, host="localhost", port=1883, keepalive=60):
+        return self.connect(host, port, keepalive)
+
+    # Disconnect from broker, publishing last will if disconnection is unexpected
+    def disconnect(self, unexpected=False):
+        if unexpected and self.will != None:
+            self.broker.publish(*self.will)
+        self.broker.unsubscribe(self)
+        self.connected = False
+        self.inbox.put(("stop", None))
+        return 0
+
+    # Subscribe to a topic filter
+    def subscribe(self, topic, qos=0):
+        retainedMessages = self.broker.subscribe(self, topic)
+        self.inbox.put(("subscribe", qos))
+        for message in retainedMessages:
+            self.deliver(message)
+        return (0, 0)
+
+    # Unsubscribe from a topic filter
+    def unsubscribe(self, topic):
+        self.broker.unsubscribe(self, topic)
+        return (0, 0)
+
+    # Publish a message
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        return FF_memoryMessageInfo(self.broker.publish(topic, payload, qos, retain))
+
+    # Queue a message for loop thread (called by broker)
+    def deliver(self, message):
+        self.inbox.put(("message", message))
+
+    # Execute events in inbox, returning False when loop should stop
+    #   timeout: maximum time to wait for first event (None to wait forever)
+    def loop(self, timeout=1.0):
+        try:
+            event, data = self.inbox.get(timeout=timeout)
+        except queue.Empty:
+            return True
+        while True:
+            if event == "stop":
+                return False
+            elif event == "connect" and self.on_connect != None:
+                self.on_connect(self, self.userdata, {}, 0)
+            elif event == "subscribe" and self.on_subscribe != None:
+                self.on_subscribe(self, self.userdata, 0, (data,))
+            elif event == "message" and self.on_message != None:
+                self.on_message(self, self.userdata, data)
+            try:
+                event, data = self.inbox.get_nowait()
+            except queue.Empty:
+                return True
+
+    # Execute callbacks until disconnect or loop_stop is called
+    def loop_forever(self):
+        while self.loop(None):
+            pass
+
+    # Start loop in a new thread
+    def loop_start(self):
+        if self.thread == None:
+            self.thread = threading.Thread(target=self.loop_forever, name="FF_memoryClient_"+self.clientId, daemon=True)
+            self.thread.start()
+
+    # Stop loop thread
+    def loop_stop(self, force=False):
+        if self.thread != None:
+            self.inbox.put(("stop", None))
+            if self.thread is not threading.current_thread():
+                self.thread.join()
+            self.thread = None
+
+    # Count of events waiting in inbox
+    def pendingCount(self):
+        return self.inbox.qsize()
@@ -0,0 +1,216 @@
+"""
+This code analyzes commands against several table sets (one per language) loaded at the same time.
+
+Language of each command is detected before analysis, using an index of each language vocabulary:
+    - first significant word should be (an abbreviation of) a command of the language,
+    - words to ignore ("the", "of", "le", "de"...) and words of commands and device keys give hints on language
+        (computed only when first word doesn't give language).
+    Command is analyzed with the only language knowing its first significant word as a command, its errors
+    being returned if analysis fails. Else detection is ambiguous: languages are tried by decreasing score,
+    hints being added to score, and errors returned are those of best scoring language.
+
+When loadData is called again, files not changed since last load (same name and content hash) are not loaded
+    again, and indexes are rebuilt only if a file changed. Changed files are loaded by a copy of their previous
+    analyzer (see FF_analyzeCommand.copyForReload), so only their changed sections are checked again.
+
+After analysis, analyzer attributes (command, deviceName, deviceId...) are those of the language used,
+    so this class can be used in place of FF_analyzeCommand.
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+import copy
+import hashlib
+import pathlib
+import time
+from FF_analyzeCommand import FF_analyzeCommand
+
+class FF_multiLanguageAnalyzer:
+    # Class initialization
+    def __init__(self, compactDevices=False):
+        self.fileVersion = "1.0.0"                          # File version
+        self.compactDevices = compactDevices                # Keep devices in a compact registry?
+        self.languages = []                                 # Language names, in load order
+        self.analyzers = []                                 # One FF_analyzeCommand per language
+        self.fileNames = []                                 # Loaded table files
+        self.fileStates = []                                # Per file, (content hash, error text, messages) of last load
+        self.reloadedFiles = []                             # Files really loaded by last loadData
+        self.ignoresIndex = {}                              # Word to ignore -> list of language positions
+        self.commandsIndex = []                             # Per language, (converted) command first word prefix -> count of commands
+        self.wordsIndex = {}                                # Word (lower case) of commands and device keys -> language positions
+        self.convertedWords = {}                            # Cache of converted words (word, conversion flag) -> converted word
+        self.current = FF_analyzeCommand()                  # Analyzer used for last command
+        self.language = ""                                  # Language used for last command
+        self.commandCount = 0                               # Count of analyzed commands
+        self.detectionTime = 0.0                            # Total time spent detecting language
+        self.analysisCount = 0                              # Count of analyses (more than one per command on fallback)
+        self.firstChoiceCount = 0                           # Count of commands understood with detected language
+        self.fallbackCount = 0                              # Count of commands understood with another language
+        self.ambiguousCount = 0                             # Count of commands with ambiguous language detection
+        self.languageCount = {}                             # Count of commands understood per language
+
+    # Load a list of table files (one per language, named after file name if not given)
+    #   Returns short error message (empty if no error) and all messages
+    def loadData(self, fileNames, languages=None):
+        if type(fileNames).__name__ == "str":
+            fileNames = [fileNames]
+        errorText = ""
+        allMessages = ""
+        previousAnalyzers = {self.fileNames[ptr]: (self.analyzers[ptr], self.fileStates[ptr]) for ptr in range(len(self.fileNames))}
+        self.languages = []
+        self.analyzers = []
+        self.fileStates = []
+        self.reloadedFiles = []
+        for ptr in range(len(fileNames)):
+            fileHash = self.fileHash(fileNames[ptr])
+            analyzer, fileState = previousAnalyzers.get(fileNames[ptr], (None, None))
+            if analyzer != None and fileHash != None and fileState[0] == fileHash and analyzer.compactDevices == self.compactDevices:
+                # File didn't change since last load
+                fileErrorText, messages = fileState[1], fileState[2]
+            else:
+                analyzer = analyzer.copyForReload() if analyzer != None else FF_analyzeCommand()
+                analyzer.compactDevices = self.compactDevices
+                fileErrorText, messages = analyzer.loadData(fileNames[ptr])
+                self.reloadedFiles.append(fileNames[ptr])
+            if fileErrorText and not errorText:
+                errorText = fileErrorText
+            allMessages += messages
+            self.languages.append(languages[ptr] if languages else pathlib.Path(fileNames[ptr]).stem)
+            self.analyzers.append(analyzer)
+            self.fileStates.append((fileHash, fileErrorText, messages))
+        fileListChanged = list(fileNames) != self.fileNames
+        self.fileNames = list(fileNames)
+        if self.analyzers and not self.reloadedFiles and not fileListChanged:
+            # Nothing changed, keep indexes
+            return errorText, allMessages
+        # Index words to ignore of all languages
+        self.ignoresIndex = {}
+        for ptr in range(len(self.analyzers)):
+            for word in self.analyzers[ptr].ignoresSet:
+                self.ignoresIndex.setdefault(word, []).append(ptr)
+        # Index words of commands and device keys of all languages
+        self.wordsIndex = {}
+        for ptr in range(len(self.analyzers)):
+            words = set()
+            for keys in [self.analyzers[ptr].commandsDict.keys(), self.analyzers[ptr].devicesDict.keys()]:
+                for key in keys:
+                    words.update(key.lower().split(" "))
+            for word in words:
+                self.wordsIndex.setdefault(word, []).append(ptr)
+        self.convertedWords = {}
+        # Index all prefixes of command first words, as they would be converted from user data
+        self.commandsIndex = []
+        for analyzer in self.analyzers:
+            prefixes = {}
+            for command in analyzer.commandsDict.keys():
+                firstWord = command.split(" ")[0]
+                for prefix in {analyzer.convertUserData(firstWord[:ptr]) for ptr in range(1, len(firstWord) + 1)}:
+                    prefixes[prefix] = prefixes.get(prefix, 0) + 1
+            self.commandsIndex.append(prefixes)
+        if self.analyzers:
+            self.current = self.analyzers[0]
+            self.language = self.languages[0]
+        return errorText, allMessages
+
+    # Returns a copy of this analyzer, to load tables into without changing this one
+    def copyForReload(self):
+        newAnalyzer = copy.copy(self)
+        newAnalyzer.languageCount = dict(self.languageCount)
+        newAnalyzer.convertedWords = {}
+        return newAnalyzer
+
+    # Returns hash of a file content (None if file can't be read)
+    def fileHash(self, fileName):
+        try:
+            with open(fileName, "rb") as tablesFile:
+                return hashlib.sha1(tablesFile.read()).hexdigest()
+        except OSError:
+            return None
+
+    # Returns a word converted as user data by an analyzer, converting each word only once per conversion flag
+    def convertedWord(self, analyzer, word):
+        cacheKey = (word, analyzer.convertUtf8ToAscii7Input)
+        convertedWord = self.convertedWords.get(cacheKey)
+        if convertedWord == None:
+            # Keep cache size bounded
+            if len(self.convertedWords) >= 10000:
+                self.convertedWords = {}
+            convertedWord = analyzer.convertUserData(word)
+            self.convertedWords[cacheKey] = convertedWord
+        return convertedWord
+
+    # Returns language positions ordered by decreasing score, and ambiguity flag
+    def detectLanguages(self, givenCommand):
+        languageCount = len(self.analyzers)
+        keywords = givenCommand.split()
+        # First significant word (not to ignore) being (an abbreviation of) a known command gives most points
+        scores = [0] * languageCount
+        for ptr in range(languageCount):
+            for keyword in keywords:
+                if ptr not in self.ignoresIndex.get(keyword, ()):
+                    matchingCount = self.commandsIndex[ptr].get(self.convertedWord(self.analyzers[ptr], keyword), 0)
+                    scores[ptr] = 10 if matchingCount == 1 else (5 if matchingCount > 1 else 0)
+                    break
+        # Not ambiguous if only one language knows this command
+        ambiguous = languageCount > 1 and not (max(scores) == 10 and scores.count(10) == 1)
+        if ambiguous:
+            # Words to ignore, and words of commands and device keys give one point to their languages
+            for keyword in keywords:
+                for ptr in self.ignoresIndex.get(keyword, ()):
+                    scores[ptr] += 1
+                for ptr in self.wordsIndex.get(keyword.lower(), ()):
+                    scores[ptr] += 1
+        # Sort is stable: on same score, languages are kept in load order
+        return sorted(range(languageCount), key=scores.__getitem__, reverse=True), ambiguous
+
+    # Analyze a command with detected language, trying other languages only if detection is ambiguous
+    #   Returns same value as FF_analyzeCommand.analyzeCommand of language used
+    def analyzeCommand(self, givenCommand):
+        self.commandCount += 1
+        startTime = time.perf_counter()
+        order, ambiguous = self.detectLanguages(givenCommand)
+        self.detectionTime += time.perf_counter() - startTime
+        if ambiguous:
+            self.ambiguousCount += 1
+        firstValues = None
+        for ptr in (order if ambiguous else order[:1]):
+            analyzer = self.analyzers[ptr]
+            self.analysisCount += 1
+            returnedValues = analyzer.analyzeCommand(givenCommand)
+            if firstValues == None:
+                firstValues = returnedValues
+            if analyzer.firstErrorMessage == "":
+                # Understood
+                self.current = analyzer
+                self.language = self.languages[ptr]
+                if ptr == order[0]:
+                    self.firstChoiceCount += 1
+                else:
+                    self.fallbackCount += 1
+                self.languageCount[self.language] = self.languageCount.get(self.language, 0) + 1
+                return returnedValues
+        # Not understood, keep errors of best scoring language
+        if order:
+            self.current = self.analyzers[order[0]]
+            self.language = self.languages[order[0]]
+            return firstValues
+        return self.current.firstErrorMessage, self.current.allMessages
+
+    # Returns language detection statistics
+    def getMetrics(self):
+        return {
+            "commands": self.commandCount,
+            "detectionUsPerCommand": round(self.detectionTime / self.commandCount * 1000000, 1) if self.commandCount else None,
+            "analysesPerCommand": round(self.analysisCount / self.commandCount, 3) if self.commandCount else None,
+            "firstChoiceHitRate": round(self.firstChoiceCount / self.commandCount, 3) if self.commandCount else None,
+            "fallbacks": self.fallbackCount,
+            "ambiguous": self.ambiguousCount,
+            "languages": dict(self.languageCount)
+        }
+
+    # Other attributes and functions (command, deviceName, compare...) are those of analyzer used for last command
+    def __getattr__(self, name):
+        if name == "current":
+            raise AttributeError(name)
+        return getattr(self.current, name)
@@ -0,0 +1,71 @@
+"""
+This code routes SMS messages to a target (site, tables...) depending on message prefix.
+
+Prefixes are indexed by their normalized form (converted to ASCII 7 and lower case), grouped by (given) length.
+    Routing a message looks up its normalized start once per distinct prefix length (longest first),
+    instead of comparing message with each prefix in turn. Cost depends on count of distinct prefix
+    lengths, not on count of prefixes.
+
+An empty prefix matches all messages not matching another prefix.
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+import time
+import unidecode
+
+class FF_prefixRouter:
+    # Class initialization
+    def __init__(self):
+        self.fileVersion = "1.0.0"                          # File version
+        self.prefixIndex = {}                               # Normalized prefix -> (prefix, target)
+        self.lengths = []                                   # Distinct prefix lengths, longest first
+        self.defaultTarget = None                           # Target of empty prefix
+        self.routedCount = 0                                # Count of routed messages
+        self.unroutedCount = 0                              # Count of messages without matching prefix
+        self.routingTime = 0.0                              # Total time spent routing messages
+
+    # Returns normalized form of a text
+    def normalize(self, text):
+        return unidecode.unidecode(text).lower()
+
+    # Add a prefix and its target
+    def add(self, prefix, target):
+        prefix = prefix.strip()
+        normalizedPrefix = self.normalize(prefix)
+        if normalizedPrefix == "":
+            if self.defaultTarget != None:
+                raise KeyError("Empty prefix already defined")
+            self.defaultTarget = target
+            return
+        if normalizedPrefix in self.prefixIndex:
+            raise KeyError(F"Prefix {prefix} already defined (as {self.prefixIndex[normalizedPrefix][0]})")
+        self.prefixIndex[normalizedPrefix] = (prefix, target)
+        self.lengths = sorted({len(item[0]) for item in self.prefixIndex.values()}, reverse=True)
+
+    # Returns target of a message (None if no prefix matches), and message without prefix
+    def route(self, message):
+        startTime = time.perf_counter()
+        result = (self.defaultTarget, message.strip())
+        for length in self.lengths:
+            entry = self.prefixIndex.get(self.normalize(message[:length]))
+            if entry != None:
+                result = (entry[1], message[length:].strip())
+                break
+        self.routingTime += time.perf_counter() - startTime
+        if result[0] == None:
+            self.unroutedCount += 1
+        else:
+            self.routedCount += 1
+        return result
+
+    # Returns routing statistics
+    def getMetrics(self):
+        messageCount = self.routedCount + self.unroutedCount
+        return {
+            "prefixes": len(self.prefixIndex) + (1 if self.defaultTarget != None else 0),
+            "routed": self.routedCount,
+            "unrouted": self.unroutedCount,
+            "routingUsPerSms": round(self.routingTime / messageCount * 1000000, 1) if messageCount else None
+        }
@@ -0,0 +1,126 @@
+"""
+This code merges SMS answers sent to a same phone number within a short time window.
+
+Each answer given to coalescer is kept in a per number pending list. When the window expires,
+    pending answers are packed into as few SMS as possible, respecting maximum SMS length.
+    High priority answers flush pending list for their number immediately.
+    Sends to a same number are serialized (one send lock per number), so SMS are sent in answers order,
+    and a timer whose window was already flushed (by a priority answer) doesn't flush next window.
+
+Each answer may be given with its trace (root span of FF_tracer, or any other value identifying it).
+    Sending is delegated to a user given function, called as sendFunction(number, message, traces),
+    traces being the list of traces of answers merged in this SMS (None values removed).
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+import threading
+
+class FF_smsCoalescer:
+    # Class initialization
+    def __init__(self, sendFunction, delay=2.0, maxLength=160, separator="\n"):
+        self.fileVersion = "1.0.0"                          # File version
+        self.sendFunction = sendFunction                    # Function to call to send a SMS (number, message, traces)
+        self.delay = delay                                  # Coalescing window in seconds (0 to disable)
+        self.maxLength = maxLength                          # Maximum length of one SMS
+        self.separator = separator                          # Separator inserted between merged answers
+        self.pendingDict = {}                               # Pending answers per number, as (message, trace) list
+        self.timersDict = {}                                # Flush timer per number
+        self.lock = threading.Lock()                        # Protect pending answers and counters
+        self.sendLocks = {}                                 # Send lock per number (serialize extract and send)
+        self.answersCount = 0                               # Count of answers given
+        self.smsCount = 0                                   # Count of SMS really sent
+        self.priorityCount = 0                              # Count of high priority answers
+
+    # Add an answer for a number, flushing it immediately if priority is set or coalescing disabled
+    #   trace: trace of this answer, given back to sendFunction with SMS containing it
+    def add(self, number, message, priority=False, trace=None):
+        with self.lock:
+            self.answersCount += 1
+            if priority:
+                self.priorityCount += 1
+            self.pendingDict.setdefault(number, []).append((message, trace))
+            if not priority and self.delay > 0:
+                # Start window on first pending answer only
+                if number not in self.timersDict:
+                    timer = threading.Timer(self.delay, self.flush)
+                    timer.args = [number, timer]
+                    timer.daemon = True
+                    self.timersDict[number] = timer
+                    timer.start()
+                return
+        self.flush(number)
+
+    # Returns send lock of a number
+    def sendLock(self, number):
+        with self.lock:
+            return self.sendLocks.setdefault(number, threading.Lock())
+
+    # Flush pending answers of a number
+    #   timer: timer calling at end of window (None if not called by a timer)
+    def flush(self, number, timer=None):
+        with self.sendLock(number):
+            with self.lock:
+                # Ignore timer of a window already flushed
+                if timer != None and self.timersDict.get(number) is not timer:
+                    return
+                smsList = self.extract(number)
+            self.send(number, smsList)
+
+    # Flush pending answers of all numbers
+    def flushAll(self):
+        with self.lock:
+            numbers = list(self.pendingDict.keys())
+        for number in numbers:
+            self.flush(number)
+
+    # Remove pending answers of a number, returning SMS list to send, as (message, traces) (lock should be held)
+    def extract(self, number):
+        timer = self.timersDict.pop(number, None)
+        if timer != None:
+            timer.cancel()
+        smsList = self.pack(self.pendingDict.pop(number, []))
+        self.smsCount += len(smsList)
+        return smsList
+
+    # Pack a list of (answer, trace) into as few (SMS, traces) as possible, keeping answers order
+    #   An answer longer than maximum SMS length is sent alone, as is
+    def pack(self, answers):
+        smsList = []
+        current = None
+        traces = []
+        for message, trace in answers:
+            if current == None:
+                current = message
+            elif len(current) + len(self.separator) + len(message) <= self.maxLength:
+                current += self.separator + message
+            else:
+                smsList.append((current, traces))
+                current = message
+                traces = []
+            if trace != None:
+                traces.append(trace)
+        if current != None:
+            smsList.append((current, traces))
+        return smsList
+
+    # Send a list of (SMS, traces) to a number
+    def send(self, number, smsList):
+        for message, traces in smsList:
+            self.sendFunction(number, message, traces)
+
+    # Returns count of answers waiting to be sent
+    def pendingCount(self):
+        with self.lock:
+            return sum(len(messages) for messages in self.pendingDict.values())
+
+    # Returns coalescing statistics
+    def getMetrics(self):
+        with self.lock:
+            return {
+                "answers": self.answersCount,
+                "sms": self.smsCount,
+                "saved": self.answersCount - self.smsCount - sum(len(messages) for messages in self.pendingDict.values()),
+                "priority": self.priorityCount
+            }
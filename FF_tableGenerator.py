@@ -0,0 +1,122 @@
+"""
+This code generates random smsTables.json content, for performance and consistency tests.
+
+Generated tables have same structure than examples/smsTablesEN.json, with as many devices as requested.
+    Device keys are made of random words (built from a small set of syllables, so that many words share
+    same prefix), followed (or preceded) by a device class.
+
+It also generates valid commands for any loaded tables.
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+import random
+import unidecode
+
+SYLLABLES = ["ba", "be", "bi", "ca", "ce", "co", "da", "de", "di", "fa", "fo", "la", "le", "li", "lo", "ma", "me", "mi",
+    "na", "no", "pa", "pe", "po", "ra", "re", "ri", "sa", "se", "so", "ta", "te", "ti", "to", "va", "ve", "vo"]
+ACCENTS = {"a": "à", "e": "é", "i": "î", "o": "ô"}
+
+# Returns a random word of given syllables count, with optional accents
+def randomWord(randomizer, syllables, accents=False):
+    word = "".join(randomizer.choice(SYLLABLES) for ptr in range(syllables))
+    if accents and randomizer.random() < 0.2:
+        ptr = randomizer.randrange(len(word))
+        word = word[:ptr] + ACCENTS.get(word[ptr], word[ptr]) + word[ptr + 1:]
+    return word
+
+# Returns random tables (as loaded from smsTables.json)
+#   deviceCount: count of devices to generate
+#   classAfterDevice: is class given after device name?
+#   accents: put accents in some words?
+#   seed: random seed (same seed gives same tables)
+def generateTables(deviceCount, classAfterDevice=True, accents=False, seed=0):
+    randomizer = random.Random(seed)
+    ignores = ["of", "the", "=", "to"]
+    tables = {
+        "settings": {"classAfterDevice": classAfterDevice},
+        "ignores": ignores,
+        "commandValues": {
+            "cdeOn": {"codeValue": 1},
+            "cdeOff": {"codeValue": 2},
+            "cdeShow": {"codeValue": 4},
+            "cdeSet": {"codeValue": 8, "set": True}
+        },
+        "commandClasses": {
+            "classOnOff": {"commandValue": ["cdeOn", "cdeOff", "cdeShow"]},
+            "classSet": {"commandValue": ["cdeSet", "cdeShow"]},
+            "classShow": {"commandValue": ["cdeShow"]}
+        },
+        "commands": {
+            "turn": {"commandValue": "cdeSet"},
+            "arm": {"commandValue": "cdeOn"},
+            "open": {"commandValue": "cdeOn"},
+            "disarm": {"commandValue": "cdeOff"},
+            "close": {"commandValue": "cdeOff"},
+            "state": {"commandValue": "cdeShow"},
+            "display": {"commandValue": "cdeShow"},
+            "set": {"commandValue": "cdeSet"},
+            "define": {"commandValue": "cdeSet"}
+        },
+        "deviceClasses": {},
+        "devices": {}
+    }
+    # Device classes, one of each kind, then random ones
+    classTemplates = [
+        {"commandClass": "classOnOff"},
+        {"commandClass": "classShow"},
+        {"commandClass": "classSet", "setType": "level", "mapping": {"off": 0, "on": 100}},
+        {"commandClass": "classSet", "setType": "level"},
+        {"commandClass": "classSet", "setType": "setPoint", "minValue": 6, "maxValue": 25},
+        {"commandClass": "classSet", "setType": "integer", "minValue": 0, "maxValue": 10},
+        {"commandClass": "classSet", "setType": "string", "list": ["auto", "manual", "away"]}
+    ]
+    classCount = max(len(classTemplates), deviceCount // 200)
+    while len(tables["deviceClasses"]) < classCount:
+        deviceClass = randomWord(randomizer, randomizer.randint(1, 3), accents)
+        if unidecode.unidecode(deviceClass) not in ignores:
+            tables["deviceClasses"][deviceClass] = dict(classTemplates[len(tables["deviceClasses"]) % len(classTemplates)])
+    deviceClasses = list(tables["deviceClasses"].keys())
+    # Device names are made of 1 to 3 words, taken in a vocabulary growing with device count
+    vocabulary = []
+    while len(vocabulary) < max(10, int(deviceCount ** 0.5) * 3):
+        word = randomWord(randomizer, randomizer.randint(1, 3), accents)
+        # Words to ignore can't be part of device keys, even with accents
+        if unidecode.unidecode(word) not in ignores and word not in vocabulary:
+            vocabulary.append(word)
+    attempts = 0
+    while len(tables["devices"]) < deviceCount and attempts < deviceCount * 20:
+        attempts += 1
+        words = [randomizer.choice(vocabulary) for ptr in range(randomizer.randint(1, 3))]
+        deviceClass = randomizer.choice(deviceClasses)
+        key = " ".join(words + [deviceClass] if classAfterDevice else [deviceClass] + words)
+        if key not in tables["devices"]:
+            tables["devices"][key] = {"index": len(tables["devices"]) + 1, "name": " ".join(words).title() + " - " + deviceClass}
+    return tables
+
+# Returns a list of valid commands for tables loaded in an analyzer, one per device (or all commands of each device)
+def validCommands(analyzer, allCommands=False):
+    commands = []
+    for device in analyzer.devicesDict.keys():
+        deviceClass = device.split(" ")[-1] if analyzer.classAfterDevice else device.split(" ")[0]
+        deviceCommandClass = analyzer.getValue2(analyzer.deviceClassesDict, deviceClass, "commandClass")
+        commandValues = analyzer.getValue2(analyzer.commandClassesDict, deviceCommandClass, "commandValue", [])
+        for command in analyzer.commandsDict.keys():
+            commandValue = analyzer.getValue2(analyzer.commandsDict, command, "commandValue")
+            if commandValue in commandValues:
+                text = command+" "+device
+                # Add a value to set commands
+                if analyzer.getValue2(analyzer.commandValuesDict, commandValue, "set", False):
+                    mapping = analyzer.getValue2(analyzer.deviceClassesDict, deviceClass, "mapping")
+                    valuesList = analyzer.getValue2(analyzer.deviceClassesDict, deviceClass, "list")
+                    if mapping:
+                        text += " "+list(mapping.keys())[0]
+                    elif valuesList:
+                        text += " "+str(valuesList[0])
+                    else:
+                        text += " "+str(analyzer.getValue2(analyzer.deviceClassesDict, deviceClass, "minValue", 1))
+                commands.append(text)
+                if not allCommands:
+                    break
+    return commands
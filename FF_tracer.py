@@ -0,0 +1,145 @@
+"""
+This code gives a trace ID to each SMS, and writes timed spans of its processing stages to a local file.
+
+Trace file contains one JSON object per line, using OpenTelemetry protocol (OTLP) JSON encoding
+    ({"resourceSpans": [{"resource": ..., "scopeSpans": [{"scope": ..., "spans": [...]}]}]}),
+    as written by OpenTelemetry collector file exporter, so it can be read by any OTLP compatible tool.
+
+Sampling decision is taken when trace starts: only given part of traces (sampleRate) are written.
+    Non sampled traces still get an ID (to link log lines), but their spans cost almost nothing.
+    Spans are kept in memory and written by batches of at most batchSize spans when flush is called.
+    Ending a span never writes to file, as this may be done in MQTT callback thread: call flush from
+    a periodic task instead.
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+import json
+import random
+import threading
+import time
+
+# Returns an attribute value in OTLP JSON format
+def attributeValue(value):
+    if type(value).__name__ == "bool":
+        return {"boolValue": value}
+    if type(value).__name__ == "int":
+        return {"intValue": str(value)}
+    if type(value).__name__ == "float":
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+class FF_span:
+    # Class initialization (use FF_tracer.startTrace or FF_tracer.startSpan instead)
+    def __init__(self, tracer, name, traceId, parentSpanId, sampled, attributes=None):
+        self.tracer = tracer                                # Tracer of this span
+        self.name = name                                    # Span name
+        self.traceId = traceId                              # Trace ID (32 hexadecimal chars)
+        self.spanId = tracer.newId(64) if sampled else ""   # Span ID (16 hexadecimal chars)
+        self.parentSpanId = parentSpanId                    # Parent span ID ("" for trace root)
+        self.sampled = sampled                              # Is span written to trace file?
+        self.attributes = dict(attributes) if sampled and attributes else {}
+        self.startTime = time.time_ns()                     # Start time (ns since epoch)
+        self.endTime = None                                 # End time (ns since epoch)
+        self.error = ""                                     # Error message (empty if no error)
+
+    # Set attributes of span
+    def setAttributes(self, attributes):
+        if self.sampled:
+            self.attributes.update(attributes)
+
+    # End span, with optional attributes and error message
+    def end(self, attributes=None, error=""):
+        if self.endTime != None:
+            return
+        self.endTime = time.time_ns()
+        if self.sampled:
+            if attributes:
+                self.attributes.update(attributes)
+            self.error = error
+            self.tracer.export(self)
+
+    # Returns span duration in seconds (None if not ended)
+    def duration(self):
+        return (self.endTime - self.startTime) / 1e9 if self.endTime != None else None
+
+    # Returns span in OTLP JSON format
+    def toDict(self):
+        return {
+            "traceId": self.traceId,
+            "spanId": self.spanId,
+            "parentSpanId": self.parentSpanId,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.startTime),
+            "endTimeUnixNano": str(self.endTime),
+            "attributes": [{"key": key, "value": attributeValue(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}
+        }
+
+class FF_tracer:
+    # Class initialization
+    #   fileName: trace file (None or empty to write nothing)
+    #   sampleRate: part of traces written to file (0 to 1)
+    def __init__(self, fileName=None, sampleRate=1.0, serviceName="domoticzSms", batchSize=100):
+        self.fileVersion = "1.0.0"                          # File version
+        self.fileName = fileName                            # Trace file
+        self.sampleRate = sampleRate if fileName else 0.0   # Part of sampled traces
+        self.serviceName = serviceName                      # Service name written in traces
+        self.batchSize = batchSize                          # Maximum count of spans in one written batch
+        self.randomizer = random.Random()                   # Random generator for IDs and sampling
+        self.lock = threading.Lock()                        # Protect spans and counters
+        self.spans = []                                     # Ended spans not yet written
+        self.traceCount = 0                                 # Count of traces
+        self.sampledCount = 0                               # Count of sampled traces
+        self.spanCount = 0                                  # Count of written spans
+        self.writeCount = 0                                 # Count of writes to trace file
+
+    # Returns a new random ID of given bit count, as hexadecimal string
+    def newId(self, bits):
+        return "{:0{width}x}".format(self.randomizer.getrandbits(bits), width=bits // 4)
+
+    # Start a new trace, returning its root span
+    def startTrace(self, name, attributes=None):
+        sampled = self.sampleRate > 0 and self.randomizer.random() < self.sampleRate
+        self.traceCount += 1
+        if sampled:
+            self.sampledCount += 1
+        return FF_span(self, name, self.newId(128), "", sampled, attributes)
+
+    # Start a child span of a given span
+    def startSpan(self, name, parent, attributes=None):
+        return FF_span(self, name, parent.traceId, parent.spanId, parent.sampled, attributes)
+
+    # Keep an ended span, to be written by next flush
+    def export(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    # Write ended spans to trace file
+    def flush(self):
+        with self.lock:
+            spans = self.spans
+            self.spans = []
+            if not spans or not self.fileName:
+                return
+            with open(self.fileName, "at", encoding="UTF-8") as traceFile:
+                for start in range(0, len(spans), self.batchSize):
+                    batch = {"resourceSpans": [{
+                        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.serviceName}}]},
+                        "scopeSpans": [{"scope": {"name": "FF_tracer", "version": self.fileVersion}, "spans": [span.toDict() for span in spans[start:start+self.batchSize]]}]
+                    }]}
+                    traceFile.write(json.dumps(batch, ensure_ascii=False)+"\n")
+                    self.writeCount += 1
+            self.spanCount += len(spans)
+
+    # Returns tracer statistics
+    def getMetrics(self):
+        with self.lock:
+            return {
+                "traces": self.traceCount,
+                "sampled": self.sampledCount,
+                "spansWritten": self.spanCount,
+                "writes": self.writeCount
+            }
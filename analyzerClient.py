@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+"""
+This file is part of FF_SmsServer (https://github.com/FlyingDomotic/FF_SmsServer)
+
+It sends commands to analyzerDaemon.py and prints results, or measures request latency.
+
+Commands are taken from command line, or read from standard input (one per line).
+    With --repeat, commands are sent many times and only latency statistics are printed.
+
+Usage examples:
+    analyzerClient.py "turn kitchen light on" "state alarm"
+    analyzerClient.py --socket /tmp/analyzerDaemon.sock --batch --repeat 1000 < commands.txt
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+fileVersion = "1.0.0"                                       # File version
+
+import argparse
+import json
+import sys
+import time
+from FF_analyzerClient import FF_analyzerClient
+
+#   *****************
+#   *** Main code ***
+#   *****************
+
+parser = argparse.ArgumentParser(description="Send commands to analyzerDaemon.py")
+parser.add_argument("commands", nargs="*", help="commands to analyze (default: read from standard input)")
+parser.add_argument("--host", default="127.0.0.1", help="server address (default: 127.0.0.1)")
+parser.add_argument("--port", type=int, default=8765, help="server port (default: 8765)")
+parser.add_argument("--socket", default="", help="server Unix domain socket, instead of host and port")
+parser.add_argument("--batch", action="store_true", help="send all commands in one request")
+parser.add_argument("--repeat", type=int, default=0, help="send commands this count of times and print latency statistics only")
+parser.add_argument("--metrics", action="store_true", help="print server metrics")
+args = parser.parse_args()
+
+commands = args.commands
+if not commands and not sys.stdin.isatty():
+    commands = [line.strip() for line in sys.stdin if line.strip()]
+
+client = FF_analyzerClient(args.host, args.port, args.socket)
+if args.repeat:
+    startTime = time.perf_counter()
+    for ptr in range(args.repeat):
+        if args.batch:
+            client.analyzeBatch(commands)
+        else:
+            for command in commands:
+                client.analyze(command)
+    duration = time.perf_counter() - startTime
+    commandCount = args.repeat * len(commands)
+    print(F"{commandCount} commands in {client.getMetrics()['count']} requests, {duration:.3f}s ({commandCount / duration:.1f} commands/s)")
+    print(F"Request latency: {json.dumps(client.getMetrics())}")
+elif commands:
+    results = client.analyzeBatch(commands) if args.batch else [client.analyze(command) for command in commands]
+    for result in results:
+        print(json.dumps(result, ensure_ascii=False))
+if args.metrics:
+    print(F"Server metrics: {json.dumps(client.getServerMetrics())}")
+client.close()
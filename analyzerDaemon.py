@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+"""
+This file is part of FF_SmsServer (https://github.com/FlyingDomotic/FF_SmsServer)
+
+It loads SMS tables once and serves command analysis over HTTP, on localhost or on a Unix domain socket,
+    for tools which can't (or don't want to) load tables each time (Domoticz scripts, web forms...).
+
+See FF_analyzerServer.py for requests and answers, and FF_analyzerClient.py or analyzerClient.py for a client.
+    Tables are reloaded when receiving SIGHUP.
+
+With --check, one request is sent over each transport (TCP on a free localhost port, then a temporary Unix
+    domain socket), and script exits with code 1 if any of them fails.
+
+Usage examples:
+    analyzerDaemon.py --port 8765
+    analyzerDaemon.py --socket /tmp/analyzerDaemon.sock smsTablesEN.json smsTablesFR.json
+    analyzerDaemon.py --check smsTablesEN.json
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+fileVersion = "1.0.0"                                       # File version
+
+import argparse
+import os
+import pathlib
+import signal
+import tempfile
+import threading
+from FF_analyzerServer import FF_analyzerServer
+from FF_analyzerClient import FF_analyzerClient
+
+#   *****************
+#   *** Main code ***
+#   *****************
+
+# Set current working directory to this python file folder
+currentPath = pathlib.Path(__file__).parent.resolve()
+
+parser = argparse.ArgumentParser(description="Serve SMS command analysis over HTTP")
+parser.add_argument("tables", nargs="*", default=[os.path.join(currentPath, "smsTables.json")], help="table files, one per language (default: smsTables.json)")
+parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+parser.add_argument("--socket", default="", help="Unix domain socket to listen on, instead of host and port")
+parser.add_argument("--compactDevices", action="store_true", help="keep devices in a compact registry (very large tables)")
+parser.add_argument("--verbose", action="store_true", help="log each request")
+parser.add_argument("--check", action="store_true", help="send one request over each transport (TCP and Unix domain socket), then exit")
+args = parser.parse_args()
+
+analyzerServer = FF_analyzerServer(args.tables, args.compactDevices, args.verbose)
+errorText, messages = analyzerServer.loadData()
+print("LoadData status: "+(errorText if errorText != "" else "Ok")+F" ({analyzerServer.loadTime * 1000:.1f} ms)", flush=True)
+if errorText:
+    print(messages)
+    exit(2)
+
+# Send one analyze request over a transport, returning error text (empty if Ok)
+def checkTransport(name, host, port, socketPath):
+    try:
+        httpServer = analyzerServer.bind(host, port, socketPath)
+    except OSError as exception:
+        return F"can't bind: {exception}"
+    serverThread = threading.Thread(target=analyzerServer.serveForever, daemon=True)
+    serverThread.start()
+    client = FF_analyzerClient(host, httpServer.server_address[1] if not socketPath else 0, socketPath or None, timeout=5.0)
+    try:
+        result = client.analyze("check")
+        if type(result).__name__ != "dict" or result.get("command") != "check":
+            return F"unexpected answer {result}"
+        print(F"{name}: Ok ({client.getMetrics()['averageMs']} ms)", flush=True)
+        return ""
+    except Exception as exception:
+        return F"{type(exception).__name__}: {exception}"
+    finally:
+        client.close()
+        analyzerServer.shutdown()
+        serverThread.join(5.0)
+
+if args.check:
+    errorCount = 0
+    with tempfile.TemporaryDirectory() as tempPath:
+        for name, host, port, socketPath in [("TCP", "127.0.0.1", 0, ""), ("Unix socket", "", 0, os.path.join(tempPath, "check.sock"))]:
+            errorText = checkTransport(name, host, port, socketPath)
+            if errorText:
+                print(F"{name}: {errorText}", flush=True)
+                errorCount += 1
+    exit(1 if errorCount else 0)
+
+analyzerServer.bind(args.host, args.port, args.socket)
+print(F"Listening on {args.socket if args.socket else args.host+':'+str(args.port)}", flush=True)
+
+# Reload tables on SIGHUP
+def onSighup(signum, frame):
+    errorText, messages = analyzerServer.loadData()
+    print("Reload status: "+(errorText+", current tables kept" if errorText != "" else "Ok")+F" ({analyzerServer.loadTime * 1000:.1f} ms)", flush=True)
+
+# Stop on SIGTERM (shutdown should be called from another thread than server one)
+def onSigterm(signum, frame):
+    threading.Thread(target=analyzerServer.shutdown).start()
+
+signal.signal(signal.SIGHUP, onSighup)
+signal.signal(signal.SIGTERM, onSigterm)
+try:
+    analyzerServer.serveForever()
+except KeyboardInterrupt:
+    threading.Thread(target=analyzerServer.shutdown).start()
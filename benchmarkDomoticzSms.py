@@ -0,0 +1,169 @@
+#!/usr/bin/python3
+"""
+This file is part of FF_SmsServer (https://github.com/FlyingDomotic/FF_SmsServer)
+
+It measures end-to-end throughput and latency of domoticzSms.py on a single machine.
+
+domoticzSms.py service, a simulated Domoticz and a SMS sender are connected to an in-memory MQTT broker.
+    SMS commands are generated from tables (one valid command per device, plus some erroneous ones),
+    sent at given rate, and latency is measured until Domoticz (or error SMS) answer is received.
+    With --sites, SMS are spread over multiple sites (prefixes), each with its own Domoticz, served by the same service.
+
+Usage example:
+    benchmarkDomoticzSms.py --tables examples/smsTablesEN.json --count 5000 --processingTime 0.001
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+fileVersion = "1.0.0"                                       # File version
+
+import argparse
+import json
+import logging
+import os
+import pathlib
+import random
+import threading
+import time
+from FF_analyzeCommand import FF_analyzeCommand
+from FF_memoryBroker import FF_memoryBroker
+from FF_fakeDomoticz import FF_fakeDomoticz
+from FF_latencyStats import FF_latencyStats
+from FF_tableGenerator import validCommands
+from domoticzSms import FF_domoticzSms
+
+#   *****************
+#   *** Main code ***
+#   *****************
+
+currentPath = pathlib.Path(__file__).parent.resolve()
+
+parser = argparse.ArgumentParser(description="Measure domoticzSms.py end-to-end throughput and latency, without network")
+parser.add_argument("--tables", default=os.path.join(currentPath, "smsTables.json"), help="SMS tables file (default: smsTables.json)")
+parser.add_argument("--count", type=int, default=1000, help="count of SMS to send (default: 1000)")
+parser.add_argument("--rate", type=float, default=0, help="SMS sent per second, 0 for maximum (default: 0)")
+parser.add_argument("--errorRate", type=float, default=0.1, help="part of erroneous SMS (default: 0.1)")
+parser.add_argument("--processingTime", type=float, default=0.0, help="Domoticz processing time per command, in seconds (default: 0)")
+parser.add_argument("--coalesceDelay", type=float, default=0.0, help="SMS_COALESCE_DELAY setting (default: 0)")
+parser.add_argument("--priorityRate", type=float, default=0.0, help="part of numbers set in SMS_PRIORITY_NUMBERS (default: 0)")
+parser.add_argument("--maxInFlight", type=int, default=10, help="DOMOTICZ_MAX_IN_FLIGHT setting (default: 10)")
+parser.add_argument("--matchAnswers", action="store_true", help="set DOMOTICZ_ANSWER_HAS_COMMAND (simulated Domoticz answers contain command)")
+parser.add_argument("--sites", type=int, default=1, help="count of sites (prefixes), each with its own Domoticz (default: 1)")
+parser.add_argument("--traceFile", default="", help="TRACE_FILE setting (default: no trace file)")
+parser.add_argument("--traceSampleRate", type=float, default=1.0, help="TRACE_SAMPLE_RATE setting (default: 1)")
+parser.add_argument("--timeout", type=float, default=30.0, help="delay to wait for last answers (default: 30)")
+parser.add_argument("--log", default="", help="file to write domoticzSms.py log into (default: no log)")
+args = parser.parse_args()
+
+# Load tables
+analyzer = FF_analyzeCommand()
+errorText, messages = analyzer.loadData(args.tables)
+print("LoadData status: "+(errorText if errorText != "" else "Ok"))
+if errorText:
+    print(messages)
+    exit(2)
+commands = validCommands(analyzer)
+if not commands:
+    print("No command can be generated from tables")
+    exit(2)
+
+# Service logger
+logger = logging.getLogger("benchmarkDomoticzSms")
+logger.propagate = False
+if args.log:
+    logger.setLevel(logging.INFO)
+    logHandler = logging.FileHandler(args.log)
+    logHandler.setFormatter(logging.Formatter("%(asctime)s:%(levelname)s:%(message)s"))
+    logger.addHandler(logHandler)
+else:
+    logger.addHandler(logging.NullHandler())
+
+# Use a different number for each SMS, to match answers
+numbers = ["+{:011d}".format(ptr) for ptr in range(args.count)]
+priorityNumbers = random.Random(1).sample(numbers, int(args.count * args.priorityRate))
+
+# Start broker, service, Domoticz of each site and SMS sender
+broker = FF_memoryBroker()
+settings = {"SMS_PREFIX": "", "SMS_COALESCE_DELAY": args.coalesceDelay, "SMS_PRIORITY_NUMBERS": set(priorityNumbers), "DOMOTICZ_MAX_IN_FLIGHT": args.maxInFlight,
+    "DOMOTICZ_ANSWER_HAS_COMMAND": args.matchAnswers,
+    "METRICS_INTERVAL": 0, "TRACE_FILE": args.traceFile, "TRACE_SAMPLE_RATE": args.traceSampleRate}
+serviceClient = broker.client("domoticzSms")
+domoticzSms = FF_domoticzSms(serviceClient, analyzer if args.sites <= 1 else None, logger, settings)
+prefixes = [""]
+if args.sites > 1:
+    # Same tables for all sites, but different prefixes and Domoticz topics
+    prefixes = [F"site{ptr}" for ptr in range(1, args.sites + 1)]
+    for prefix in prefixes:
+        domoticzSms.addSite(prefix, analyzer, {"DOMOTICZ_IN_TOPIC": prefix+"/domoticz/in", "DOMOTICZ_OUT_TOPIC": prefix+"/domoticz/out"})
+domoticzClients = []
+domoticzList = []
+for site in domoticzSms.sites:
+    domoticzClients.append(broker.client("domoticz_"+site.name))
+    domoticzList.append(FF_fakeDomoticz(domoticzClients[-1], site.settings["DOMOTICZ_SMS_MESSAGE_IDX"], site.settings["DOMOTICZ_SMS_ANSWER_IDX"],
+        site.settings["DOMOTICZ_IN_TOPIC"], site.settings["DOMOTICZ_OUT_TOPIC"], args.processingTime))
+senderClient = broker.client("sender")
+
+lock = threading.Lock()
+sentTimes = {}
+latencyStats = FF_latencyStats(args.count)
+allAnswered = threading.Event()
+
+# Executed when sender receives an answer (from Domoticz or as error SMS)
+def onAnswer(client, userdata, msg):
+    jsonData = json.loads(msg.payload.decode("UTF-8"))
+    if msg.topic == domoticzSms.settings["MQTT_SEND_TOPIC"]:
+        number = jsonData.get("number")
+    else:
+        # Fake Domoticz answers "OK number ..."
+        number = str(jsonData.get("svalue1", "")).split(" ")[1]
+    with lock:
+        sentTime = sentTimes.pop(number, None)
+        if sentTime != None:
+            latencyStats.add(time.monotonic() - sentTime)
+        if latencyStats.count >= args.count:
+            allAnswered.set()
+
+senderClient.on_message = onAnswer
+for site in domoticzSms.sites:
+    senderClient.subscribe(site.settings["DOMOTICZ_OUT_TOPIC"])
+senderClient.subscribe(domoticzSms.settings["MQTT_SEND_TOPIC"])
+for client in [serviceClient, senderClient] + domoticzClients:
+    client.connect_async("localhost")
+    client.loop_start()
+for domoticz in domoticzList:
+    domoticz.start()
+domoticzSms.start()
+# Wait for subscriptions to be done
+time.sleep(0.1)
+
+# Send SMS
+random.seed(0)
+startTime = time.monotonic()
+for ptr in range(args.count):
+    if args.rate > 0:
+        delay = startTime + ptr / args.rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    message = random.choice(commands)
+    if random.random() < args.errorRate:
+        message = "xyzzy "+message
+    if prefixes[0]:
+        message = random.choice(prefixes)+" "+message
+    number = numbers[ptr]
+    with lock:
+        sentTimes[number] = time.monotonic()
+    senderClient.publish(domoticzSms.settings["MQTT_RECEIVE_TOPIC"], json.dumps({"number": number, "date": "2024-01-01 00:00:00", "message": message}))
+sendDuration = time.monotonic() - startTime
+allAnswered.wait(args.timeout)
+duration = time.monotonic() - startTime
+
+# Print report
+domoticzSms.stop()
+for domoticz in domoticzList:
+    domoticz.stop()
+metrics = latencyStats.getMetrics()
+print(F"{len(commands)} different commands, {args.count} SMS sent in {sendDuration:.3f}s, {metrics['count']} answered in {duration:.3f}s ({metrics['count'] / duration:.1f} SMS/s)")
+print(F"Latency (ms): average {metrics['averageMs']}, p50 {metrics['p50Ms']}, p90 {metrics['p90Ms']}, p99 {metrics['p99Ms']}, max {metrics['maxMs']}")
+print(F"Service metrics: {json.dumps(domoticzSms.getMetrics())}")
+print(F"Broker: {broker.publishedCount} messages published, {broker.deliveredCount} delivered")
@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+"""
+This file is part of FF_SmsServer (https://github.com/FlyingDomotic/FF_SmsServer)
+
+It measures language detection cost and hit rate of FF_multiLanguageAnalyzer.
+
+All valid commands of each table file are generated, mixed, and analyzed with all languages loaded.
+    Result is compared with a naive analysis trying each language in turn.
+
+Usage example:
+    benchmarkLanguages.py examples/smsTablesFR.json examples/smsTablesEN.json
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+fileVersion = "1.0.0"                                       # File version
+
+import argparse
+import json
+import random
+import time
+from FF_multiLanguageAnalyzer import FF_multiLanguageAnalyzer
+from FF_tableGenerator import validCommands
+
+#   *****************
+#   *** Main code ***
+#   *****************
+
+parser = argparse.ArgumentParser(description="Measure language detection cost and hit rate")
+parser.add_argument("tables", nargs="+", help="table files, one per language")
+parser.add_argument("--repeat", type=int, default=20, help="count of times each command is analyzed (default: 20)")
+args = parser.parse_args()
+
+# Load all languages, and generate their commands
+multiAnalyzer = FF_multiLanguageAnalyzer()
+errorText, messages = multiAnalyzer.loadData(args.tables)
+print("LoadData status: "+(errorText if errorText != "" else "Ok"))
+if errorText:
+    print(messages)
+    exit(2)
+commands = []
+for ptr in range(len(multiAnalyzer.analyzers)):
+    for command in validCommands(multiAnalyzer.analyzers[ptr], True):
+        commands.append((multiAnalyzer.languages[ptr], command))
+random.Random(0).shuffle(commands)
+commands = commands * args.repeat
+print(F"{len(commands)} commands in {len(multiAnalyzer.languages)} languages")
+
+# Naive analysis: try each language in turn until command is understood
+startTime = time.perf_counter()
+naiveAnalyses = 0
+for language, command in commands:
+    for analyzer in multiAnalyzer.analyzers:
+        naiveAnalyses += 1
+        analyzer.analyzeCommand(command)
+        if analyzer.firstErrorMessage == "":
+            break
+naiveDuration = time.perf_counter() - startTime
+
+# Analysis with language detection
+startTime = time.perf_counter()
+wrongLanguage = 0
+for language, command in commands:
+    multiAnalyzer.analyzeCommand(command)
+    if multiAnalyzer.firstErrorMessage != "" or multiAnalyzer.language != language:
+        wrongLanguage += 1
+duration = time.perf_counter() - startTime
+
+print(F"Naive: {naiveDuration / len(commands) * 1000000:.1f} us/command, {naiveAnalyses / len(commands):.3f} analyses/command")
+print(F"Detection: {duration / len(commands) * 1000000:.1f} us/command, {wrongLanguage} commands not understood in their language")
+print(F"Metrics: {json.dumps(multiAnalyzer.getMetrics())}")
@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+"""
+This file is part of FF_SmsServer (https://github.com/FlyingDomotic/FF_SmsServer)
+
+It measures FF_analyzeCommand performances with (very) large generated tables:
+    - time to load and check tables, then to reload them unchanged or with one changed section,
+    - memory used per device, with devices kept as loaded from JSON or in a compact FF_deviceRegistry,
+        for devices alone and for whole analyzer once commands have been analyzed (including search indexes),
+    - time to analyze commands.
+
+Usage example:
+    benchmarkTables.py --devices 20000 --commands 2000
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+fileVersion = "1.0.0"                                       # File version
+
+import argparse
+import gc
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from FF_analyzeCommand import FF_analyzeCommand
+from FF_deviceRegistry import FF_deviceRegistry
+from FF_tableGenerator import generateTables
+
+# Returns memory allocated (in bytes) while building an object, and the object
+def measureMemory(builder):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = builder()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+# Returns a list of commands on random devices, with abbreviated words
+def generateCommands(tables, count, seed):
+    randomizer = random.Random(seed)
+    devices = list(tables["devices"].keys())
+    commands = []
+    for ptr in range(count):
+        words = randomizer.choice(devices).split(" ")
+        # Abbreviate some words
+        words = [word[:randomizer.randint(3, len(word))] if len(word) > 3 and randomizer.random() < 0.3 else word for word in words]
+        commands.append(randomizer.choice(["state", "display"])+" "+" ".join(words))
+    return commands
+
+# Load tables file into a new analyzer, returning analyzer and load time
+def loadAnalyzer(fileName, compactDevices):
+    analyzer = FF_analyzeCommand()
+    analyzer.compactDevices = compactDevices
+    startTime = time.perf_counter()
+    errorText, messages = analyzer.loadData(fileName)
+    duration = time.perf_counter() - startTime
+    if errorText:
+        print(messages[:1000])
+        exit(2)
+    return analyzer, duration
+
+# Returns an analyzer loaded with tables file, after analysis of all commands
+def analyzedAnalyzer(fileName, compactDevices, commands):
+    analyzer, loadDuration = loadAnalyzer(fileName, compactDevices)
+    analyzeAll(analyzer, commands)
+    return analyzer
+
+# Reload tables into an existing analyzer, returning reload time and revalidated sections
+def reloadAnalyzer(analyzer, fileName):
+    startTime = time.perf_counter()
+    errorText, messages = analyzer.loadData(fileName)
+    return time.perf_counter() - startTime, analyzer.revalidatedSections
+
+# Analyze all commands, returning analysis time and count of errors
+def analyzeAll(analyzer, commands):
+    errorCount = 0
+    startTime = time.perf_counter()
+    for command in commands:
+        analyzer.analyzeCommand(command)
+        if analyzer.firstErrorMessage != "":
+            errorCount += 1
+    return time.perf_counter() - startTime, errorCount
+
+#   *****************
+#   *** Main code ***
+#   *****************
+
+parser = argparse.ArgumentParser(description="Measure FF_analyzeCommand performances with large generated tables")
+parser.add_argument("--devices", type=int, default=10000, help="count of devices to generate (default: 10000)")
+parser.add_argument("--commands", type=int, default=1000, help="count of commands to analyze (default: 1000)")
+parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+args = parser.parse_args()
+
+tables = generateTables(args.devices, seed=args.seed)
+deviceCount = len(tables["devices"])
+with tempfile.NamedTemporaryFile("wt", suffix=".json", delete=False, encoding="UTF-8") as tablesFile:
+    json.dump(tables, tablesFile, ensure_ascii=False)
+print(F"Generated {deviceCount} devices, {len(tables['deviceClasses'])} device classes")
+
+try:
+    # Memory per device
+    devicesJson = json.dumps(tables["devices"], ensure_ascii=False)
+    rawSize, devicesDict = measureMemory(lambda: json.loads(devicesJson))
+    registrySize, registry = measureMemory(lambda: FF_deviceRegistry(json.loads(devicesJson), True))
+    print(F"Memory per device: {rawSize / deviceCount:.1f} bytes as loaded, {registrySize / deviceCount:.1f} bytes in registry ({registry.memoryUsage() / deviceCount:.1f} estimated)")
+    del devicesDict, registry
+
+    # Load and analyze times
+    commands = generateCommands(tables, args.commands, args.seed)
+    for compactDevices in [False, True]:
+        analyzer, loadDuration = loadAnalyzer(tablesFile.name, compactDevices)
+        analyzeDuration, errorCount = analyzeAll(analyzer, commands)
+        print(F"{'Compact' if compactDevices else 'Dict'} devices: load {loadDuration * 1000:.1f} ms, analyze {analyzeDuration / len(commands) * 1000000:.1f} us/command ({errorCount} errors)")
+        del analyzer
+        analyzerSize, analyzer = measureMemory(lambda: analyzedAnalyzer(tablesFile.name, compactDevices, commands))
+        print(F"{'Compact' if compactDevices else 'Dict'} devices: whole analyzer uses {analyzerSize / deviceCount:.1f} bytes per device after analysis")
+
+    # Reload times
+    reloadDuration, sections = reloadAnalyzer(analyzer, tablesFile.name)
+    print(F"Reload unchanged tables: {reloadDuration * 1000:.1f} ms, revalidated sections: {sections}")
+    tables["commands"]["show"] = {"commandValue": "cdeShow"}
+    with open(tablesFile.name, "wt", encoding="UTF-8") as changedFile:
+        json.dump(tables, changedFile, ensure_ascii=False)
+    reloadDuration, sections = reloadAnalyzer(analyzer, tablesFile.name)
+    print(F"Reload tables with changed commands: {reloadDuration * 1000:.1f} ms, revalidated sections: {sections}")
+    firstDevice = next(iter(tables["devices"]))
+    tables["devices"][firstDevice]["name"] += " (changed)"
+    with open(tablesFile.name, "wt", encoding="UTF-8") as changedFile:
+        json.dump(tables, changedFile, ensure_ascii=False)
+    reloadDuration, sections = reloadAnalyzer(analyzer, tablesFile.name)
+    print(F"Reload tables with changed devices: {reloadDuration * 1000:.1f} ms, revalidated sections: {sections}")
+finally:
+    os.remove(tablesFile.name)
@@ -0,0 +1,225 @@
+#!/usr/bin/python3
+"""
+This file is part of FF_SmsServer (https://github.com/FlyingDomotic/FF_SmsServer)
+
+It checks that optimized command analysis gives exactly same results as reference code (FF_analyzeCommandReference.py).
+
+Random tables are generated (with and without accents, with class before or after device), then random
+    commands are built from them, with abbreviated, misspelled, accented, upper case, ignored, missing or extra
+    words, and valid or invalid values to set. Each command is analyzed by reference code and by each
+    optimized path (FF_analyzeCommand with devices as dictionary or in compact registry, FF_multiLanguageAnalyzer
+    with only one language), and all results (returned value, analyzer attributes and messages) are compared.
+    findInDict, lookupInDict and compare are also compared on their own.
+
+Any difference is displayed and makes this script exit with code 1. Speed ratio against reference is given for each path.
+
+Usage example:
+    differentialTest.py --rounds 10 --devices 500 --commands 2000
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+fileVersion = "1.0.0"                                       # File version
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from FF_analyzeCommand import FF_analyzeCommand
+from FF_analyzeCommandReference import FF_analyzeCommandReference
+from FF_multiLanguageAnalyzer import FF_multiLanguageAnalyzer
+from FF_tableGenerator import generateTables, ACCENTS
+
+# Analyzer attributes compared after analyzeCommand
+RESULT_ATTRIBUTES = ["errorSeen", "firstErrorMessage", "allMessages", "command", "commandValue", "commandValueText", "deviceAndClass",
+    "deviceName", "deviceId", "deviceIdName", "deviceClass", "valueToSet", "valueToSetType", "valueToSetOriginal", "setBy"]
+
+# Returns a misspelled word (one char replaced, deleted, inserted or two chars swapped)
+def misspell(randomizer, word):
+    if len(word) < 2:
+        return word + randomizer.choice("aeiou")
+    ptr = randomizer.randrange(len(word) - 1)
+    kind = randomizer.randrange(4)
+    if kind == 0:
+        return word[:ptr] + randomizer.choice("abcdefghijklmnopqrstuvwxyzé") + word[ptr + 1:]
+    if kind == 1:
+        return word[:ptr] + word[ptr + 1:]
+    if kind == 2:
+        return word[:ptr] + randomizer.choice("aeiouè") + word[ptr:]
+    return word[:ptr] + word[ptr + 1] + word[ptr] + word[ptr + 2:]
+
+# Returns a randomly altered word
+def alterWord(randomizer, word):
+    if word == "":
+        return word
+    choice = randomizer.random()
+    if choice < 0.35:
+        # Abbreviate
+        return word[:randomizer.randint(1, len(word))]
+    if choice < 0.45:
+        return misspell(randomizer, word)
+    if choice < 0.55:
+        return word.upper() if randomizer.random() < 0.5 else word.capitalize()
+    if choice < 0.65:
+        # Add or remove accents
+        return "".join(ACCENTS.get(char, char) if randomizer.random() < 0.5 else char for char in word)
+    return word
+
+# Returns a random value to set for a device class
+def randomValue(randomizer, classItem):
+    choice = randomizer.random()
+    if choice < 0.1:
+        return ""
+    if "mapping" in classItem and choice < 0.6:
+        return alterWord(randomizer, randomizer.choice(list(classItem["mapping"].keys())))
+    if "list" in classItem and choice < 0.6:
+        return alterWord(randomizer, str(randomizer.choice(classItem["list"])))
+    if choice < 0.85:
+        return str(randomizer.randint(int(classItem.get("minValue", 0)) - 5, int(classItem.get("maxValue", 100)) + 5))
+    return randomizer.choice(["12.5", "abc", "on", "1 2", "-0"])
+
+# Returns a list of random commands for given tables
+def randomCommands(randomizer, tables, count):
+    commands = list(tables["commands"].keys())
+    devices = list(tables["devices"].keys())
+    ignores = tables["ignores"]
+    commandList = []
+    for ptr in range(count):
+        deviceKey = randomizer.choice(devices)
+        words = [randomizer.choice(commands)] + deviceKey.split(" ")
+        classAfterDevice = tables["settings"]["classAfterDevice"]
+        classItem = tables["deviceClasses"][words[-1] if classAfterDevice else words[1]]
+        if randomizer.random() < 0.6:
+            words.append(randomValue(randomizer, classItem))
+        words = [alterWord(randomizer, word) for word in words]
+        choice = randomizer.random()
+        if choice < 0.1:
+            # Drop a word
+            del words[randomizer.randrange(len(words))]
+        elif choice < 0.2:
+            # Add an unknown or extra word
+            words.insert(randomizer.randrange(len(words) + 1), randomizer.choice(["xyzzy", "please", randomizer.choice(devices).split(" ")[0]]))
+        elif choice < 0.3:
+            # Swap two words
+            first, second = randomizer.randrange(len(words)), randomizer.randrange(len(words))
+            words[first], words[second] = words[second], words[first]
+        if randomizer.random() < 0.3:
+            words.insert(randomizer.randrange(len(words) + 1), randomizer.choice(ignores))
+        separator = randomizer.choice([" ", " ", " ", "  ", "\t"])
+        commandList.append(separator.join(words))
+    return commandList
+
+# Returns analyzer state after analysis of a command
+def analyzeState(analyzer, command):
+    try:
+        returned = analyzer.analyzeCommand(command)
+    except Exception as exception:
+        returned = F"Exception {type(exception).__name__}: {exception}"
+    return [returned] + [getattr(analyzer, name) for name in RESULT_ATTRIBUTES]
+
+# Returns findInDict, lookupInDict and messages for keywords against a dictionary
+def lookupState(analyzer, keywords, startPtr, dict):
+    analyzer.errorSeen = False
+    analyzer.firstErrorMessage = ""
+    analyzer.allMessages = ""
+    return [analyzer.findInDict(keywords, startPtr, dict, "device"), analyzer.lookupInDict(keywords, startPtr, dict), analyzer.allMessages]
+
+# Returns a readable difference between two states
+def stateDifference(referenceState, state, names):
+    return ", ".join(F"{names[ptr]}: {referenceState[ptr]!r} != {state[ptr]!r}" for ptr in range(len(names)) if referenceState[ptr] != state[ptr])
+
+# Load an analyzer (of given class) with tables file
+def loadAnalyzer(analyzer, fileName, convertInput, compactDevices=False):
+    analyzer.compactDevices = compactDevices
+    errorText, messages = analyzer.loadData(fileName) if not isinstance(analyzer, FF_multiLanguageAnalyzer) else analyzer.loadData([fileName])
+    if errorText:
+        print(messages[:1000])
+        exit(2)
+    if isinstance(analyzer, FF_multiLanguageAnalyzer):
+        for languageAnalyzer in analyzer.analyzers:
+            languageAnalyzer.convertUtf8ToAscii7Input = convertInput
+    else:
+        analyzer.convertUtf8ToAscii7Input = convertInput
+    return analyzer
+
+#   *****************
+#   *** Main code ***
+#   *****************
+
+parser = argparse.ArgumentParser(description="Compare optimized command analysis with reference code")
+parser.add_argument("--rounds", type=int, default=8, help="count of generated tables (default: 8)")
+parser.add_argument("--devices", type=int, default=200, help="count of devices per table (default: 200)")
+parser.add_argument("--commands", type=int, default=1000, help="count of commands per table (default: 1000)")
+parser.add_argument("--seed", type=int, default=0, help="first random seed (default: 0)")
+parser.add_argument("--showDiffs", type=int, default=20, help="count of differences to display (default: 20)")
+args = parser.parse_args()
+
+PATHS = ["dict devices", "compact devices", "multi language"]
+durations = {name: 0.0 for name in ["reference"] + PATHS}
+diffCount = 0
+checkCount = 0
+for roundPtr in range(args.rounds):
+    seed = args.seed + roundPtr
+    randomizer = random.Random(seed)
+    # Vary table kind and input conversion with round
+    classAfterDevice = roundPtr % 2 == 0
+    accents = roundPtr % 4 >= 2
+    convertInput = roundPtr % 8 < 4
+    tables = generateTables(randomizer.randint(args.devices // 2, args.devices), classAfterDevice, accents, seed)
+    with tempfile.NamedTemporaryFile("wt", suffix=".json", delete=False, encoding="UTF-8") as tablesFile:
+        json.dump(tables, tablesFile, ensure_ascii=False)
+    try:
+        reference = loadAnalyzer(FF_analyzeCommandReference(), tablesFile.name, convertInput)
+        analyzers = {
+            "dict devices": loadAnalyzer(FF_analyzeCommand(), tablesFile.name, convertInput),
+            "compact devices": loadAnalyzer(FF_analyzeCommand(), tablesFile.name, convertInput, True),
+            "multi language": loadAnalyzer(FF_multiLanguageAnalyzer(), tablesFile.name, convertInput)
+        }
+    finally:
+        os.remove(tablesFile.name)
+    commands = randomCommands(randomizer, tables, args.commands)
+    print(F"Round {roundPtr + 1}: seed {seed}, {len(tables['devices'])} devices, classAfterDevice={classAfterDevice}, accents={accents}, convertInput={convertInput}")
+
+    # Compare full analysis
+    startTime = time.perf_counter()
+    referenceStates = [analyzeState(reference, command) for command in commands]
+    durations["reference"] += time.perf_counter() - startTime
+    for name in PATHS:
+        startTime = time.perf_counter()
+        states = [analyzeState(analyzers[name], command) for command in commands]
+        durations[name] += time.perf_counter() - startTime
+        for ptr in range(len(commands)):
+            checkCount += 1
+            if states[ptr] != referenceStates[ptr]:
+                diffCount += 1
+                if diffCount <= args.showDiffs:
+                    print(F"  {name}: >{commands[ptr]}< {stateDifference(referenceStates[ptr], states[ptr], ['returned'] + RESULT_ATTRIBUTES)}")
+
+    # Compare findInDict, lookupInDict and compare on their own, on devices
+    analyzer = analyzers["dict devices"]
+    for command in commands:
+        keywords = [keyword for keyword in command.replace("\t", " ").split(" ") if keyword != ""]
+        startPtr = randomizer.randrange(len(keywords)) if keywords else 0
+        referenceState = lookupState(reference, keywords, startPtr, reference.devicesDict)
+        for name in ["dict devices", "compact devices"]:
+            checkCount += 1
+            state = lookupState(analyzers[name], keywords, startPtr, analyzers[name].devicesDict)
+            if state != referenceState:
+                diffCount += 1
+                if diffCount <= args.showDiffs:
+                    print(F"  {name}: {keywords}[{startPtr}:] {stateDifference(referenceState, state, ['findInDict', 'lookupInDict', 'messages'])}")
+        if len(keywords) >= 2:
+            checkCount += 1
+            minLength = randomizer.randint(-1, 5)
+            if reference.compare(keywords[0], keywords[1], minLength) != analyzer.compare(keywords[0], keywords[1], minLength):
+                diffCount += 1
+                if diffCount <= args.showDiffs:
+                    print(F"  compare({keywords[0]!r}, {keywords[1]!r}, {minLength}) differs")
+
+print(F"{checkCount} checks, {diffCount} difference(s)")
+for name in PATHS:
+    print(F"{name}: {durations['reference'] / durations[name]:.2f} times faster than reference ({durations[name] / (args.rounds * args.commands) * 1000000:.1f} us/command)")
+exit(1 if diffCount else 0)
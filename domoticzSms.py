@@ -6,205 +6,556 @@ It reads received SMS through MQTT, analyze them and execute received commands t
 
 Traces are kept in a log file, rotated each week.
 
+Service is implemented by FF_domoticzSms class, which can be given any MQTT client having paho.mqtt.client
+    interface (publish, subscribe, on_connect and on_message). This allows running it with FF_memoryBroker
+    and FF_fakeDomoticz, without network, broker nor Domoticz (see benchmarkDomoticzSms.py).
+
+One process can serve multiple sites, each with its own SMS prefix, tables and Domoticz (see SMS_SITES).
+
+A heartbeat (lag, queue depth, processed counts and tables version) is published every HEARTBEAT_INTERVAL seconds
+    on MQTT_LWT_TOPIC. Event loop is watched (see FF_loopWatchdog.py): when it stalls for more than
+    WATCHDOG_STALL_DELAY seconds, systemd watchdog is no more notified (if enabled, see domoticzSms.service),
+    and systemd restarts process WatchdogSec seconds later. Else process stops cleanly (pending answers sent,
+    spans written, MQTT disconnected, waiting no more than RESTART_STOP_TIMEOUT seconds) and restarts itself.
+
 Author: Flying Domotic
 License: GNU GPL V3
 """
 
-fileVersion = "1.0.2"
+fileVersion = "1.4.0"
 
-import paho.mqtt.client as mqtt
 import pathlib
 import os
+import sys
 import socket
+import hashlib
 import random
 import logging
 import logging.handlers as handlers
 import json
+import threading
+import time
 from datetime import datetime
 from FF_analyzeCommand import FF_analyzeCommand
+from FF_multiLanguageAnalyzer import FF_multiLanguageAnalyzer
+from FF_smsCoalescer import FF_smsCoalescer
+from FF_commandLimiter import FF_commandLimiter
+from FF_prefixRouter import FF_prefixRouter
+from FF_tracer import FF_tracer
+from FF_loopWatchdog import FF_loopWatchdog
+
+# Get this host name
+hostName = socket.gethostname()
+
+### Here are settings to be adapted to your context ###
+
+# SMS settings
+SMS_PREFIX = "myPrefix"
+SMS_COALESCE_DELAY = 2.0                                    # Delay (seconds) to merge answers to same number (0 to disable)
+SMS_MAX_LENGTH = 160                                        # Maximum length of a merged SMS
+SMS_PRIORITY_NUMBERS = []                                   # Numbers whose answers are sent immediately, with their pending ones (not merged with next ones)
+SMS_TABLES = ["smsTables.json"]                             # Table files, one per language (language detected on each SMS if more than one)
+
+# Sites served by this process, as prefix -> settings overriding above and below ones (SMS_TABLES, DOMOTICZ_xxx)
+#   for example {"home": {"SMS_TABLES": ["smsTablesHome.json"]},
+#       "office": {"SMS_TABLES": ["smsTablesOffice.json"], "DOMOTICZ_IN_TOPIC": "office/domoticz/in", "DOMOTICZ_OUT_TOPIC": "office/domoticz/out"}}
+#   If empty, SMS_PREFIX, SMS_TABLES and DOMOTICZ_xxx settings define the only site
+SMS_SITES = {}
+
+# MQTT Settings
+MQTT_BROKER = "*myMqttHost*"
+MQTT_RECEIVE_TOPIC = "smsServer/received"
+MQTT_SEND_TOPIC = "smsServer/toSend"
+MQTT_LWT_TOPIC = "smsServer/LWT/"+hostName
+MQTT_METRICS_TOPIC = "smsServer/metrics/"+hostName
+MQTT_ID = "*myMqttUser*"
+MQTT_KEY = "*myMqttKey*"
+
+# Domoticz SMS command sensor idx
+DOMOTICZ_SMS_MESSAGE_IDX = 9999
+DOMOTICZ_SMS_ANSWER_IDX = 9998
+DOMOTICZ_SMS_TEXT_IDX = 9997
+DOMOTICZ_IN_TOPIC = "domoticz/in"
+DOMOTICZ_OUT_TOPIC = "domoticz/out"
+DOMOTICZ_TARGET_LATENCY = 2.0                               # Answer delay (seconds) under which more commands can be sent in parallel
+DOMOTICZ_ANSWER_TIMEOUT = 10.0                              # Delay (seconds) after which a command without answer is considered lost
+DOMOTICZ_MAX_IN_FLIGHT = 10                                 # Maximum count of commands sent to Domoticz without answer (0 to disable limit)
+DOMOTICZ_ANSWER_HAS_COMMAND = False                         # Does Domoticz answer contain command message sent? (answers are then matched with commands)
+
+# Metrics publishing interval (seconds, 0 to disable)
+METRICS_INTERVAL = 60
+
+# Trace settings (each SMS gets a trace ID, shown in log lines, and timed spans of sampled SMS are written to TRACE_FILE)
+TRACE_FILE = ""                                             # Trace file (OpenTelemetry JSON format), empty to disable spans
+TRACE_SAMPLE_RATE = 0.1                                     # Part of SMS whose spans are written (0 to 1)
+
+# Health settings (heartbeat is published on MQTT_LWT_TOPIC and received back to measure event loop lag)
+HEARTBEAT_INTERVAL = 10                                     # Heartbeat publishing interval (seconds, 0 to disable)
+WATCHDOG_STALL_DELAY = 30                                   # Delay (seconds) after which a stuck event loop is stalled (0 to disable)
+RESTART_STOP_TIMEOUT = 5                                    # Maximum delay (seconds) to stop cleanly before restarting after a stall
+
+### End of settings ###
+
+# Returns settings defined above, as a dictionary
+def defaultSettings():
+    return {name: value for name, value in globals().items() if name.isupper()}
 
 # Replace CR and LF by \r and \n in order to keep log lines structured
 def replaceCrLf(message):
     return str(message).replace("\r","\\r").replace("\n","\\n")
 
-# Executed when MQTT is connected
-def on_connect(client, userdata, flags, rc):
-        mqttClient.publish(MQTT_LWT_TOPIC, '{"state":"up", "version":"'+str(fileVersion)+'", "startDate":"'+str(datetime.now())+'"}', 0, True)
-    mqttClient.subscribe(MQTT_RECEIVE_TOPIC, 0)
-    mqttClient.subscribe(DOMOTICZ_OUT_TOPIC, 0)
+# Returns a dictionary value giving a key or default value if not existing
+def getValue(dict, key, default=''):
+    if key in dict:
+        if dict[key] == None:
+            return default #or None
+        else:
+            return dict[key]
+    else:
+        return default
+
+# Returns an analyzer loaded with a list of table files (one per language), and load status
+def loadAnalyzer(fileNames):
+    if len(fileNames) > 1:
+        analyzer = FF_multiLanguageAnalyzer()
+        errorText, messages = analyzer.loadData(fileNames)
+    else:
+        analyzer = FF_analyzeCommand()
+        errorText, messages = analyzer.loadData(fileNames[0])
+    return analyzer, errorText, messages
+
+# Returns version of tables loaded in an analyzer (short hash of its sections)
+def tablesVersion(analyzer):
+    hasher = hashlib.sha1()
+    for languageAnalyzer in (analyzer.analyzers if isinstance(analyzer, FF_multiLanguageAnalyzer) else [analyzer]):
+        hasher.update(json.dumps(languageAnalyzer.sectionHashes, sort_keys=True).encode("UTF-8"))
+    return hasher.hexdigest()[:12]
+
+# Returns True if a Domoticz answer contains command message of an item (when DOMOTICZ_ANSWER_HAS_COMMAND is set)
+def matchCommand(item, answer):
+    return item["command"] in answer
+
+class FF_smsSite:
+    # Class initialization
+    #   name: site name (used in logs and metrics)
+    #   analyzer: FF_analyzeCommand (or FF_multiLanguageAnalyzer) with site tables already loaded
+    #   settings: settings of this site
+    #   sendFunction: function to call to send a command to site Domoticz (site, item)
+    def __init__(self, name, analyzer, settings, sendFunction):
+        self.name = name                                    # Site name
+        self.analyzer = analyzer                            # Command analyzer
+        self.settings = settings                            # Site settings
+        self.tablesVersion = tablesVersion(analyzer)        # Version of site tables
+        self.receivedCount = 0                              # Count of SMS received for this site
+        self.errorCount = 0                                 # Count of SMS not understood
+        self.commandCount = 0                               # Count of commands sent to Domoticz
+        self.hasAnswer = bool(settings["DOMOTICZ_SMS_ANSWER_IDX"]) # Does Domoticz answer commands?
+        # Limit commands sent to Domoticz without answer (no limit if Domoticz doesn't answer)
+        self.commandLimiter = FF_commandLimiter(lambda item: sendFunction(self, item),
+            settings["DOMOTICZ_TARGET_LATENCY"], settings["DOMOTICZ_ANSWER_TIMEOUT"], 1, settings["DOMOTICZ_MAX_IN_FLIGHT"] if self.hasAnswer else 0,
+            trackAnswers=self.hasAnswer, matchFunction=matchCommand if settings["DOMOTICZ_ANSWER_HAS_COMMAND"] else None)
+
+    # Returns site metrics
+    def getMetrics(self):
+        metrics = {"received": self.receivedCount, "errors": self.errorCount, "commands": self.commandCount, "domoticz": self.commandLimiter.getMetrics()}
+        # Language detection metrics, when analyzing multiple languages
+        if isinstance(self.analyzer, FF_multiLanguageAnalyzer):
+            metrics["languages"] = self.analyzer.getMetrics()
+        return metrics
+
+class FF_domoticzSms:
+    # Class initialization
+    #   mqttClient: MQTT client (paho.mqtt.client or FF_memoryBroker client)
+    #   analyzer: FF_analyzeCommand (or FF_multiLanguageAnalyzer) with tables already loaded, for a site using SMS_PREFIX
+    #       (None to add sites later with addSite)
+    #   logger: logger to use
+    #   settings: dictionary of settings overriding default ones (same names as above)
+    def __init__(self, mqttClient, analyzer, logger, settings=None):
+        self.settings = defaultSettings()                   # Settings
+        self.settings.update(settings or {})
+        self.mqttClient = mqttClient                        # MQTT client
+        self.logger = logger                                # Logger
+        self.timer = None                                   # Periodic task timer
+        self.running = False                                # Is periodic task running?
+        self.lastMetricsTime = time.monotonic()             # Last time metrics were published
+        self.lastHeartbeatTime = time.monotonic()           # Last time heartbeat was published
+        self.startDate = str(datetime.now())                # Date of last MQTT connection
+        self.watchdog = FF_loopWatchdog(self.settings["WATCHDOG_STALL_DELAY"])
+        self.onStall = None                                 # Function called on each check while event loop is stalled (reason)
+        self.lastStallCount = 0                             # Count of stalls already logged
+        self.tracer = FF_tracer(self.settings["TRACE_FILE"], self.settings["TRACE_SAMPLE_RATE"])
+        self.sites = []                                     # Served sites
+        self.prefixRouter = FF_prefixRouter()               # SMS prefix -> site
+        self.answerSites = {}                               # (Domoticz out topic, answer idx) -> site
+        # Merge answers sent to same number
+        self.smsCoalescer = FF_smsCoalescer(self.sendSms, self.settings["SMS_COALESCE_DELAY"], self.settings["SMS_MAX_LENGTH"])
+        if analyzer != None:
+            self.addSite(self.settings["SMS_PREFIX"], analyzer)
+        mqttClient.on_message = self.on_message
+        mqttClient.on_connect = self.on_connect
+        mqttClient.on_disconnect = self.on_disconnect
+        mqttClient.on_subscribe = self.on_subscribe
+
+    # Add a site, with its SMS prefix, analyzer and settings overriding service ones
+    #   Returns site
+    def addSite(self, prefix, analyzer, siteSettings=None, name=None):
+        settings = dict(self.settings)
+        settings.update(siteSettings or {})
+        site = FF_smsSite(name if name else (prefix.strip() if prefix.strip() else "default"), analyzer, settings, self.sendToDomoticz)
+        answerKey = (settings["DOMOTICZ_OUT_TOPIC"], settings["DOMOTICZ_SMS_ANSWER_IDX"])
+        if site.hasAnswer and answerKey in self.answerSites:
+            raise KeyError(F"Site {site.name} uses same Domoticz out topic and answer idx as site {self.answerSites[answerKey].name}")
+        self.prefixRouter.add(prefix, site)
+        if site.hasAnswer:
+            self.answerSites[answerKey] = site
+        self.sites.append(site)
+        return site
 
-# Executed when receiving a message from MQTT subscribed topics
-def on_message(mosq, obj, msg):
-    if msg.retain==0:
-        payload = msg.payload.decode("UTF-8")
+    # Executed when MQTT is connected
+    def on_connect(self, client, userdata, flags, rc):
+        self.startDate = str(datetime.now())
+        self.watchdog.setConnected(True)
+        # Heartbeats are received back to measure event loop lag
+        self.mqttClient.subscribe(self.settings["MQTT_LWT_TOPIC"], 0)
+        self.publishHeartbeat()
+        self.mqttClient.subscribe(self.settings["MQTT_RECEIVE_TOPIC"], 0)
+        for outTopic in {outTopic for outTopic, answerIdx in self.answerSites.keys()}:
+            self.mqttClient.subscribe(outTopic, 0)
+
+    # Executed when MQTT is disconnected
+    def on_disconnect(self, client, userdata, rc):
+        self.watchdog.setConnected(False)
+
+    # Executed when receiving a message from MQTT subscribed topics, measuring its duration
+    def on_message(self, mosq, obj, msg):
+        self.watchdog.callbackStarted()
         try:
-            jsonData = json.loads(payload)
-        except:
-            logger.exception(F"Can't decode >{replaceCrLf(msg.payload)} received from {msg.topic}")
-            return
-        # Is this a Domoticz out message?
-        if msg.topic == DOMOTICZ_OUT_TOPIC:
-            # Is this a Domoticz out message with our SMS answer device idx?
-            if getValue(jsonData, 'idx') == DOMOTICZ_SMS_ANSWER_IDX:
+            self.processMessage(msg)
+        finally:
+            self.watchdog.callbackEnded()
+
+    # Process a message received from MQTT subscribed topics
+    def processMessage(self, msg):
+        if msg.retain==0:
+            payload = msg.payload.decode("UTF-8")
+            try:
+                jsonData = json.loads(payload)
+            except:
+                self.logger.exception(F"Can't decode >{replaceCrLf(msg.payload)} received from {msg.topic}")
+                return
+            # Is this a SMS received message?
+            if msg.topic == self.settings["MQTT_RECEIVE_TOPIC"]:
+                # Extract number, date and message parts
+                number = getValue(jsonData, 'number').strip()
+                date = getValue(jsonData, 'date').strip()
+                message = getValue(jsonData, 'message').strip()
+                # Start a trace for this SMS (phone number is not written in trace file)
+                trace = self.tracer.startTrace("sms", {"sms.date": date})
+                self.logger.info(F"[{trace.traceId}] Received >{replaceCrLf(message)}< from {number} at {date} on {msg.topic}")
+                # All 3 must be defined
+                if message == '' or date == '' or number == '':
+                    self.logger.error(F"[{trace.traceId}] Can't find 'number', 'date' or 'message'")
+                    trace.end(error="Can't find 'number', 'date' or 'message'")
+                    return
+            # Is this a heartbeat?
+            elif msg.topic == self.settings["MQTT_LWT_TOPIC"]:
+                self.watchdog.heartbeatReceived(jsonData)
+                return
+            # Is this a Domoticz out message with a site SMS answer device idx?
+            elif (msg.topic, getValue(jsonData, 'idx')) in self.answerSites:
+                site = self.answerSites[(msg.topic, getValue(jsonData, 'idx'))]
                 # Yes, get result code and log it
-                logger.info(F"Answer is >{getValue(jsonData, 'svalue1')}<")
+                item, latency = site.commandLimiter.answerReceived(str(getValue(jsonData, 'svalue1')))
+                if latency != None:
+                    self.logger.info(F"[{item['trace'].traceId}] Answer is >{getValue(jsonData, 'svalue1')}< after {latency:.3f}s")
+                    # Answer ends SMS trace
+                    item["span"].end({"domoticz.answer": str(getValue(jsonData, 'svalue1'))})
+                    item["trace"].end()
+                else:
+                    self.logger.info(F"Answer is >{getValue(jsonData, 'svalue1')}<")
                 return
-        # Is this a SMS received message?
-        elif msg.topic == MQTT_RECEIVE_TOPIC:
-            # Extract number, date and message parts
-            number = getValue(jsonData, 'number').strip()
-            date = getValue(jsonData, 'date').strip()
-            message = getValue(jsonData, 'message').strip()
-            logger.info(F"Received >{replaceCrLf(message)}< from {number} at {date} on {msg.topic}")
-            # All 3 must be defined
-            if message == '' or date == '' or number == '':
-                logger.error("Can't find 'number', 'date' or 'message'")
+            # Is this another Domoticz out message?
+            elif msg.topic in {outTopic for outTopic, answerIdx in self.answerSites.keys()}:
                 return
-        else:
-            logger.error(F"Can't understand topic {msg.topic} with content {payload}")
+            else:
+                self.logger.error(F"Can't understand topic {msg.topic} with content {payload}")
                 return
-        # Check message prefix   
-        if SMS_PREFIX == "" or analyzer.compare(message[:len(SMS_PREFIX)], SMS_PREFIX, 4):
-            # Remove prefix
-            message = message[len(SMS_PREFIX):].strip()
-            logger.info(F"Message {replaceCrLf(message)}<")
+            self.executeSms(number, message, trace)
+
+    # Analyze a SMS message and execute it on site given by its prefix
+    #   trace: root span of SMS trace (a new trace is started if not given)
+    def executeSms(self, number, message, trace=None):
+        if trace == None:
+            trace = self.tracer.startTrace("sms")
+        traceId = trace.traceId
+        span = self.tracer.startSpan("analyze", trace)
+        # Find site and remove prefix
+        site, message = self.prefixRouter.route(message)
+        if site == None:
+            span.end()
+            trace.end({"sms.ignored": True})
+        else:
+            analyzer = site.analyzer
+            site.receivedCount += 1
+            self.logger.info(F"[{traceId}] Message {replaceCrLf(message)}<"+(F" for {site.name}" if len(self.sites) > 1 else ""))
             # Analyze message
-            errorText, messages = analyzer.analyzeCommand(message)
+            analyzer.analyzeCommand(message)
+            errorText, messages = analyzer.firstErrorMessage, analyzer.allMessages
+            span.setAttributes({"sms.site": site.name, "sms.command": message})
+            if isinstance(analyzer, FF_multiLanguageAnalyzer):
+                span.setAttributes({"sms.language": analyzer.language})
             # Do we had an error analyzing command?
             if errorText != "":
                 # Yes, log it and send error back to SMS sender
-                logger.error(F"Error: {replaceCrLf(messages)}")
-                # Compose SMS answer message
-                message = errorText
-                jsonAnswer = {}
-                jsonAnswer['number'] = str(number)
-                jsonAnswer['message'] = message
-                answerMessage = json.dumps(jsonAnswer)
-                logger.info(F"Answer: >{replaceCrLf(answerMessage)}<")
-                mqttClient.publish(MQTT_SEND_TOPIC, answerMessage)
+                site.errorCount += 1
+                self.logger.error(F"[{traceId}] Error: {replaceCrLf(messages)}")
+                span.end(error=errorText)
+                # Queue SMS answer, to be merged with other answers to same number (unless number has priority)
+                self.smsCoalescer.add(str(number), errorText, str(number) in self.settings["SMS_PRIORITY_NUMBERS"], trace)
+                trace.end(error=errorText)
             else:
                 # Analyzed without error
                 if messages:
-                    logger.info(F"Info: {replaceCrLf(messages)}")
+                    self.logger.info(F"[{traceId}] Info: {replaceCrLf(messages)}")
                 # Rebuild non abbreviated command
-                understoodMessage = analyzer.command+" "+analyzer.deviceName+(" "+analyzer.valueToSet if analyzer.valueToSet != None else "")
-                logger.info(F"Understood command is >{understoodMessage}<")
+                understoodMessage = analyzer.command+" "+analyzer.deviceName+(" "+str(analyzer.valueToSet) if analyzer.valueToSet != None else "")
+                self.logger.info(F"[{traceId}] Understood command is >{understoodMessage}<")
+                span.end({"sms.understood": understoodMessage, "domoticz.idx": str(analyzer.deviceId)})
+                # Messages to send to Domoticz for this command
+                domoticzMessages = []
                 # If defined, set Domoticz last received message with non abbreviated command
-                if (DOMOTICZ_SMS_TEXT_IDX):
-                    jsonMessage = '{"command":"udevice","idx":'+str(DOMOTICZ_SMS_TEXT_IDX)+',"nvalue":0,"svalue":"'+understoodMessage+'","rssi":6,"battery":255}'
-                    mqttClient.publish(DOMOTICZ_IN_TOPIC, jsonMessage)
+                if (site.settings["DOMOTICZ_SMS_TEXT_IDX"]):
+                    jsonMessage = '{"command":"udevice","idx":'+str(site.settings["DOMOTICZ_SMS_TEXT_IDX"])+',"nvalue":0,"svalue":"'+understoodMessage+'","rssi":6,"battery":255}'
+                    domoticzMessages.append(jsonMessage)
                 # Prepare Domoticz SMS command message (space delimited)
-                domoticzMessage = \
+                domoticzMessage = (
                     # SMS sender phone number
-                    str(number)+ \
+                    str(number)+
                     # Command value
-                    " "+str(analyzer.commandValue)+ \
+                    " "+str(analyzer.commandValue)+
                     # Device ID
-                    " "+str(analyzer.deviceId)+ \
+                    " "+str(analyzer.deviceId)+
                     # Device class
-                    " "+str(analyzer.deviceClass)+ \
+                    " "+str(analyzer.deviceClass)+
                     # Value to set as given
-                    " "+str(analyzer.valueToSet)+ \
-                    # Value to set remapped with "values" in "deviceClasses" of smsTables.json
-                    " "+str(analyzer.valueToSetRemapped)
-                logger.info(F"Domoticz message: >{domoticzMessage}<")
+                    " "+str(analyzer.valueToSetOriginal if analyzer.valueToSetOriginal != None else analyzer.valueToSet)+
+                    # Value to set remapped with "mapping" in "deviceClasses" of smsTables.json
+                    " "+str(analyzer.valueToSet))
+                self.logger.info(F"[{traceId}] Domoticz message: >{domoticzMessage}<")
                 # Format message in a Domoticz input MQTT topic format
-                jsonMessage = '{"command":"udevice","idx":'+str(DOMOTICZ_SMS_MESSAGE_IDX)+',"nvalue":0,"svalue":"'+domoticzMessage+'","rssi":6,"battery":255}'
-                # Push the message to Domoticz.
+                jsonMessage = '{"command":"udevice","idx":'+str(site.settings["DOMOTICZ_SMS_MESSAGE_IDX"])+',"nvalue":0,"svalue":"'+domoticzMessage+'","rssi":6,"battery":255}'
+                domoticzMessages.append(jsonMessage)
+                # Push the messages to site Domoticz, as soon as in-flight commands limit allows it.
                 #   An LUA script in Domoticz will read and execute it, sending answer to sender directly.
                 #   A copy of this answer will be read in DOMOTICZ_OUT_TOPIC/DOMOTICZ_SMS_ANSWER_IDX and logged for information
-                mqttClient.publish(DOMOTICZ_IN_TOPIC, jsonMessage)
+                site.commandCount += 1
+                site.commandLimiter.submit({"messages": domoticzMessages, "command": domoticzMessage, "trace": trace, "span": self.tracer.startSpan("domoticz.queue", trace)})
 
-# Executed when a topic is subscribed
-def on_subscribe(mosq, obj, mid, granted_qos):
-  pass
+    # Send a SMS answer to a number (called by smsCoalescer)
+    #   traces: traces of answers merged in this SMS
+    def sendSms(self, number, message, traces):
+        jsonAnswer = {}
+        jsonAnswer['number'] = str(number)
+        jsonAnswer['message'] = message
+        answerMessage = json.dumps(jsonAnswer)
+        metrics = self.smsCoalescer.getMetrics()
+        traceIds = ",".join(trace.traceId for trace in traces)
+        self.logger.info((F"[{traceIds}] " if traceIds else "")+F"Answer: >{replaceCrLf(answerMessage)}< (coalescing: {metrics['answers']} answers, {metrics['sms']} SMS, {metrics['saved']} saved)")
+        # Record sent SMS in each merged trace
+        for trace in traces:
+            self.tracer.startSpan("sms.answer", trace, {"sms.answer": message, "sms.traceIds": traceIds, "sms.merged": len(traces)}).end()
+        self.mqttClient.publish(self.settings["MQTT_SEND_TOPIC"], answerMessage)
 
-# Returns a dictionary value giving a key or default value if not existing
-def getValue(dict, key, default=''):
-    if key in dict:
-        if dict[key] == None:
-            return default #or None
-        else:
-            return dict[key]
-    else:
-        return default
+    # Send messages of a command to a site Domoticz (called by site commandLimiter)
+    #   item: dictionary with messages, SMS trace and current span
+    def sendToDomoticz(self, site, item):
+        # Command is no more queued, wait for its answer
+        item["span"].end()
+        item["span"] = self.tracer.startSpan("domoticz.answer", item["trace"], {"domoticz.topic": site.settings["DOMOTICZ_IN_TOPIC"]})
+        for jsonMessage in item["messages"]:
+            self.mqttClient.publish(site.settings["DOMOTICZ_IN_TOPIC"], jsonMessage)
+        # No answer will come, SMS processing ends here
+        if not site.hasAnswer:
+            item["span"].end()
+            item["trace"].end()
+
+    # Returns all metrics
+    def getMetrics(self):
+        return {
+            "sites": {site.name: site.getMetrics() for site in self.sites},
+            "routing": self.prefixRouter.getMetrics(),
+            "coalescing": self.smsCoalescer.getMetrics(),
+            "tracing": self.tracer.getMetrics(),
+            "watchdog": self.watchdog.getMetrics()
+        }
+
+    # Publish heartbeat (retained) on LWT topic, with lag, queue depth, processed counts and tables version
+    def publishHeartbeat(self, state="up"):
+        self.lastHeartbeatTime = time.monotonic()
+        heartbeat = {"state": state, "version": str(fileVersion), "startDate": self.startDate, "date": str(datetime.now())}
+        heartbeat.update(self.watchdog.heartbeatSent())
+        heartbeat["lagMs"] = round(self.watchdog.currentLag() * 1000, 3)
+        heartbeat["queue"] = {
+            "domoticzPending": sum(site.commandLimiter.pendingCount() for site in self.sites),
+            "domoticzInFlight": sum(site.commandLimiter.getMetrics()["inFlight"] for site in self.sites),
+            "answersPending": self.smsCoalescer.pendingCount()
+        }
+        # Messages waiting in MQTT client (only known for FF_memoryClient)
+        if hasattr(self.mqttClient, "pendingCount"):
+            heartbeat["queue"]["mqttPending"] = self.mqttClient.pendingCount()
+        heartbeat["processed"] = {
+            "received": sum(site.receivedCount for site in self.sites),
+            "errors": sum(site.errorCount for site in self.sites),
+            "commands": sum(site.commandCount for site in self.sites),
+            "answers": self.smsCoalescer.getMetrics()["answers"]
+        }
+        heartbeat["tables"] = {site.name: site.tablesVersion for site in self.sites}
+        self.mqttClient.publish(self.settings["MQTT_LWT_TOPIC"], json.dumps(heartbeat), 0, True)
+
+    # Check event loop health, notifying systemd watchdog while healthy
+    def checkHealth(self):
+        reason = self.watchdog.check()
+        if reason == "":
+            self.watchdog.notify("WATCHDOG=1")
+            return
+        # Log stall and publish it once, then let systemd or onStall handle it
+        if self.watchdog.stallCount != self.lastStallCount:
+            self.lastStallCount = self.watchdog.stallCount
+            self.logger.error(F"Event loop is stalled: {reason}")
+            self.publishHeartbeat("stalled")
+        if self.onStall != None:
+            self.onStall(reason)
+
+    # Executed every second by periodic task, or directly by user
+    def tick(self):
+        # Drop Domoticz commands without answer
+        for site in self.sites:
+            dropped = site.commandLimiter.checkTimeouts()
+            if dropped:
+                self.logger.warning(F"No answer from {site.name} Domoticz for {len(dropped)} command(s), limit is now {site.commandLimiter.getMetrics()['limit']}")
+                for item in dropped:
+                    self.logger.warning(F"[{item['trace'].traceId}] No answer from Domoticz")
+                    item["span"].end(error="No answer from Domoticz")
+                    item["trace"].end(error="No answer from Domoticz")
+        # Write spans of last traces
+        self.tracer.flush()
+        # Check event loop and publish heartbeat
+        self.checkHealth()
+        if self.settings["HEARTBEAT_INTERVAL"] and time.monotonic() - self.lastHeartbeatTime >= self.settings["HEARTBEAT_INTERVAL"]:
+            self.publishHeartbeat()
+        # Publish metrics
+        if self.settings["METRICS_INTERVAL"] and time.monotonic() - self.lastMetricsTime >= self.settings["METRICS_INTERVAL"]:
+            self.lastMetricsTime = time.monotonic()
+            metrics = json.dumps(self.getMetrics())
+            self.logger.info(F"Metrics: {metrics}")
+            self.mqttClient.publish(self.settings["MQTT_METRICS_TOPIC"], metrics)
+
+    # Run tick every second, in its own thread (an error in tick is logged, without stopping periodic task)
+    def periodicTask(self):
+        try:
+            self.tick()
+        except:
+            self.logger.exception("Error in periodic task")
+        finally:
+            if self.running:
+                self.timer = threading.Timer(1.0, self.periodicTask)
+                self.timer.daemon = True
+                self.timer.start()
+
+    # Start periodic task
+    def start(self):
+        self.lastMetricsTime = time.monotonic()
+        self.running = True
+        self.periodicTask()
+        self.watchdog.notify("READY=1")
+
+    # Stop periodic task, sending pending answers
+    def stop(self):
+        self.watchdog.notify("STOPPING=1")
+        self.running = False
+        if self.timer != None:
+            self.timer.cancel()
+            self.timer = None
+        self.smsCoalescer.flushAll()
+        self.tracer.flush()
+
+    # Executed when a topic is subscribed
+    def on_subscribe(self, mosq, obj, mid, granted_qos):
+        pass
 
 #   *****************
 #   *** Main code ***
 #   *****************
 
-# Set current working directory to this python file folder
-currentPath = pathlib.Path(__file__).parent.resolve()
-os.chdir(currentPath)
+if __name__ == "__main__":
+    import paho.mqtt.client as mqtt
 
-# Get this file name (w/o path & extension)
-cdeFile = pathlib.Path(__file__).stem
+    # Set current working directory to this python file folder
+    currentPath = pathlib.Path(__file__).parent.resolve()
+    os.chdir(currentPath)
 
-# Get this host name
-hostName = socket.gethostname()
+    # Get this file name (w/o path & extension)
+    cdeFile = pathlib.Path(__file__).stem
 
-### Here are settings to be adapted to your context ###
+    # Log settings
+    log_format = "%(asctime)s:%(levelname)s:%(message)s"
+    logger = logging.getLogger(cdeFile)
+    logger.setLevel(logging.INFO)
+    logHandler = handlers.TimedRotatingFileHandler(str(currentPath) + cdeFile +'_'+hostName+'.log', when='W0', interval=1)
+    logHandler.suffix = "%Y%m%d"
+    logHandler.setLevel(logging.INFO)
+    formatter = logging.Formatter(log_format)
+    logHandler.setFormatter(formatter)
+    logger.addHandler(logHandler)
+    logger.info(F"----- Starting on {hostName}, version {fileVersion} -----")
 
-# SMS settings
-SMS_PREFIX = "myPrefix"
+    # Analyze SMS tables of each site
+    analyzers = {}
+    for prefix, siteSettings in (SMS_SITES if SMS_SITES else {SMS_PREFIX: {}}).items():
+        decodeFiles = [os.path.join(currentPath, fileName) for fileName in siteSettings.get("SMS_TABLES", SMS_TABLES)]
+        analyzers[prefix], errorText, messages = loadAnalyzer(decodeFiles)
 
-# MQTT Settings
-MQTT_BROKER = "*myMqttHost*"
-MQTT_RECEIVE_TOPIC = "smsServer/received"
-MQTT_SEND_TOPIC = "smsServer/toSend"
-MQTT_LWT_TOPIC = "smsServer/LWT/"+hostName
-MQTT_ID = "*myMqttUser*"
-MQTT_KEY = "*myMqttKey*"
+        # Do we had errors?
+        if errorText:
+            logger.error(F"Loading tables status of {decodeFiles}: {messages}")
+            exit(2)
 
-# Domoticz SMS command sensor idx
-DOMOTICZ_SMS_MESSAGE_IDX = 9999
-DOMOTICZ_SMS_ANSWER_IDX = 9998
-DOMOTICZ_SMS_TEXT_IDX = 9997
-DOMOTICZ_IN_TOPIC = "domoticz/in"
-DOMOTICZ_OUT_TOPIC = "domoticz/out"
+        logger.info(F"Loading tables status of {decodeFiles}: ok")
+        if messages:
+            logger.info(messages)
 
-### End of settings ###
+    # Use this python file name and random number as client name
+    random.seed()
+    mqttClientName = pathlib.Path(__file__).stem+'_{:x}'.format(random.randrange(65535))
 
-# Log settings
-log_format = "%(asctime)s:%(levelname)s:%(message)s"
-logger = logging.getLogger(cdeFile)
-logger.setLevel(logging.INFO)
-logHandler = handlers.TimedRotatingFileHandler(str(currentPath) + cdeFile +'_'+hostName+'.log', when='W0', interval=1)
-logHandler.suffix = "%Y%m%d"
-logHandler.setLevel(logging.INFO)
-formatter = logging.Formatter(log_format)
-logHandler.setFormatter(formatter)
-logger.addHandler(logHandler)
-logger.info(F"----- Starting on {hostName}, version {fileVersion} -----")
-
-# Analyze SMS tables
-decodeFile = os.path.join(currentPath, 'smsTables.json')
-analyzer = FF_analyzeCommand()
-
-errorText, messages = analyzer.loadData(decodeFile)
-
-# Do we had errors?
-if errorText:
-    logger.error(F"Loading tables status: {messages}")
-    exit(2)
-
-logger.info("Loading tables status: ok")
-if messages:
-    logger.info(messages)
-
-# Use this python file name and random number as client name
-random.seed()
-mqttClientName = pathlib.Path(__file__).stem+'_{:x}'.format(random.randrange(65535))
-
-# Initialize MQTT client
-mqttClient = mqtt.Client(mqttClientName)
-mqttClient.on_message = on_message
-mqttClient.on_connect = on_connect
-mqttClient.on_subscribe = on_subscribe
-mqttClient.username_pw_set(MQTT_ID, MQTT_KEY)
-# Set Last Will Testament (QOS=0, retain=True)
-mqttClient.will_set(MQTT_LWT_TOPIC, '{"state":"down"}', 0, True)
-# Connect to MQTT (asynchronously to allow MQTT server not being up when starting this code)
-mqttClient.connect_async(MQTT_BROKER)
-# Never give up!
-mqttClient.loop_forever()
+    # Initialize MQTT client
+    mqttClient = mqtt.Client(mqttClientName)
+    domoticzSms = FF_domoticzSms(mqttClient, None, logger)
+    for prefix, analyzer in analyzers.items():
+        domoticzSms.addSite(prefix, analyzer, SMS_SITES.get(prefix))
+    mqttClient.username_pw_set(MQTT_ID, MQTT_KEY)
+    # Set Last Will Testament (QOS=0, retain=True)
+    mqttClient.will_set(MQTT_LWT_TOPIC, '{"state":"down"}', 0, True)
+    # Send pending answers, write spans and close MQTT connection
+    def stopAll():
+        domoticzSms.stop()
+        mqttClient.disconnect()
+    # Restart this process when event loop is stalled, unless systemd watchdog does it
+    #   Called from periodic task thread: stop in another thread, not waiting forever for stalled loop
+    def restartOnStall(reason):
+        logger.critical(F"Restarting after event loop stall ({reason})")
+        stopThread = threading.Thread(target=stopAll, daemon=True)
+        stopThread.start()
+        stopThread.join(RESTART_STOP_TIMEOUT)
+        if stopThread.is_alive():
+            logger.error(F"Can't stop within {RESTART_STOP_TIMEOUT}s, restarting anyway")
+        logHandler.flush()
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+    if domoticzSms.watchdog.watchdogInterval == 0:
+        domoticzSms.onStall = restartOnStall
+    # Connect to MQTT (asynchronously to allow MQTT server not being up when starting this code)
+    mqttClient.connect_async(MQTT_BROKER)
+    # Start periodic task
+    domoticzSms.start()
+    # Never give up!
+    mqttClient.loop_forever()
@@ -1,47 +1,202 @@
 #!/usr/bin/python3
-fileVersion = "1.0.0"                                       # File version
+"""
+This file is part of FF_SmsServer (https://github.com/FlyingDomotic/FF_SmsServer)
 
-import pathlib
+It generates list of commands supported by each device of smsTables.json, in text (default), Markdown, JSON
+    or HTML (cheat-sheet, one table per room) format.
+
+Inverse indexes (commandValue -> commands, commandClass -> commands and devices) are built once, so that
+    cost is proportional to count of devices, not to count of devices times count of commands. Lines are
+    written as soon as they're computed.
+
+Room of a device is given by its "room" attribute in smsTables.json, or else by its key without device class.
+
+Documentation is generated again only if smsTables.json (or output format) changed since last run (a hash
+    is kept in output file name followed by ".hash"), unless --force is given.
+
+Usage examples:
+    makeDoc.py
+    makeDoc.py --format html --output commands.html
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+fileVersion = "2.0.0"                                       # File version
+
+import argparse
+import hashlib
+import html
+import json
 import os
-from FF_analyzeCommand import FF_analyzeCommand, get_overloads
+import pathlib
+from FF_analyzeCommand import FF_analyzeCommand
+
+# Default output file per format
+OUTPUT_FILES = {"text": "config.txt", "markdown": "config.md", "json": "config.json", "html": "config.html"}
+
+# Returns hash of tables file content, for a given format
+def tablesHash(fileName, format):
+    hasher = hashlib.sha1()
+    hasher.update(F"{fileVersion} {format}\n".encode("UTF-8"))
+    with open(fileName, "rb") as tablesFile:
+        for block in iter(lambda: tablesFile.read(65536), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+# Returns hash kept with an output file (empty if none)
+def keptHash(outputName):
+    try:
+        with open(outputName+".hash", "rt") as hashFile:
+            return hashFile.read().strip()
+    except OSError:
+        return ""
+
+# Build inverse indexes of tables loaded in analyzer
+#   Returns commandValue -> commands, commandClass -> commands and commandClass -> devices
+def buildIndexes(analyzer):
+    # commandValue -> commands, in commands order
+    commandsOfValue = {}
+    commandPositions = {}
+    for command in analyzer.commandsDict.keys():
+        commandPositions[command] = len(commandPositions)
+        commandsOfValue.setdefault(analyzer.getValue2(analyzer.commandsDict, command, "commandValue"), []).append(command)
+    # commandClass -> commands, in commands order
+    commandsOfClass = {}
+    for commandClass in analyzer.commandClassesDict.keys():
+        commands = set()
+        for commandValue in analyzer.getValue2(analyzer.commandClassesDict, commandClass, "commandValue", []):
+            commands.update(commandsOfValue.get(commandValue, []))
+        commandsOfClass[commandClass] = sorted(commands, key=lambda command: commandPositions[command])
+    # commandClass -> devices, in devices order
+    devicesOfClass = {}
+    for device in analyzer.devicesDict.keys():
+        commandClass = analyzer.getValue2(analyzer.deviceClassesDict, deviceClassOf(analyzer, device), "commandClass")
+        devicesOfClass.setdefault(commandClass, []).append(device)
+    return commandsOfValue, commandsOfClass, devicesOfClass
+
+# Returns device class of a device key
+def deviceClassOf(analyzer, device):
+    return device[device.rfind(" ") + 1:] if analyzer.classAfterDevice else device.split(" ", 1)[0]
+
+# Yields one entry per device, in devices order
+def deviceEntries(analyzer, commandsOfClass):
+    for device in analyzer.devicesDict.keys():
+        deviceItem = analyzer.devicesDict[device]
+        deviceClass = deviceClassOf(analyzer, device)
+        commandClass = analyzer.getValue2(analyzer.deviceClassesDict, deviceClass, "commandClass")
+        room = deviceItem.get("room")
+        if not room:
+            # Device key without device class
+            room = device[:device.rfind(" ")] if analyzer.classAfterDevice else device[len(deviceClass) + 1:]
+        values = analyzer.getValue2(analyzer.deviceClassesDict, deviceClass, "mapping") or {}
+        yield {
+            "device": device,
+            "name": deviceItem.get("name"),
+            "index": deviceItem.get("index"),
+            "room": room if room else device,
+            "deviceClass": deviceClass,
+            "commandClass": commandClass,
+            "commands": commandsOfClass.get(commandClass, []),
+            "values": list(values.keys())
+        }
+
+# Returns device name, commands and values of an entry as text
+def entryTexts(entry):
+    commands = "/".join(entry["commands"])+" "+entry["device"]
+    values = "/".join(entry["values"])
+    return str(entry["name"]), commands, values
+
+# Write entries in text format (tab separated, as first version of makeDoc.py)
+def writeText(outFile, entries, indexes):
+    for entry in entries:
+        name, commands, values = entryTexts(entry)
+        outFile.write(name+"\t"+commands+(" ["+values+"]" if values else "")+"\n")
+
+# Write entries in Markdown format, followed by commands and devices of each command class
+def writeMarkdown(outFile, entries, indexes):
+    def escape(text):
+        return str(text).replace("|", "\\|")
+    commandsOfValue, commandsOfClass, devicesOfClass = indexes
+    outFile.write("# SMS commands\n\n| Device | Room | Commands | Values |\n|---|---|---|---|\n")
+    for entry in entries:
+        name, commands, values = entryTexts(entry)
+        outFile.write(F"| {escape(name)} | {escape(entry['room'])} | {escape(commands)} | {escape(values)} |\n")
+    outFile.write("\n# Command classes\n\n| Command class | Commands | Devices |\n|---|---|---|\n")
+    for commandClass, commands in commandsOfClass.items():
+        outFile.write(F"| {escape(commandClass)} | {escape('/'.join(commands))} | {escape(', '.join(devicesOfClass.get(commandClass, [])))} |\n")
+
+# Write entries in JSON format (one device per line), followed by inverse indexes
+def writeJson(outFile, entries, indexes):
+    commandsOfValue, commandsOfClass, devicesOfClass = indexes
+    outFile.write('{"devices": [')
+    separator = "\n"
+    for entry in entries:
+        outFile.write(separator+json.dumps(entry, ensure_ascii=False))
+        separator = ",\n"
+    outFile.write("\n],\n"+'"commandsOfValue": '+json.dumps(commandsOfValue, ensure_ascii=False)+",\n")
+    outFile.write('"commandsOfClass": '+json.dumps(commandsOfClass, ensure_ascii=False)+",\n")
+    outFile.write('"devicesOfClass": '+json.dumps(devicesOfClass, ensure_ascii=False)+"}\n")
+
+# Write entries in HTML format, as a cheat-sheet with one table per room
+def writeHtml(outFile, entries, indexes):
+    # Group entries per room, keeping first appearance order
+    rooms = {}
+    for entry in entries:
+        rooms.setdefault(entry["room"], []).append(entry)
+    outFile.write('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>SMS commands</title>\n<style>\n'
+        'body {font-family: sans-serif; font-size: 10pt; column-width: 30em;}\n'
+        'section {break-inside: avoid;}\nh2 {font-size: 12pt; margin-bottom: 2pt;}\n'
+        'table {border-collapse: collapse; width: 100%;}\ntd {border: 1px solid #ccc; padding: 2pt; vertical-align: top;}\n'
+        '.values {color: #666;}\n</style>\n</head>\n<body>\n')
+    for room, roomEntries in rooms.items():
+        outFile.write(F"<section>\n<h2>{html.escape(room)}</h2>\n<table>\n")
+        for entry in roomEntries:
+            name, commands, values = entryTexts(entry)
+            outFile.write(F"<tr><td>{html.escape(name)}</td><td>{html.escape(commands)}"
+                +(F' <span class="values">[{html.escape(values)}]</span>' if values else "")+"</td></tr>\n")
+        outFile.write("</table>\n</section>\n")
+    outFile.write("</body>\n</html>\n")
+
+WRITERS = {"text": writeText, "markdown": writeMarkdown, "json": writeJson, "html": writeHtml}
 
 #   *****************
 #   *** Main code ***
-#   ****************
+#   *****************
 
-# Set current working directory to this python file folder
 currentPath = pathlib.Path(__file__).parent.resolve()
+
+parser = argparse.ArgumentParser(description="Generate list of commands supported by each device")
+parser.add_argument("--tables", default=os.path.join(currentPath, "smsTables.json"), help="SMS tables file (default: smsTables.json)")
+parser.add_argument("--format", choices=list(WRITERS.keys()), default="text", help="output format (default: text)")
+parser.add_argument("--output", default="", help="output file (default: config.txt, config.md, config.json or config.html, depending on format)")
+parser.add_argument("--force", action="store_true", help="generate output even if tables didn't change")
+args = parser.parse_args()
+# Given files are relative to user's working directory, default output is written in this python file folder
+args.tables = os.path.abspath(args.tables)
+outputName = os.path.abspath(args.output) if args.output else os.path.join(currentPath, OUTPUT_FILES[args.format])
 os.chdir(currentPath)
 
-# Get this file name (w/o path & extension)
-cdeFile = pathlib.Path(__file__).stem
+# Nothing to do if tables didn't change since last generation
+try:
+    currentHash = tablesHash(args.tables, args.format)
+except OSError as exception:
+    print(F"Can't read {args.tables}: {exception}")
+    exit(2)
+if not args.force and os.path.exists(outputName) and keptHash(outputName) == currentHash:
+    print(F"{outputName} is up to date")
+    exit()
 
-decodeFile = os.path.join(currentPath, 'smsTables.json')
 analyzer = FF_analyzeCommand()
-
-errorText, messages = analyzer.loadData(decodeFile)
+errorText, messages = analyzer.loadData(args.tables)
 print("LoadData status: "+(errorText if errorText != "" else "Ok"))
 print(messages)
 if errorText:
-    exit()
+    exit(2)
 
-with open('config.txt', 'wt') as outFile:
-    for device in analyzer.devicesDict.keys():
-        if analyzer.classAfterDevice:
-            deviceClass = device.split(' ')[len(device.split(" "))-1]
-        else:
-            deviceClass = device.split(' ')[0]
-        deviceName = analyzer.getValue2(analyzer.devicesDict, device, 'name')
-        deviceCommandClass = analyzer.getValue2(analyzer.deviceClassesDict, deviceClass, 'commandClass')
-        deviceCommandClasses = analyzer.getValue2(analyzer.commandClassesDict, deviceCommandClass, 'commandValue')
-        deviceClassMappings = analyzer.getValue2(analyzer.deviceClassesDict, deviceClass, "mapping")
-        deviceCommands = ""
-        for command in analyzer.commandsDict:
-            if analyzer.getValue2(analyzer.commandsDict, command, 'commandValue') in deviceCommandClasses:
-                deviceCommands += "/" + command
-        setValues = ""
-        if deviceClassMappings:
-            for value in deviceClassMappings.keys():
-                setValues += "/" + value
-            setValues = " [" + setValues[1:] + "]"
-        outFile.write(deviceName+"\t"+deviceCommands[1:]+" "+device+setValues+"\n")
+indexes = buildIndexes(analyzer)
+with open(outputName, "wt", encoding="UTF-8") as outFile:
+    WRITERS[args.format](outFile, deviceEntries(analyzer, indexes[1]), indexes)
+with open(outputName+".hash", "wt") as hashFile:
+    hashFile.write(currentHash+"\n")
+print(F"{outputName} generated for {len(analyzer.devicesDict)} devices")
@@ -0,0 +1,304 @@
+#!/usr/bin/python3
+"""
+This file is part of FF_SmsServer (https://github.com/FlyingDomotic/FF_SmsServer)
+
+It replays SMS found in domoticzSms.py logs, to load test code with real traffic.
+
+Each `Received >...< from ... at ...` line is extracted with its log time and logged outcome
+    (understood command, error or ignored), then re-injected at original, scaled or maximum speed into:
+    - analyzer: an in-process FF_analyzeCommand loaded with smsTables.json,
+    - mqtt: MQTT receive topic on a (local) broker, where domoticzSms.py is running.
+
+SMS prefix is checked with FF_prefixRouter, as domoticzSms.py does.
+
+Throughput, latency percentiles and outcome differences against logged ones are then reported.
+    With mqtt target, understood command text is read from Domoticz SMS text idx: when it's not set (--textIdx 0),
+    only status (ok, error...) of understood commands is compared.
+
+Usage examples:
+    replayLogs.py domoticzSms_myHost.log.20240101 domoticzSms_myHost.log --prefix myPrefix
+    replayLogs.py domoticzSms_myHost.log* --speed 10 --target mqtt --broker localhost
+
+Author: Flying Domotic
+License: GNU GPL V3
+"""
+
+fileVersion = "1.0.0"                                       # File version
+
+import argparse
+import glob
+import json
+import os
+import pathlib
+import re
+import threading
+import time
+from datetime import datetime
+from FF_analyzeCommand import FF_analyzeCommand
+from FF_latencyStats import FF_latencyStats
+from FF_prefixRouter import FF_prefixRouter
+
+# Log line format is "%(asctime)s:%(levelname)s:%(message)s"
+LOG_LINE = re.compile(r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3}):([A-Z]+):(.*)$")
+# Messages may start with SMS trace ID
+TRACE_ID = re.compile(r"^\[([0-9a-f]{32})(?:,[0-9a-f]{32})*\] (.*)$")
+RECEIVED_LINE = re.compile(r"^Received >(.*)< from (.*) at (.*) on (\S*)$")
+UNDERSTOOD_LINE = re.compile(r"^Understood command is >(.*)<$")
+ERROR_LINE = re.compile(r"^Error: (.*)$")
+
+# Replace CR and LF by \r and \n in order to keep log lines structured
+def replaceCrLf(message):
+    return str(message).replace("\r","\\r").replace("\n","\\n")
+
+# Restore CR and LF replaced by replaceCrLf
+def restoreCrLf(message):
+    return str(message).replace("\\r","\r").replace("\\n","\n")
+
+# Returns first message of a list of messages logged by domoticzSms.py
+def firstMessage(messages):
+    return messages.split("\\r\\n")[0]
+
+# Extract received SMS from a list of log files, sorted by log time
+#   Each SMS is a dict with time, number, date, message and logged outcome (kind, text)
+#   Outcome lines are linked to SMS by trace ID when logged, else they follow received line
+def extractSms(fileNames):
+    smsList = []
+    for fileName in fileNames:
+        current = None
+        tracedSms = {}
+        with open(fileName, encoding="UTF-8", errors="replace") as logFile:
+            for line in logFile:
+                lineMatch = LOG_LINE.match(line.rstrip("\r\n"))
+                if not lineMatch:
+                    continue
+                text = lineMatch.group(3)
+                traceId = None
+                traceMatch = TRACE_ID.match(text)
+                if traceMatch:
+                    traceId, text = traceMatch.group(1), traceMatch.group(2)
+                receivedMatch = RECEIVED_LINE.match(text)
+                if receivedMatch:
+                    current = {
+                        "time": datetime.strptime(lineMatch.group(1), "%Y-%m-%d %H:%M:%S,%f").timestamp(),
+                        "message": restoreCrLf(receivedMatch.group(1)),
+                        "number": receivedMatch.group(2),
+                        "date": receivedMatch.group(3),
+                        "outcome": ("ignored", "")
+                    }
+                    if current["message"] == "" or current["number"] == "" or current["date"] == "":
+                        current["outcome"] = ("invalid", "")
+                    smsList.append(current)
+                    if traceId != None:
+                        tracedSms[traceId] = current
+                    continue
+                sms = tracedSms.get(traceId) if traceId != None else current
+                # Outcome lines follow received line
+                if sms == None or sms["outcome"][0] != "ignored":
+                    continue
+                understoodMatch = UNDERSTOOD_LINE.match(text)
+                if understoodMatch:
+                    sms["outcome"] = ("ok", understoodMatch.group(1))
+                    continue
+                errorMatch = ERROR_LINE.match(text)
+                if errorMatch:
+                    sms["outcome"] = ("error", firstMessage(errorMatch.group(1)))
+    smsList.sort(key=lambda sms: sms["time"])
+    return smsList
+
+# Rebuild non abbreviated command, as domoticzSms.py does
+def understoodCommand(analyzer):
+    return analyzer.command+" "+analyzer.deviceName+(" "+str(analyzer.valueToSet) if analyzer.valueToSet != None else "")
+
+# Analyze a SMS in-process, returning its outcome (kind, text)
+#   prefixRouter: FF_prefixRouter giving analyzer of SMS prefix
+def analyzeSms(prefixRouter, sms):
+    if sms["message"] == "" or sms["number"] == "" or sms["date"] == "":
+        return ("invalid", "")
+    analyzer, message = prefixRouter.route(sms["message"])
+    if analyzer == None:
+        return ("ignored", "")
+    analyzer.analyzeCommand(message)
+    if analyzer.firstErrorMessage != "":
+        return ("error", replaceCrLf(analyzer.firstErrorMessage))
+    return ("ok", understoodCommand(analyzer))
+
+# Sends SMS to domoticzSms.py through MQTT and collects outcomes from Domoticz in and SMS send topics
+class MqttTarget:
+    # Class initialization
+    def __init__(self, args, prefix):
+        import paho.mqtt.client as mqtt
+        self.args = args                                    # Command line arguments
+        self.prefixRouter = FF_prefixRouter()               # SMS prefix checker
+        self.prefixRouter.add(prefix, True)
+        self.lock = threading.Lock()                        # Protect waiting lists
+        self.waitingDict = {}                               # SMS waiting for an outcome, per number
+        self.client = mqtt.Client("replayLogs_{:x}".format(os.getpid()))
+        if args.user:
+            self.client.username_pw_set(args.user, args.key)
+        self.client.on_message = self.on_message
+        self.client.connect(args.broker, args.port)
+        self.client.subscribe(args.domoticzInTopic, 0)
+        self.client.subscribe(args.sendTopic, 0)
+        self.client.loop_start()
+
+    # Publish a SMS, keeping it waiting for its outcome if prefix is correct
+    def send(self, sms, results, latencyStats):
+        entry = {"sms": sms, "sentTime": time.monotonic(), "results": results, "latencyStats": latencyStats}
+        if sms["message"] == "" or sms["number"] == "" or sms["date"] == "":
+            results.append((sms, ("invalid", ""), None))
+        elif self.prefixRouter.route(sms["message"])[0] == None:
+            results.append((sms, ("ignored", ""), None))
+        else:
+            with self.lock:
+                self.waitingDict.setdefault(sms["number"], []).append(entry)
+        self.client.publish(self.args.receiveTopic, json.dumps({"number": sms["number"], "date": sms["date"], "message": sms["message"]}))
+
+    # Set outcome of oldest SMS waiting for a number
+    def setOutcome(self, number, outcome):
+        with self.lock:
+            waitingList = self.waitingDict.get(number)
+            if not waitingList:
+                return
+            entry = waitingList.pop(0)
+            # Keep SMS waiting for its command message once its understood text is received
+            if outcome[0] == "text":
+                entry["text"] = outcome[1]
+                waitingList.insert(0, entry)
+                return
+            if outcome[0] == "ok":
+                # Without text idx, understood command text is unknown
+                outcome = ("ok", entry.get("text", outcome[1] if self.args.textIdx else None))
+        latency = time.monotonic() - entry["sentTime"]
+        entry["latencyStats"].add(latency)
+        entry["results"].append((entry["sms"], outcome, latency))
+
+    # Executed when receiving a message from MQTT subscribed topics
+    def on_message(self, client, userdata, msg):
+        try:
+            jsonData = json.loads(msg.payload.decode("UTF-8"))
+        except:
+            return
+        if msg.topic == self.args.sendTopic:
+            # Answers may have been merged by domoticzSms.py, one per line
+            for message in str(jsonData.get("message", "")).split("\n"):
+                self.setOutcome(str(jsonData.get("number", "")), ("error", replaceCrLf(message)))
+        elif msg.topic == self.args.domoticzInTopic:
+            svalue = str(jsonData.get("svalue", ""))
+            if self.args.textIdx and jsonData.get("idx") == self.args.textIdx:
+                number = self.findNumber(svalue)
+                if number != None:
+                    self.setOutcome(number, ("text", svalue))
+            elif jsonData.get("idx") == self.args.messageIdx:
+                self.setOutcome(svalue.split(" ")[0], ("ok", svalue))
+
+    # Returns number of oldest SMS waiting for an understood text
+    def findNumber(self, text):
+        with self.lock:
+            waitingLists = [waitingList for waitingList in self.waitingDict.values() if waitingList and "text" not in waitingList[0]]
+            if not waitingLists:
+                return None
+            return min(waitingLists, key=lambda waitingList: waitingList[0]["sentTime"])[0]["sms"]["number"]
+
+    # Wait for all outcomes (or timeout), setting remaining SMS as timed out
+    def close(self, timeout):
+        endTime = time.monotonic() + timeout
+        while time.monotonic() < endTime:
+            with self.lock:
+                if not any(self.waitingDict.values()):
+                    break
+            time.sleep(0.05)
+        with self.lock:
+            for waitingList in self.waitingDict.values():
+                for entry in waitingList:
+                    entry["results"].append((entry["sms"], ("timeout", ""), None))
+            self.waitingDict = {}
+        self.client.loop_stop()
+        self.client.disconnect()
+
+#   *****************
+#   *** Main code ***
+#   *****************
+
+# Set current working directory to this python file folder
+currentPath = pathlib.Path(__file__).parent.resolve()
+
+parser = argparse.ArgumentParser(description="Replay SMS found in domoticzSms.py logs")
+parser.add_argument("logFiles", nargs="+", help="log files to replay (wildcards allowed)")
+parser.add_argument("--target", choices=["analyzer", "mqtt"], default="analyzer", help="where to send SMS (default: analyzer)")
+parser.add_argument("--speed", type=float, default=0, help="speed factor against original timing, 0 for maximum speed (default: 0)")
+parser.add_argument("--prefix", default="", help="SMS prefix, as SMS_PREFIX in domoticzSms.py")
+parser.add_argument("--tables", default=os.path.join(currentPath, "smsTables.json"), help="SMS tables file (analyzer target)")
+parser.add_argument("--broker", default="localhost", help="MQTT broker (mqtt target)")
+parser.add_argument("--port", type=int, default=1883, help="MQTT port (mqtt target)")
+parser.add_argument("--user", default="", help="MQTT user (mqtt target)")
+parser.add_argument("--key", default="", help="MQTT key (mqtt target)")
+parser.add_argument("--receiveTopic", default="smsServer/received", help="SMS received topic (mqtt target)")
+parser.add_argument("--sendTopic", default="smsServer/toSend", help="SMS to send topic (mqtt target)")
+parser.add_argument("--domoticzInTopic", default="domoticz/in", help="Domoticz in topic (mqtt target)")
+parser.add_argument("--messageIdx", type=int, default=9999, help="Domoticz SMS command idx (mqtt target)")
+parser.add_argument("--textIdx", type=int, default=9997, help="Domoticz SMS text idx (mqtt target, 0 if DOMOTICZ_SMS_TEXT_IDX is not set: only status of understood commands is then compared)")
+parser.add_argument("--timeout", type=float, default=10.0, help="delay to wait for last outcomes (mqtt target)")
+parser.add_argument("--showDiffs", type=int, default=20, help="count of outcome differences to display")
+args = parser.parse_args()
+
+# Extract SMS from logs
+fileNames = []
+for pattern in args.logFiles:
+    fileNames.extend(sorted(glob.glob(pattern)) or [pattern])
+smsList = extractSms(fileNames)
+print(F"{len(smsList)} SMS found in {len(fileNames)} file(s)")
+if not smsList:
+    exit()
+
+# Prepare target
+if args.target == "analyzer":
+    analyzer = FF_analyzeCommand()
+    errorText, messages = analyzer.loadData(args.tables)
+    print("LoadData status: "+(errorText if errorText != "" else "Ok"))
+    if errorText:
+        print(messages)
+        exit(2)
+    prefixRouter = FF_prefixRouter()
+    prefixRouter.add(args.prefix, analyzer)
+else:
+    mqttTarget = MqttTarget(args, args.prefix)
+
+# Replay SMS
+results = []
+latencyStats = FF_latencyStats(len(smsList))
+firstTime = smsList[0]["time"]
+startTime = time.monotonic()
+for sms in smsList:
+    # Wait for (scaled) original time
+    scheduledTime = startTime + ((sms["time"] - firstTime) / args.speed if args.speed > 0 else 0)
+    delay = scheduledTime - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+    if args.target == "analyzer":
+        outcome = analyzeSms(prefixRouter, sms)
+        # Latency includes delay spent behind schedule
+        latency = time.monotonic() - max(scheduledTime, startTime)
+        latencyStats.add(latency)
+        results.append((sms, outcome, latency))
+    else:
+        mqttTarget.send(sms, results, latencyStats)
+if args.target == "mqtt":
+    mqttTarget.close(args.timeout)
+duration = time.monotonic() - startTime
+
+# Print report
+metrics = latencyStats.getMetrics()
+print(F"Replayed {len(smsList)} SMS in {duration:.3f}s ({len(smsList) / duration if duration > 0 else 0:.1f} SMS/s)")
+print(F"Latency (ms): average {metrics['averageMs']}, p50 {metrics['p50Ms']}, p90 {metrics['p90Ms']}, p99 {metrics['p99Ms']}, max {metrics['maxMs']}")
+outcomeCount = {}
+diffList = []
+for sms, outcome, latency in results:
+    outcomeCount[outcome[0]] = outcomeCount.get(outcome[0], 0) + 1
+    # Outcome text may be unknown (None), only its kind is then compared
+    if outcome[0] != sms["outcome"][0] or (outcome[1] != None and outcome[1] != sms["outcome"][1]):
+        diffList.append((sms, outcome))
+print("Outcomes: "+", ".join(F"{kind} {count}" for kind, count in sorted(outcomeCount.items())))
+print(F"{len(diffList)} outcome difference(s) against logs")
+for sms, outcome in diffList[:args.showDiffs]:
+    print(F"    >{replaceCrLf(sms['message'])}< from {sms['number']}: logged {sms['outcome'][0]} >{sms['outcome'][1]}<, now {outcome[0]} >{outcome[1]}<")
+exit(1 if diffList else 0)